@@ -1 +1,28 @@
-from .colf import Colfer
+# Public names resolve on first access, so importing colf does not pull in pydantic or
+# multiprocessing until Colfer or ColferRing is used
+LAZY_IMPORTS = {
+    'Colfer': '.colf',
+    'ColferDecodeCache': '.colf_cache',
+    'ColferMarshallerMixin': '.colf_marshall',
+    'ColferUnmarshallerMixin': '.colf_unmarshall',
+    'ColferRecord': '.colf_record',
+    'ColferRing': '.colf_ipc',
+    'ColferDecoder': '.colf_stream',
+    'ColferFileWriter': '.colf_file',
+    'ColferFileReader': '.colf_file',
+}
+
+__all__ = list(LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    if name not in LAZY_IMPORTS:
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+    import importlib
+    value = getattr(importlib.import_module(LAZY_IMPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
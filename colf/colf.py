@@ -1,8 +1,84 @@
+from typing import ClassVar, Optional, Tuple
+
+from .colf_base import ColferConstants
 from .colf_marshall import ColferMarshallerMixin
+from .colf_pydantic import PYDANTIC_V2, BaseModel, PrivateAttr, setOptionalDefaults, getModelFields, \
+    validateModelField, getFieldsSet
 from .colf_unmarshall import ColferUnmarshallerMixin
 
-from pydantic import BaseModel
-
 
 class Colfer(BaseModel, ColferMarshallerMixin, ColferUnmarshallerMixin):
-    pass
+    # Declared as ClassVar so subclasses can override the wire mode without it becoming a field
+    COLFER_WIRE_MODE: ClassVar[int] = ColferConstants.COLFER_WIRE_LEGACY
+
+    # Decode limits, checked before any allocation. Message size and depth apply from the
+    # outermost message, list length from the class declaring the list.
+    COLFER_MAX_SIZE: ClassVar[int] = ColferConstants.COLFER_MAX_SIZE
+    COLFER_LIST_MAX: ClassVar[int] = ColferConstants.COLFER_LIST_MAX
+    COLFER_MAX_DEPTH: ClassVar[int] = ColferConstants.COLFER_MAX_DEPTH
+
+    # Nested objects of this class kept for unmarshall(reuse=True)
+    COLFER_FREE_LIST_MAX: ClassVar[int] = ColferConstants.COLFER_FREE_LIST_MAX
+
+    # Fields whose repeated values decode to one shared str, see getInternTable
+    COLFER_INTERN_FIELDS: ClassVar[Tuple[str, ...]] = ColferConstants.COLFER_INTERN_FIELDS
+    COLFER_INTERN_MAX: ClassVar[int] = ColferConstants.COLFER_INTERN_MAX
+
+    # Fields whose repeated values are only encoded once, see getEncodeCache
+    COLFER_ENCODE_CACHE_FIELDS: ClassVar[Tuple[str, ...]] = ColferConstants.COLFER_ENCODE_CACHE_FIELDS
+    COLFER_ENCODE_CACHE_MAX: ClassVar[int] = ColferConstants.COLFER_ENCODE_CACHE_MAX
+
+    # Raw bytes of fields from a newer schema, see unmarshall(keepUnknown=True)
+    _colferUnknownFields: Optional[memoryview] = PrivateAttr(default=None)
+
+    # Set on the instances ColferDecodeCache shares between its callers
+    _colferFrozen: bool = PrivateAttr(default=False)
+
+    def __init_subclass__(cls, **kwargs):
+        super(Colfer, cls).__init_subclass__(**kwargs)
+        setOptionalDefaults(cls)
+
+    @classmethod
+    def getColferFields(cls):
+        # Name to field in declaration order, each with the type_ and outer_type_ the codecs use
+        return getModelFields(cls)
+
+    def validateKnownAttribute(self, name, variableType, value, variableSubType=None):
+        return validateModelField(self, name, value)
+
+    def setKnownAttributes(self, values):
+        # Bulk assignment, unmarshall has already decoded every field to its type
+        if self.isReusing():
+            self.recycleValues(values)
+        self.__dict__.update(values)
+        getFieldsSet(self).update(values)
+
+    if PYDANTIC_V2:
+        def __eq__(self, other):
+            # v2 also compares private attributes, leave the unknown fields out as v1 does
+            if not isinstance(other, BaseModel):
+                return NotImplemented
+            return type(self) is type(other) and self.__dict__ == other.__dict__ \
+                   and self.__pydantic_extra__ == other.__pydantic_extra__
+
+    def __setattr__(self, name, value):
+        if self._colferFrozen:
+            raise AttributeError('{} is immutable.'.format(type(self).__name__))
+        super(Colfer, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if self._colferFrozen:
+            raise AttributeError('{} is immutable.'.format(type(self).__name__))
+        super(Colfer, self).__delattr__(name)
+
+    def setFrozen(self, frozen):
+        super(Colfer, self).__setattr__('_colferFrozen', frozen)
+
+    def getReusableValue(self, name):
+        return self.__dict__.get(name)
+
+    def getUnknownFields(self):
+        return self._colferUnknownFields
+
+    def setUnknownFields(self, unknownFields):
+        self._colferUnknownFields = unknownFields
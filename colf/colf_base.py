@@ -1,15 +1,35 @@
-import ctypes
 import datetime
-import json
+import enum
+import struct
 import sys
+import typing
 from collections import OrderedDict
 
-import six
-
 if sys.version_info[0:2] >= (3, 0):
     long = int
 
+CANONICAL_NAN = float('nan')
+
+# Per enum class (members in declaration order, member to ordinal), built on first use
+ENUM_TABLES = {}
+
+# Per field annotation (OUTER_* kind, annotation with List[...] in place of list[...]), built on first use
+OUTER_KINDS = {}
+OUTER_VALUE = 0
+OUTER_LIST = 1
+OUTER_MAP = 2
+
+# Per-class (index of the first bool field, names of the bool fields) for the bitmap mode
+BOOL_FIELDS = {}
+
+# Colfer writes floating point values big endian
+FLOAT32_STRUCT = struct.Struct('>f')
+FLOAT64_STRUCT = struct.Struct('>d')
+
+
 class TypeCheckMixin(object):
+    __slots__ = ()
+
     def __isType(self, variable, typesToCheck):
         for typeToCheck in typesToCheck:
             if type(variable) is typeToCheck or isinstance(variable, typeToCheck):
@@ -70,11 +90,27 @@ class TypeCheckMixin(object):
 
     def isBinary(self, variable, outputCapable=False):
         if outputCapable:
-            return self.__isType(variable, [bytearray])
+            return self.__isType(variable, [bytearray]) or self.isWritableBuffer(variable)
         return self.__isType(variable, [bytes, bytearray])
 
+    def isWritableBuffer(self, variable):
+        # memoryview, mmap, shared_memory and other writable buffer protocol objects
+        try:
+            with memoryview(variable) as view:
+                return not view.readonly and view.c_contiguous
+        except TypeError:
+            return False
+
+    def isReadableBuffer(self, variable):
+        # Any buffer protocol object unmarshall can read in place, read-only ones included
+        try:
+            with memoryview(variable) as view:
+                return view.c_contiguous
+        except TypeError:
+            return False
+
     def isString(self, variable):
-        return self.__isType(variable, [six.string_types])
+        return self.__isType(variable, [str])
 
     def isList(self, variable):
         return self.__isType(variable, [list, tuple])
@@ -85,6 +121,68 @@ class TypeCheckMixin(object):
     def isObject(self, variable):  # pragma: no cover
         return isinstance(variable, object)
 
+    def isObjectType(self, variableType):
+        return isinstance(variableType, type) \
+               and hasattr(variableType, 'marshall') and hasattr(variableType, 'unmarshall')
+
+    def getBoolFields(self):
+        colferType = type(self)
+        if colferType not in BOOL_FIELDS:
+            boolIndexes = []
+            boolNames = []
+            for index, (name, modelField) in enumerate(self.getColferFields().items()):
+                if modelField.outer_type_ is bool:
+                    boolIndexes.append(index)
+                    boolNames.append(name)
+            BOOL_FIELDS[colferType] = (boolIndexes[0] if boolIndexes else None, boolNames)
+        return BOOL_FIELDS[colferType]
+
+    def getOuterKind(self, variableOuterType):
+        # Dict[...] and dict[...] are both maps, List[...] and list[...] both lists keyed as List[...]
+        outerKind = OUTER_KINDS.get(variableOuterType)
+        if outerKind is None:
+            origin = typing.get_origin(variableOuterType)
+            if variableOuterType is dict or origin is dict:
+                if len(typing.get_args(variableOuterType)) != 2:
+                    raise ValueError('Map fields need key and value types, as in Dict[str, int]')
+                outerKind = (OUTER_MAP, variableOuterType)
+            elif variableOuterType is list or origin is list:
+                if len(typing.get_args(variableOuterType)) != 1:
+                    raise ValueError('List fields need an element type, as in List[int]')
+                outerKind = (OUTER_LIST, typing.List[typing.get_args(variableOuterType)[0]])
+            else:
+                outerKind = (OUTER_VALUE, variableOuterType)
+            OUTER_KINDS[variableOuterType] = outerKind
+        return outerKind
+
+    def isEnumType(self, variableType):
+        return isinstance(variableType, type) and issubclass(variableType, enum.Enum)
+
+    def getEnumTable(self, enumType):
+        # Members go on the wire as their ordinal, so new members must be appended
+        enumTable = ENUM_TABLES.get(enumType)
+        if enumTable is None:
+            members = list(enumType)
+            enumTable = ENUM_TABLES[enumType] = (members, {member: ordinal for ordinal, member in enumerate(members)})
+        return enumTable
+
+    def getElementType(self, variableType, variableOuterType):
+        # pydantic v1 resolves forward references in type_ but not inside outer_type_
+        elementType = typing.get_args(variableOuterType)[0]
+        if isinstance(elementType, typing.ForwardRef):
+            return variableType
+        return elementType
+
+    def getStringFieldIndexes(self, fieldNames, settingName):
+        # Indexes of the named str or List[str] fields, for the string caches of a class
+        colferFields = list(self.getColferFields().items())
+        fieldIndexes = {name: index for index, (name, _) in enumerate(colferFields)}
+        for name in fieldNames:
+            if name not in fieldIndexes or colferFields[fieldIndexes[name]][1].type_ is not str:
+                raise ValueError('{}.{} in {} is not a str or List[str] field'.format(
+                    type(self).__name__, name, settingName))
+        return [fieldIndexes[name] for name in fieldNames]
+
     def isType(self, variable, variableType):
         STRING_TYPES_MAP = {
             'bool': TypeCheckMixin.isBool,
@@ -210,6 +308,8 @@ class TypeDeriveValueMixin(object):
 
 
 class EntropyUtils(object):
+    __slots__ = ()
+
 
     def getSign(self, value):
         if value >= 0:
@@ -230,6 +330,14 @@ class EntropyUtils(object):
 
 
 class IntegerEncodeUtils(object):
+    __slots__ = ()
+
+
+    def getIntValue(self, value, signed=False):
+        # UInt* and Int32 hold little-endian bytes once validated, decoded values are int
+        if isinstance(value, bytes):
+            return int.from_bytes(value, "little", signed=signed)
+        return value
 
     def encodeInt32(self, value):
         valueEncoded = ((value << 1) & 0xffffffff) ^ ((value >> 31) & 0x00000001)
@@ -245,6 +353,10 @@ class IntegerEncodeUtils(object):
         valueEncoded = ((value << 1) & 0xffffffffffffffff) ^ ((value >> 63) & 0x0000000000000001)
         return valueEncoded
 
+    def wrapInt64(self, value):
+        # Two's complement wrap into the int64 range, for differences of int64 values
+        return ((value + 0x8000000000000000) & 0xffffffffffffffff) - 0x8000000000000000
+
     def decodeInt64(self, valueEncoded):
         value = ((valueEncoded & 0x0000000000000001) << 63) ^ ((valueEncoded >> 1) & 0x7fffffffffffffff)
         if value & 0x8000000000000000:
@@ -253,67 +365,43 @@ class IntegerEncodeUtils(object):
 
 
 class RawFloatConvertUtils(object):
+    __slots__ = ()
+
 
     def getFloatAsBytes(self, value):
-        cFloatValue = ctypes.c_float(value)
-        cMemValue = (ctypes.c_byte * 4)()
-        ctypes.memmove(cMemValue, ctypes.byref(cFloatValue), 4)
-        if sys.byteorder == "little":
-            return bytearray(cMemValue)[::-1]
-        else: # pragma: no cover
-            return bytearray(cMemValue)
+        if value != value:
+            # NaN, always write the same quiet NaN whatever its sign and payload
+            value = CANONICAL_NAN
+        try:
+            return bytearray(FLOAT32_STRUCT.pack(value))
+        except OverflowError:
+            # Past the single precision range, the nearest float32 is infinity as in C
+            return bytearray(FLOAT32_STRUCT.pack(float('inf') if value > 0 else float('-inf')))
 
     def getBytesAsFloat(self, value):
-        if sys.byteorder == "little":
-            flippedValue = value[::-1]
-        else: # pragma: no cover
-            flippedValue = value
-        cMemValue = (ctypes.c_byte * 4)()
-        cMemValue[0] = flippedValue[0]
-        cMemValue[1] = flippedValue[1]
-        cMemValue[2] = flippedValue[2]
-        cMemValue[3] = flippedValue[3]
-        cFloatValue = ctypes.c_float(0)
-        ctypes.memmove(ctypes.byref(cFloatValue), cMemValue, 4)
-        return cFloatValue.value
+        return FLOAT32_STRUCT.unpack(value)[0]
 
     def getDoubleAsBytes(self, value):
-        cDoubleValue = ctypes.c_double(value)
-        cMemValue = (ctypes.c_byte * 8)()
-
-        ctypes.memmove(cMemValue, ctypes.byref(cDoubleValue), 8)
-        if sys.byteorder == "little":
-            return bytearray(cMemValue)[::-1]
-        else: # pragma: no cover
-            return bytearray(cMemValue)
+        if value != value:
+            value = CANONICAL_NAN
+        return bytearray(FLOAT64_STRUCT.pack(value))
 
     def getBytesAsDouble(self, value):
-        if sys.byteorder == "little":
-            flippedValue = value[::-1]
-        else: # pragma: no cover
-            flippedValue = value
-        cMemValue = (ctypes.c_byte * 8)()
-        cMemValue[0] = flippedValue[0]
-        cMemValue[1] = flippedValue[1]
-        cMemValue[2] = flippedValue[2]
-        cMemValue[3] = flippedValue[3]
-        cMemValue[4] = flippedValue[4]
-        cMemValue[5] = flippedValue[5]
-        cMemValue[6] = flippedValue[6]
-        cMemValue[7] = flippedValue[7]
-        cDoubleValue = ctypes.c_double(0)
-        ctypes.memmove(ctypes.byref(cDoubleValue), cMemValue, 8)
-        return cDoubleValue.value
+        return FLOAT64_STRUCT.unpack(value)[0]
 
 
 class UTFUtils(EntropyUtils):
+    __slots__ = ()
+
 
     def encodeUTFBytes(self, stringValue):
+        # CPython copies the bytes of an ASCII-only string straight through
         stringAsBytes = stringValue.encode('utf-8')
         return stringAsBytes, len(stringAsBytes)
 
     def decodeUTFBytes(self, byteValue):
-        return byteValue.decode('utf-8')
+        # str rather than decode, a memoryview has no decode method
+        return str(byteValue, 'utf-8')
 
 
 class DictMixIn(dict, TypeCheckMixin):
@@ -381,10 +469,81 @@ class DictMixIn(dict, TypeCheckMixin):
         return self.__setattr__(name, value)
 
     def toJson(self):
+        import json
         return json.dumps(dict(self.items()), default=repr)
 
 
+class NullOutput(bytearray):
+    # Discards everything marshalled into it, the returned offset is the encoded size
+
+    def __setitem__(self, key, value):
+        pass
+
+    def __getitem__(self, key):  # pragma: no cover
+        return 0
+
+
+class DigestOutput(bytearray):
+    # Feeds everything marshalled into it to a hashlib object through a small window
+    # instead of holding the whole message. Marshalling writes forward, except for flat
+    # integers which are written back to front, so the last few bytes are kept writable.
+    WINDOW_MARGIN = 16
+
+    def __init__(self, hasher, windowSize=4096):
+        super(DigestOutput, self).__init__(windowSize)
+        self.hasher = hasher
+        self.windowOffset = 0
+
+    def flush(self, offset):
+        length = offset - self.windowOffset
+        window = memoryview(self)
+        self.hasher.update(window[:length])
+        window[:len(self) - length] = window[length:]
+        window.release()
+        self.windowOffset = offset
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            if key.stop - self.windowOffset > len(self):
+                self.flush(key.start)
+                if len(value) > len(self):
+                    self.hasher.update(value)
+                    self.windowOffset = key.stop
+                    return
+            key = slice(key.start - self.windowOffset, key.stop - self.windowOffset)
+        else:
+            if key - self.windowOffset >= len(self):
+                self.flush(key - self.WINDOW_MARGIN)
+            key -= self.windowOffset
+        super(DigestOutput, self).__setitem__(key, value)
+
+    def digest(self, offset):
+        self.flush(offset)
+        return self.hasher.digest()
+
+
 class ColferConstants(object):
+    __slots__ = ()
+
     COLFER_MAX_INDEX = 127
     COLFER_MAX_SIZE = 16 * 1024 * 1024
     COLFER_LIST_MAX = 64 * 1024
+    COLFER_MAX_DEPTH = 64
+    COLFER_FREE_LIST_MAX = 256
+
+    # Names of str and List[str] fields decoded through an intern table, and its size
+    COLFER_INTERN_FIELDS = ()
+    COLFER_INTERN_MAX = 4096
+
+    # Names of str and List[str] fields encoded through an encode cache, and its size
+    COLFER_ENCODE_CACHE_FIELDS = ()
+    COLFER_ENCODE_CACHE_MAX = 4096
+
+    # Wire Modes: LEGACY follows every field slot with 0x7f, COMPACT is the reference
+    # Colfer layout with present fields only and a single 0x7f terminating the message.
+    # BITMAP is COMPACT with all bool fields packed into one varint at the first one's index,
+    # the other fields keep their index byte as presence.
+    COLFER_WIRE_LEGACY = 0
+    COLFER_WIRE_COMPACT = 1
+    COLFER_WIRE_BITMAP = 2
+    COLFER_WIRE_MODE = COLFER_WIRE_LEGACY
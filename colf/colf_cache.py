@@ -0,0 +1,222 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+
+def raiseImmutable(self, *args, **kwargs):
+    raise AttributeError('{} of a cached value is immutable.'.format(type(self).__name__))
+
+
+class ColferFrozenList(list):
+    # List held by a frozen value, equal to the list it was made from. Copies and pickles
+    # are mutable lists of the original type.
+    __slots__ = ('listType',)
+
+    def __init__(self, elements, listType=list):
+        super(ColferFrozenList, self).__init__(elements)
+        self.listType = listType
+
+    append = extend = insert = remove = pop = clear = sort = reverse = raiseImmutable
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = raiseImmutable
+
+    def __reduce_ex__(self, protocol):
+        return self.listType, (list(self),)
+
+
+class ColferFrozenDict(dict):
+    # Map held by a frozen value, equal to the dict it was made from
+    __slots__ = ()
+
+    pop = popitem = clear = update = setdefault = raiseImmutable
+    __setitem__ = __delitem__ = __ior__ = raiseImmutable
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+
+def freezeValue(value):
+    # Makes a decoded value and everything it holds immutable in place
+    if isinstance(value, list):
+        return ColferFrozenList((freezeValue(element) for element in value), type(value))
+    if isinstance(value, dict):
+        return ColferFrozenDict((key, freezeValue(element)) for key, element in value.items())
+    if isinstance(value, ColferUnmarshallerMixin):
+        value.setKnownAttributes({name: freezeValue(getattr(value, name)) for name in value.getColferFields()})
+        value.setFrozen(True)
+    return value
+
+
+def thawValue(value):
+    # Mutable copy of a frozen value, sharing only its immutable parts
+    if isinstance(value, ColferFrozenList):
+        return value.listType(thawValue(element) for element in value)
+    if isinstance(value, ColferFrozenDict):
+        return {key: thawValue(element) for key, element in value.items()}
+    if isinstance(value, ColferUnmarshallerMixin):
+        # model_copy on pydantic v2, where copy is deprecated
+        copied = getattr(value, 'model_copy', value.copy)()
+        copied.setKnownAttributes({name: thawValue(getattr(value, name)) for name in value.getColferFields()})
+        copied.setFrozen(False)
+        return copied
+    return value
+
+
+class ColferDecodeCache(object):
+    # Decoded objects keyed by a digest of their encoded bytes, evicted least recently used
+    # first once the encoded bytes of the cached entries exceed maxBytes. Hits return the
+    # cached instance itself, shared by every caller. It is frozen when cached: setting an
+    # attribute or changing a list or map it holds raises AttributeError. With copyOnHit
+    # every call returns a mutable copy instead, at about the cost of a decode. The cache
+    # may be shared between threads.
+
+    def __init__(self, colferType, maxBytes=16 * 1024 * 1024, copyOnHit=False):
+        assert (maxBytes > 0)
+        self.colferType = colferType
+        self.maxBytes = maxBytes
+        self.copyOnHit = copyOnHit
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def getKey(self, byteInput, offset, end):
+        return hashlib.blake2b(memoryview(byteInput)[offset:end], digest_size=16).digest()
+
+    def unmarshall(self, byteInput, offset=0, end=None):
+        # byteInput[offset:end] must hold exactly the message, end defaults to the end of input
+        end = len(byteInput) if end is None else end
+        key = self.getKey(byteInput, offset, end)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            else:
+                self.misses += 1
+        if entry is not None:
+            value, length = entry
+            if self.copyOnHit:
+                value = self.copyValue(value)
+            return value, offset + length
+
+        value, newOffset = self.colferType().unmarshall(byteInput, offset, end=end)
+        value = freezeValue(value)
+        self.put(key, value, newOffset - offset)
+        if self.copyOnHit:
+            value = self.copyValue(value)
+        return value, newOffset
+
+    def copyValue(self, value):
+        return thawValue(value)
+
+    def put(self, key, value, length):
+        if length > self.maxBytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                # Decoded by another thread meanwhile
+                return
+            self.entries[key] = (value, length)
+            self.currentBytes += length
+            while self.currentBytes > self.maxBytes:
+                _, (_, evictedLength) = self.entries.popitem(last=False)
+                self.currentBytes -= evictedLength
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.currentBytes = 0
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.currentBytes,
+            'hitRate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ColferStringCache(object):
+    # Bounded map of the string caches, evicted least recently used first once maxEntries
+    # are held. Values longer than maxLength are converted without the cache. The tables
+    # belong to a class and are shared by every thread decoding or encoding it, so the
+    # entries and counters are only touched under a lock.
+
+    def __init__(self, maxEntries=4096, maxLength=64):
+        assert (maxEntries > 0)
+        self.maxEntries = maxEntries
+        self.maxLength = maxLength
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, convert):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return value
+            self.misses += 1
+
+        # Converted outside the lock, a value another thread added meanwhile wins so equal
+        # keys keep returning the same object
+        value = convert(key)
+        with self.lock:
+            value = self.entries.setdefault(key, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'hitRate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ColferEncodeCache(ColferStringCache):
+    # UTF-8 bytes of one field's strings, so repeated values are only encoded once
+
+    def encode(self, value):
+        if len(value) > self.maxLength:
+            return value.encode('utf-8')
+        return self.lookup(value, str.encode)
+
+
+class ColferInternTable(ColferStringCache):
+    # Decoded strings of one field keyed by their UTF-8 bytes, so repeated values decode to
+    # the same str object without decoding again
+
+    def decode(self, valueAsBytes):
+        if len(valueAsBytes) > self.maxLength:
+            return str(valueAsBytes, 'utf-8')
+        # A bytes slice is its own key, bytearray slices are not hashable
+        return self.lookup(bytes(valueAsBytes), bytes.decode)
@@ -0,0 +1,353 @@
+import argparse
+import keyword
+import re
+import sys
+
+from .colf_base import ColferConstants
+
+# Colfer schema type to (annotation, codec suffix), the codecs are the marshall<suffix> and
+# unmarshall<suffix> methods of the mixins
+SCHEMA_TYPES_MAP = {
+    'bool': ('bool', 'Bool'),
+    'uint8': ('UInt8', 'Uint8'),
+    'uint16': ('UInt16', 'Uint16'),
+    'uint32': ('UInt32', 'Uint32'),
+    'uint64': ('UInt64', 'Uint64'),
+    'int32': ('Int32', 'Int32'),
+    'int64': ('int', 'Int64'),
+    'float32': ('Float32', 'Float32'),
+    'float64': ('float', 'Float64'),
+    'timestamp': ('datetime.datetime', 'Timestamp'),
+    'text': ('str', 'String'),
+    'binary': ('bytes', 'Binary'),
+}
+
+SCHEMA_LIST_TYPES_MAP = {
+    'bool': ('List[bool]', 'ListBool'),
+    'int32': ('List[Int32]', 'ListInt32'),
+    'int64': ('List[int]', 'ListInt64'),
+    'float32': ('List[Float32]', 'ListFloat32'),
+    'float64': ('List[float]', 'ListFloat64'),
+    'timestamp': ('List[datetime.datetime]', 'ListTimestamp'),
+    'text': ('List[str]', 'ListString'),
+    'binary': ('List[bytes]', 'ListBinary'),
+}
+
+WIRE_MODES_MAP = {
+    'compact': ColferConstants.COLFER_WIRE_COMPACT,
+    'legacy': ColferConstants.COLFER_WIRE_LEGACY,
+}
+
+IDENTIFIER = re.compile(r'^[A-Za-z][A-Za-z0-9_]*$')
+
+
+class ColferSchemaField(object):
+
+    def __init__(self, name, typeName, isList, comments):
+        self.name = name
+        self.typeName = typeName
+        self.isList = isList
+        self.comments = comments
+
+
+class ColferSchemaType(object):
+
+    def __init__(self, name, comments):
+        self.name = name
+        self.comments = comments
+        self.fields = []
+
+    def getClassName(self):
+        return self.name[0].upper() + self.name[1:]
+
+
+class ColferSchema(object):
+    # Parsed .colf files, the struct types of one package in declaration order
+
+    def __init__(self):
+        self.package = None
+        self.types = []
+
+    def getType(self, name):
+        for schemaType in self.types:
+            if schemaType.name == name:
+                return schemaType
+        return None
+
+    def parse(self, text, fileName='<schema>'):
+        comments = []
+        currentType = None
+        for lineNumber, line in enumerate(text.splitlines(), 1):
+            line, _, comment = line.partition('//')
+            tokens = line.split()
+            location = '{}:{}'.format(fileName, lineNumber)
+
+            if not tokens:
+                if comment.strip() and not line.strip():
+                    comments.append(comment.strip())
+                elif not comment.strip():
+                    comments = []
+                continue
+
+            if currentType is not None:
+                if tokens == ['}']:
+                    currentType = None
+                elif len(tokens) == 2:
+                    currentType.fields.append(self.parseField(tokens, comments, location))
+                else:
+                    raise ValueError('{}: expected a field name and type, got {!r}'.format(location, line.strip()))
+            elif tokens[0] == 'package' and len(tokens) == 2:
+                if self.package is not None and self.package != tokens[1]:
+                    raise ValueError('{}: package {} does not match package {}'.format(
+                        location, tokens[1], self.package))
+                self.package = tokens[1]
+            elif tokens[0] == 'type' and len(tokens) >= 4 and tokens[2] == 'struct' and tokens[3].startswith('{'):
+                currentType = self.parseType(tokens, comments, location)
+                if tokens[-1].endswith('}'):
+                    currentType = None
+            else:
+                raise ValueError('{}: unexpected {!r}'.format(location, line.strip()))
+            comments = []
+
+        if currentType is not None:
+            raise ValueError('{}: type {} is not closed'.format(fileName, currentType.name))
+        return self
+
+    def parseType(self, tokens, comments, location):
+        name = tokens[1]
+        if not IDENTIFIER.match(name):
+            raise ValueError('{}: invalid type name {}'.format(location, name))
+        if self.getType(name) is not None:
+            raise ValueError('{}: type {} is declared twice'.format(location, name))
+        schemaType = ColferSchemaType(name, comments)
+        self.types.append(schemaType)
+        return schemaType
+
+    def parseField(self, tokens, comments, location):
+        name, typeName = tokens
+        isList = typeName.startswith('[]')
+        if isList:
+            typeName = typeName[2:]
+        if not IDENTIFIER.match(name) or keyword.iskeyword(name):
+            raise ValueError('{}: invalid field name {}'.format(location, name))
+        if '.' in typeName:
+            raise ValueError('{}: types of other packages are not supported, got {}'.format(location, typeName))
+        if isList and typeName in SCHEMA_TYPES_MAP and typeName not in SCHEMA_LIST_TYPES_MAP:
+            raise ValueError('{}: lists of {} are not supported'.format(location, typeName))
+        return ColferSchemaField(name, typeName, isList, comments)
+
+    def validate(self):
+        for schemaType in self.types:
+            names = set()
+            if len(schemaType.fields) > ColferConstants.COLFER_MAX_INDEX:
+                raise ValueError('type {} has more than {} fields'.format(
+                    schemaType.name, ColferConstants.COLFER_MAX_INDEX))
+            for field in schemaType.fields:
+                if field.name in names:
+                    raise ValueError('type {} declares field {} twice'.format(schemaType.name, field.name))
+                names.add(field.name)
+                if field.typeName not in SCHEMA_TYPES_MAP and self.getType(field.typeName) is None:
+                    raise ValueError('field {}.{} has unknown type {}'.format(
+                        schemaType.name, field.name, field.typeName))
+        return self
+
+    def getOrderedTypes(self):
+        # Types referred to come first where possible, so annotations resolve when the class
+        # is created. Cycles are left to forward references.
+        orderedTypes = []
+        visiting = set()
+
+        def visit(schemaType):
+            if schemaType in orderedTypes or schemaType.name in visiting:
+                return
+            visiting.add(schemaType.name)
+            for field in schemaType.fields:
+                fieldType = self.getType(field.typeName)
+                if fieldType is not None:
+                    visit(fieldType)
+            orderedTypes.append(schemaType)
+
+        for schemaType in self.types:
+            visit(schemaType)
+        return orderedTypes
+
+
+class ColferCodeGenerator(object):
+    # Writes Colfer subclasses whose marshallMessage and unmarshallMessage visit each field with
+    # its codec directly, instead of looking types up on the pydantic fields
+
+    def __init__(self, schema, wireMode=ColferConstants.COLFER_WIRE_COMPACT, sourceNames=()):
+        self.schema = schema
+        self.wireMode = wireMode
+        self.sourceNames = sourceNames
+        self.lines = []
+        self.definedNames = set()
+
+    def emit(self, line='', indent=0):
+        self.lines.append(('    ' * indent + line) if line else '')
+
+    def getFieldCode(self, field):
+        # (annotation, codec suffix, extra codec argument) of a field
+        if field.typeName in SCHEMA_TYPES_MAP:
+            if field.isList:
+                annotation, suffix = SCHEMA_LIST_TYPES_MAP[field.typeName]
+            else:
+                annotation, suffix = SCHEMA_TYPES_MAP[field.typeName]
+            return annotation, suffix, ''
+        className = self.schema.getType(field.typeName).getClassName()
+        # Types not defined yet are forward references, resolved once all classes exist
+        annotation = className if className in self.definedNames else repr(className)
+        if field.isList:
+            return 'List[{}]'.format(annotation), 'ListObject', ', ' + className
+        return annotation, 'Object', ', ' + className
+
+    def getUnmarshallCode(self, index, field):
+        # Text fields also take the intern table of their index, None unless the class sets
+        # COLFER_INTERN_FIELDS
+        annotation, suffix, extraArgument = self.getFieldCode(field)
+        if field.typeName == 'text':
+            extraArgument = ', internTables.get({})'.format(index)
+        return annotation, suffix, extraArgument
+
+    def generate(self):
+        self.emit('# Code generated by colf.colf_compile{}. DO NOT EDIT.'.format(
+            ' from ' + ', '.join(self.sourceNames) if self.sourceNames else ''))
+        if self.schema.package:
+            self.emit('# Colfer package {}'.format(self.schema.package))
+        self.emit('import datetime')
+        self.emit('from typing import ClassVar, List, Optional')
+        self.emit()
+        self.emit('from colf import Colfer')
+        self.emit('from colf.colf_pydantic import resolveForwardRefs')
+        self.emit('from colf.colf_type import Float32, Int32, UInt8, UInt16, UInt32, UInt64')
+
+        orderedTypes = self.schema.getOrderedTypes()
+        for schemaType in orderedTypes:
+            self.emit()
+            self.emit()
+            self.generateType(schemaType)
+
+        self.emit()
+        self.emit()
+        for schemaType in orderedTypes:
+            self.emit('resolveForwardRefs({})'.format(schemaType.getClassName()))
+        return '\n'.join(self.lines) + '\n'
+
+    def generateType(self, schemaType):
+        for comment in schemaType.comments:
+            self.emit('# ' + comment)
+        self.emit('class {}(Colfer):'.format(schemaType.getClassName()))
+        wireModeName = 'COLFER_WIRE_COMPACT' if self.wireMode == ColferConstants.COLFER_WIRE_COMPACT \
+            else 'COLFER_WIRE_LEGACY'
+        self.emit('COLFER_WIRE_MODE: ClassVar[int] = Colfer.{}'.format(wireModeName), 1)
+        if schemaType.fields:
+            self.emit()
+        for field in schemaType.fields:
+            for comment in field.comments:
+                self.emit('# ' + comment, 1)
+            annotation, _, _ = self.getFieldCode(field)
+            self.emit('{}: Optional[{}]'.format(field.name, annotation), 1)
+        self.emit()
+        self.generateMarshall(schemaType)
+        self.emit()
+        self.generateUnmarshall(schemaType)
+        self.definedNames.add(schemaType.getClassName())
+
+    def generateMarshall(self, schemaType):
+        self.emit('def marshallMessage(self, byteOutput, offset, unknownFields=None):', 1)
+        if any(field.typeName == 'text' for field in schemaType.fields):
+            self.emit('encodeCaches = self.getEncodeCaches()', 2)
+        for index, field in enumerate(schemaType.fields):
+            _, suffix, _ = self.getFieldCode(field)
+            # Text fields also take the encode cache of their index
+            extraArgument = ', encodeCaches.get({})'.format(index) if field.typeName == 'text' else ''
+            self.emit('value = self.{}'.format(field.name), 2)
+            self.emit('if value is not None:', 2)
+            self.emit('offset = self.marshall{}(value, {}, byteOutput, offset{})'.format(
+                suffix, index, extraArgument), 3)
+            if self.wireMode == ColferConstants.COLFER_WIRE_LEGACY:
+                self.emit('else:', 2)
+                self.emit('offset = self.marshallHeader(byteOutput, offset)', 3)
+        self.emit('if unknownFields is not None:', 2)
+        self.emit('byteOutput[offset:offset+len(unknownFields)] = unknownFields', 3)
+        self.emit('offset += len(unknownFields)', 3)
+        if self.wireMode == ColferConstants.COLFER_WIRE_COMPACT:
+            self.emit('byteOutput[offset] = 0x7f', 2)
+            self.emit('offset += 1', 2)
+        self.emit('return offset', 2)
+
+    def generateUnmarshall(self, schemaType):
+        # unmarshall checks the input and sets the decode limits before calling this
+        self.emit('def unmarshallMessage(self, byteInput, offset, keepUnknown=False):', 1)
+        fieldCount = len(schemaType.fields)
+        if fieldCount:
+            self.emit(' = '.join('value{}'.format(index) for index in range(fieldCount)) + ' = None', 2)
+        self.emit('unknownFields = None', 2)
+        if any(field.typeName == 'text' for field in schemaType.fields):
+            self.emit('internTables = self.getInternTables()', 2)
+
+        if self.wireMode == ColferConstants.COLFER_WIRE_COMPACT:
+            # Present fields in index order, the generic decoder takes any other order
+            self.emit('start = offset', 2)
+            for index, field in enumerate(schemaType.fields):
+                _, suffix, extraArgument = self.getUnmarshallCode(index, field)
+                self.emit('if byteInput[offset] & 0x7f == {}:'.format(index), 2)
+                self.emit('value{0}, offset = self.unmarshall{1}({0}, byteInput, offset{2})'.format(
+                    index, suffix, extraArgument), 3)
+            self.emit('if byteInput[offset] == 0x7f:', 2)
+            self.emit('offset += 1', 3)
+            self.emit('elif byteInput[offset] & 0x7f >= {}:'.format(fieldCount), 2)
+            self.emit('unknownFields, offset = self.unmarshallUnknown(byteInput, offset, keepUnknown)', 3)
+            self.emit('else:', 2)
+            self.emit('return super({}, self).unmarshallMessage(byteInput, start, keepUnknown)'.format(
+                schemaType.getClassName()), 3)
+        else:
+            for index, field in enumerate(schemaType.fields):
+                _, suffix, extraArgument = self.getUnmarshallCode(index, field)
+                self.emit('if byteInput[offset] == 0x7f:', 2)
+                self.emit('offset += 1', 3)
+                self.emit('else:', 2)
+                self.emit('value{0}, offset = self.unmarshall{1}({0}, byteInput, offset{2})'.format(
+                    index, suffix, extraArgument), 3)
+            self.emit('unknownFields, offset = self.unmarshallUnknown(byteInput, offset, keepUnknown)', 2)
+
+        self.emit('self.setKnownAttributes({{{}}})'.format(', '.join(
+            '{!r}: value{}'.format(field.name, index) for index, field in enumerate(schemaType.fields))), 2)
+        self.emit('self.setUnknownFields(unknownFields)', 2)
+        self.emit('return self, offset', 2)
+
+
+def compileSchema(text, wireMode=ColferConstants.COLFER_WIRE_COMPACT, fileName='<schema>'):
+    schema = ColferSchema().parse(text, fileName).validate()
+    return ColferCodeGenerator(schema, wireMode, [fileName]).generate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m colf.colf_compile',
+                                     description='Generate Colfer classes from .colf schema files.')
+    parser.add_argument('schemas', nargs='+', help='.colf files of one package')
+    parser.add_argument('-o', '--output', help='Python module to write, standard output by default')
+    parser.add_argument('--wire-mode', choices=sorted(WIRE_MODES_MAP), default='compact',
+                        help='compact is the reference Colfer layout')
+    arguments = parser.parse_args(argv)
+
+    schema = ColferSchema()
+    try:
+        for schemaName in arguments.schemas:
+            with open(schemaName) as schemaFile:
+                schema.parse(schemaFile.read(), schemaName)
+        schema.validate()
+    except ValueError as error:
+        parser.error(str(error))
+
+    source = ColferCodeGenerator(schema, WIRE_MODES_MAP[arguments.wire_mode], arguments.schemas).generate()
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            outputFile.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
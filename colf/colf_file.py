@@ -0,0 +1,245 @@
+import bisect
+import bz2
+import lzma
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .colf_base import NullOutput
+
+# File layout, every integer little endian:
+#   file header   magic, codec id
+#   blocks        block header, then the compressed marshall output of its records
+#   index         one entry per block
+#   footer        index offset, block count, magic
+MAGIC = b'CLFB'
+FILE_HEADER = struct.Struct('<4sB')
+# Record count, uncompressed size, ordinal of the first record in the file, compressed size
+BLOCK_HEADER = struct.Struct('<IIQI')
+# Offset of the block header, ordinal of the first record, record count
+INDEX_ENTRY = struct.Struct('<QQI')
+FOOTER = struct.Struct('<QI4s')
+
+
+def compressZlib(data, level):
+    return zlib.compress(data, -1 if level is None else level)
+
+
+def compressLzma(data, level):
+    return lzma.compress(data, preset=level)
+
+
+def compressBz2(data, level):
+    return bz2.compress(data, 9 if level is None else level)
+
+
+# Codec name to (codec id, compress function, decompressor factory). The decompressors all
+# take max_length, so a block never inflates past the size its header records.
+CODECS = {
+    'zlib': (1, compressZlib, zlib.decompressobj),
+    'lzma': (2, compressLzma, lzma.LZMADecompressor),
+    'bz2': (3, compressBz2, bz2.BZ2Decompressor),
+}
+CODEC_IDS = {codecId: name for name, (codecId, _, _) in CODECS.items()}
+
+
+class ColferFileWriter(object):
+    # Writes records as blocks of concatenated marshall output, each compressed on its own,
+    # so a reader can decompress any block without the ones before it. A block is written
+    # once it holds blockRecords records or blockBytes uncompressed bytes. The index and
+    # footer are written by close, a file without them cannot be read.
+
+    def __init__(self, fileObject, codec='zlib', level=None, blockRecords=1024, blockBytes=1024 * 1024):
+        if codec not in CODECS:
+            raise ValueError('Codec {} is not one of {}'.format(codec, ', '.join(CODECS)))
+        assert (blockRecords > 0)
+        assert (blockBytes > 0)
+        self.fileObject = fileObject
+        self.codecId, self.compress, _ = CODECS[codec]
+        self.level = level
+        self.blockRecords = blockRecords
+        self.blockBytes = blockBytes
+        # Records are marshalled into the spare capacity of block, blockLength bytes are used
+        self.block = bytearray(blockBytes)
+        self.blockLength = 0
+        self.recordCount = 0
+        self.firstRecord = 0
+        self.index = []
+        self.offset = fileObject.write(FILE_HEADER.pack(MAGIC, self.codecId))
+
+    def write(self, value):
+        # A record that fits is marshalled once in place. Writing past the end either raises
+        # IndexError or extends the buffer, then the record is sized, the buffer grows and it
+        # is marshalled again.
+        offset = self.blockLength
+        capacity = len(self.block)
+        try:
+            end = value.marshall(self.block, offset)
+        except IndexError:
+            end = None
+        if end is None or len(self.block) != capacity:
+            end = value.marshall(NullOutput(), offset)
+            del self.block[offset:]
+            self.block.extend(bytes(max(end, 2 * capacity) - offset))
+            end = value.marshall(self.block, offset)
+        self.blockLength = end
+        self.recordCount += 1
+        if self.recordCount >= self.blockRecords or self.blockLength >= self.blockBytes:
+            self.flush()
+
+    def writeAll(self, values):
+        for value in values:
+            self.write(value)
+
+    def flush(self):
+        # Writes the records collected so far as one block
+        if self.recordCount == 0:
+            return
+        with memoryview(self.block) as view, view[:self.blockLength] as blockView:
+            payload = self.compress(blockView, self.level)
+        self.index.append((self.offset, self.firstRecord, self.recordCount))
+        self.offset += self.fileObject.write(
+            BLOCK_HEADER.pack(self.recordCount, self.blockLength, self.firstRecord, len(payload)))
+        self.offset += self.fileObject.write(payload)
+        self.firstRecord += self.recordCount
+        self.recordCount = 0
+        self.blockLength = 0
+
+    def close(self):
+        # Writes the last block, the index and the footer, the file object stays open
+        self.flush()
+        indexOffset = self.offset
+        for entry in self.index:
+            self.offset += self.fileObject.write(INDEX_ENTRY.pack(*entry))
+        self.offset += self.fileObject.write(FOOTER.pack(indexOffset, len(self.index), MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        return False
+
+
+class ColferFileReader(object):
+    # Reads a file of ColferFileWriter through its footer index. Blocks are read and
+    # decompressed only when a record in them is asked for. Iterating decompresses the
+    # next blocks in a thread pool, the codecs release the GIL while they inflate, and
+    # decodes them in file order.
+
+    def __init__(self, fileObject, colferType, workers=4):
+        assert (workers > 0)
+        self.fileObject = fileObject
+        self.colferType = colferType
+        self.workers = workers
+
+        fileObject.seek(0)
+        magic, codecId = FILE_HEADER.unpack(self.readExactly(FILE_HEADER.size))
+        if magic != MAGIC or codecId not in CODEC_IDS:
+            raise ValueError('Not a Colfer record file')
+        self.codec = CODEC_IDS[codecId]
+        self.decompressorType = CODECS[self.codec][2]
+
+        fileObject.seek(-FOOTER.size, 2)
+        indexOffset, blockCount, magic = FOOTER.unpack(self.readExactly(FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError('Colfer record file has no footer, it was not closed')
+        fileObject.seek(indexOffset)
+        indexBytes = self.readExactly(blockCount * INDEX_ENTRY.size)
+        self.index = list(INDEX_ENTRY.iter_unpack(indexBytes))
+        self.firstRecords = [firstRecord for _, firstRecord, _ in self.index]
+        self.recordCount = self.index[-1][1] + self.index[-1][2] if self.index else 0
+
+        # The last decoded block, for getRecord calls that stay within one block
+        self.cachedBlock = None
+        self.cachedRecords = None
+
+    def readExactly(self, length):
+        data = self.fileObject.read(length)
+        if len(data) != length:
+            raise ValueError('Colfer record file ends {} bytes early'.format(length - len(data)))
+        return data
+
+    def getBlockCount(self):
+        return len(self.index)
+
+    def __len__(self):
+        return self.recordCount
+
+    def readBlockBytes(self, blockIndex):
+        # Block header fields and compressed payload, read in the calling thread
+        blockOffset, firstRecord, recordCount = self.index[blockIndex]
+        self.fileObject.seek(blockOffset)
+        header = BLOCK_HEADER.unpack(self.readExactly(BLOCK_HEADER.size))
+        if (header[0], header[2]) != (recordCount, firstRecord):
+            raise ValueError('Block {} does not match the index'.format(blockIndex))
+        return header, self.readExactly(header[3])
+
+    def decompress(self, header, payload):
+        uncompressedSize = header[1]
+        decompressor = self.decompressorType()
+        try:
+            data = decompressor.decompress(payload, uncompressedSize)
+        except (zlib.error, lzma.LZMAError, OSError) as error:
+            raise ValueError('Block of record {} is corrupt: {}'.format(header[2], error))
+        if len(data) != uncompressedSize or not decompressor.eof:
+            raise ValueError('Block of record {} does not inflate to the {} bytes its header records'.format(
+                header[2], uncompressedSize))
+        return data
+
+    def decodeBlock(self, header, data):
+        records = []
+        offset = 0
+        while offset < len(data):
+            value, offset = self.colferType().unmarshall(data, offset)
+            records.append(value)
+        if len(records) != header[0] or offset != len(data):
+            raise ValueError('Block of record {} holds {} records, its header records {}'.format(
+                header[2], len(records), header[0]))
+        return records
+
+    def readBlock(self, blockIndex):
+        # Decoded records of one block
+        if blockIndex != self.cachedBlock:
+            header, payload = self.readBlockBytes(blockIndex)
+            self.cachedRecords = self.decodeBlock(header, self.decompress(header, payload))
+            self.cachedBlock = blockIndex
+        return self.cachedRecords
+
+    def getBlockIndex(self, recordIndex):
+        if not 0 <= recordIndex < self.recordCount:
+            raise IndexError('Record {} is not in a file of {} records'.format(recordIndex, self.recordCount))
+        return bisect.bisect_right(self.firstRecords, recordIndex) - 1
+
+    def getRecord(self, recordIndex):
+        # Reads only the block holding the record
+        blockIndex = self.getBlockIndex(recordIndex)
+        return self.readBlock(blockIndex)[recordIndex - self.firstRecords[blockIndex]]
+
+    def __getitem__(self, recordIndex):
+        return self.getRecord(recordIndex)
+
+    def __iter__(self):
+        return self.iterRecords()
+
+    def iterRecords(self, start=0):
+        # Records from start to the end of the file, with up to workers blocks being
+        # decompressed ahead of the one being decoded
+        if start >= self.recordCount:
+            return
+        firstBlock = self.getBlockIndex(start)
+        skip = start - self.firstRecords[firstBlock]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            nextBlock = firstBlock
+            while pending or nextBlock < len(self.index):
+                while nextBlock < len(self.index) and len(pending) < self.workers:
+                    header, payload = self.readBlockBytes(nextBlock)
+                    pending.append((header, executor.submit(self.decompress, header, payload)))
+                    nextBlock += 1
+                header, future = pending.pop(0)
+                records = self.decodeBlock(header, future.result())
+                for value in records[skip:]:
+                    yield value
+                skip = 0
@@ -0,0 +1,174 @@
+import multiprocessing
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+
+class ColferRing(object):
+    # Bounded single producer, multi consumer queue of Colfer messages in a shared memory
+    # block. Every slot carries a sequence number as in Vyukov's bounded queue: slot i is
+    # free for the put at position p when its sequence is p, and holds the message of that
+    # put once it is p + 1. The producer publishes a slot by writing its sequence after the
+    # payload, consumers hand it back with p + slotCount. Python has no compare-and-swap on
+    # shared memory, so consumers claim positions under a lock that the producer never takes.
+    #
+    # Block layout, every counter is a little endian unsigned 64 bit integer on its own
+    # cache line:
+    #   0         put position
+    #   64        get position
+    #   128 + i * slotStride    sequence, payload length (32 bit), payload
+    CACHE_LINE = 64
+    HEADER_SIZE = 2 * CACHE_LINE
+    SLOT_HEADER_SIZE = 16
+    PUT_POSITION = 0
+    GET_POSITION = CACHE_LINE
+
+    COUNTER = struct.Struct('<Q')
+    LENGTH = struct.Struct('<I')
+
+    # Seconds slept between polls of a full or empty ring, doubled up to the maximum
+    MIN_BACKOFF = 0.00001
+    MAX_BACKOFF = 0.001
+
+    def __init__(self, colferType, slotCount=1024, slotSize=4096, name=None, lock=None, create=True):
+        assert (slotCount > 0)
+        assert (slotSize > 0)
+        self.colferType = colferType
+        self.slotCount = slotCount
+        self.slotSize = slotSize
+        self.slotStride = -(-(self.SLOT_HEADER_SIZE + slotSize) // self.CACHE_LINE) * self.CACHE_LINE
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+
+        size = self.HEADER_SIZE + slotCount * self.slotStride
+        self.block = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.buffer = self.block.buf
+        if create:
+            self.buffer[:size] = bytes(size)
+            for index in range(slotCount):
+                self.setCounter(self.getSlotOffset(index), index)
+
+    @classmethod
+    def attach(cls, colferType, name, slotCount, slotSize, lock):
+        # Opens a ring created by another process, with the lock that process created it with
+        return cls(colferType, slotCount, slotSize, name=name, lock=lock, create=False)
+
+    @property
+    def name(self):
+        return self.block.name
+
+    def __getstate__(self):
+        # Processes receive the block name and lock, and attach on unpickling
+        return self.colferType, self.name, self.slotCount, self.slotSize, self.lock
+
+    def __setstate__(self, state):
+        colferType, name, slotCount, slotSize, lock = state
+        self.__init__(colferType, slotCount, slotSize, name=name, lock=lock, create=False)
+
+    def getCounter(self, offset):
+        return self.COUNTER.unpack_from(self.buffer, offset)[0]
+
+    def setCounter(self, offset, value):
+        self.COUNTER.pack_into(self.buffer, offset, value)
+
+    def getSlotOffset(self, index):
+        return self.HEADER_SIZE + index * self.slotStride
+
+    def wait(self, isReady, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = self.MIN_BACKOFF
+        while not isReady():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+        return True
+
+    def put(self, value, timeout=None):
+        # Marshalls value straight into the next slot, must only be called by one process
+        position = self.getCounter(self.PUT_POSITION)
+        slotOffset = self.getSlotOffset(position % self.slotCount)
+
+        if not self.wait(lambda: self.getCounter(slotOffset) == position, timeout):
+            raise queue.Full
+        payloadOffset = slotOffset + self.SLOT_HEADER_SIZE
+        with self.buffer[payloadOffset:payloadOffset+self.slotSize] as payload:
+            length = value.marshall(payload)
+        self.LENGTH.pack_into(self.buffer, slotOffset + 8, length)
+
+        # Publish the slot only once the payload is in place
+        self.setCounter(slotOffset, position + 1)
+        self.setCounter(self.PUT_POSITION, position + 1)
+
+    def putNoWait(self, value):
+        self.put(value, timeout=0)
+
+    def claim(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = self.MIN_BACKOFF
+        while True:
+            with self.lock:
+                position = self.getCounter(self.GET_POSITION)
+                slotOffset = self.getSlotOffset(position % self.slotCount)
+                if self.getCounter(slotOffset) == position + 1:
+                    self.setCounter(self.GET_POSITION, position + 1)
+                    return position, slotOffset
+            if deadline is not None and time.monotonic() >= deadline:
+                raise queue.Empty
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    def release(self, position, slotOffset):
+        # Hands the slot back to the producer for its next round
+        self.setCounter(slotOffset, position + self.slotCount)
+
+    def reading(self, timeout=None):
+        # Context manager over a memoryview of the next message, which is only valid inside
+        # the with block. The slot is released when it exits.
+        return ColferRingReader(self, *self.claim(timeout))
+
+    def getBytes(self, timeout=None):
+        with self.reading(timeout) as payload:
+            return bytes(payload)
+
+    def get(self, timeout=None):
+        # Decoded in place from the slot, which is released once the values are read out
+        with self.reading(timeout) as payload:
+            value, _ = self.colferType().unmarshall(payload, end=len(payload))
+        return value
+
+    def getNoWait(self):
+        return self.get(timeout=0)
+
+    def qsize(self):
+        # Only approximate while other processes put or get
+        return self.getCounter(self.PUT_POSITION) - self.getCounter(self.GET_POSITION)
+
+    def close(self):
+        self.buffer.release()
+        self.buffer = None
+        self.block.close()
+
+    def unlink(self):
+        # Called once by the creating process, after every process closed the ring
+        self.block.unlink()
+
+
+class ColferRingReader(object):
+
+    def __init__(self, ring, position, slotOffset):
+        self.ring = ring
+        self.position = position
+        self.slotOffset = slotOffset
+        self.payload = None
+
+    def __enter__(self):
+        length = self.ring.LENGTH.unpack_from(self.ring.buffer, self.slotOffset + 8)[0]
+        payloadOffset = self.slotOffset + self.ring.SLOT_HEADER_SIZE
+        self.payload = self.ring.buffer[payloadOffset:payloadOffset+length]
+        return self.payload
+
+    def __exit__(self, excType, excValue, traceback):
+        self.payload.release()
+        self.ring.release(self.position, self.slotOffset)
+        return False
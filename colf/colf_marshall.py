@@ -2,13 +2,20 @@ import datetime
 from typing import List
 import typing
 
-from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants
-from .colf_type import Int32, UInt8, UInt16, UInt32, UInt64
+from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants, NullOutput, \
+    DigestOutput, OUTER_LIST, OUTER_MAP
+from .colf_type import Int32, UInt8, UInt16, UInt32, UInt64, Float32, SortedIntList
+
+# Per-class field index to ColferEncodeCache of the COLFER_ENCODE_CACHE_FIELDS
+ENCODE_CACHES = {}
 
 
 class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants):
+    __slots__ = ()
 
     def marshallHeader(self, byteOutput, offset):
+        if self.COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+            return offset
         byteOutput[offset] = 0x7f
         offset += 1
         return offset
@@ -44,34 +51,35 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
         return self.marshallHeader(byteOutput, offset)
 
     def marshallUint8(self, value, index, byteOutput, offset):
-
+        value = self.getIntValue(value)
         if value != 0:
             byteOutput[offset] = index
             offset += 1
-            byteOutput[offset] = int.from_bytes(value, "little")
+            byteOutput[offset] = value
             offset += 1
 
         return self.marshallHeader(byteOutput, offset)
 
     def marshallUint16(self, value, index, byteOutput, offset):
+        value = self.getIntValue(value)
         if value != 0:
 
             if (value & self.getComplementaryMaskUnsigned(8, 16)) != 0:
                 # Flat - do not use | 0x80. See https://github.com/pascaldekloe/colfer/issues/61
                 byteOutput[offset] = index
                 offset += 1
-                offset = self.marshallInt(int.from_bytes(
-                    value, "little"), byteOutput, offset, 2)
+                offset = self.marshallInt(value, byteOutput, offset, 2)
             else:
                 # Compressed Path
                 byteOutput[offset] = (index | 0x80)
                 offset += 1
-                byteOutput[offset] = int.from_bytes(value, "little")
+                byteOutput[offset] = value
                 offset += 1
 
         return self.marshallHeader(byteOutput, offset)
 
     def marshallInt32(self, value, index, byteOutput, offset):
+        value = self.getIntValue(value, signed=True)
         if value != 0:
 
             if value < 0:
@@ -83,8 +91,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
                 offset += 1
 
             # Compressed Path
-            offset = self.marshallVarInt(int.from_bytes(
-                value, "little"), byteOutput, offset)
+            offset = self.marshallVarInt(value, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -102,7 +109,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
 
             for valueElement in value:
                 # Move last bit to the end
-                valueElementEncoded = self.encodeInt32(valueElement)
+                valueElementEncoded = self.encodeInt32(self.getIntValue(valueElement, signed=True))
                 # Compressed Path
                 offset = self.marshallVarInt(
                     valueElementEncoded, byteOutput, offset)
@@ -110,20 +117,18 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
         return self.marshallHeader(byteOutput, offset)
 
     def marshallUint32(self, value, index, byteOutput, offset):
-
+        value = self.getIntValue(value)
         if value != 0:
             if (value & self.getComplementaryMaskUnsigned(21, 32)) != 0:
                 # Flat
                 byteOutput[offset] = index | 0x80
                 offset += 1
-                offset = self.marshallInt(int.from_bytes(
-                    value, "little"), byteOutput, offset, 4)
+                offset = self.marshallInt(value, byteOutput, offset, 4)
             else:
                 # Compressed Path
                 byteOutput[offset] = index
                 offset += 1
-                offset = self.marshallVarInt(int.from_bytes(
-                    value, "little"), byteOutput, offset)
+                offset = self.marshallVarInt(value, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -164,20 +169,41 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
 
         return self.marshallHeader(byteOutput, offset)
 
+    def marshallSortedIntList(self, value, index, byteOutput, offset):
+        valueLength = len(value)
+
+        if valueLength != 0:
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+
+            byteOutput[offset] = index
+            offset += 1
+
+            # Compressed Path
+            offset = self.marshallVarInt(valueLength, byteOutput, offset)
+
+            previous = 0
+            for valueElement in value:
+                # Difference to the previous element, the first one is written as is
+                valueElementEncoded = self.encodeInt64(self.wrapInt64(valueElement - previous))
+                # Compressed Path
+                offset = self.marshallVarInt(valueElementEncoded, byteOutput, offset, 8)
+                previous = valueElement
+
+        return self.marshallHeader(byteOutput, offset)
+
     def marshallUint64(self, value, index, byteOutput, offset):
+        value = self.getIntValue(value)
         if value != 0:
             if (value & self.getComplementaryMaskUnsigned(49)) != 0:
                 # Flat
                 byteOutput[offset] = index | 0x80
                 offset += 1
-                offset = self.marshallInt(int.from_bytes(
-                    value, "little"), byteOutput, offset, 8)
+                offset = self.marshallInt(value, byteOutput, offset, 8)
             else:
                 # Compressed Path
                 byteOutput[offset] = index
                 offset += 1
-                offset = self.marshallVarInt(int.from_bytes(
-                    value, "little"), byteOutput, offset)
+                offset = self.marshallVarInt(value, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -257,19 +283,70 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
         if nanoSeconds != 0 or seconds != 0:
             if (seconds & self.getComplementaryMaskUnsigned(32)) != 0:
                 # Flat
-                byteOutput[offset] += index | 0x80
+                byteOutput[offset] = index | 0x80
                 offset += 1
                 offset = self.marshallInt(seconds, byteOutput, offset, 8)
                 offset = self.marshallInt(nanoSeconds, byteOutput, offset, 4)
             else:
                 # Compressed Path
-                byteOutput[offset] += index
+                byteOutput[offset] = index
                 offset += 1
                 offset = self.marshallInt(seconds, byteOutput, offset, 4)
                 offset = self.marshallInt(nanoSeconds, byteOutput, offset, 4)
 
         return self.marshallHeader(byteOutput, offset)
 
+    def marshallListTimestamp(self, value, index, byteOutput, offset):
+        valueLength = len(value)
+
+        if valueLength != 0:
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+
+            byteOutput[offset] = index
+            offset += 1
+
+            # Compressed Path
+            offset = self.marshallVarInt(valueLength, byteOutput, offset)
+
+            epoch = datetime.datetime.utcfromtimestamp(0)
+            for valueElement in value:
+                timeDelta = valueElement - epoch
+                nanoSeconds = timeDelta.microseconds * (10**3)
+                seconds = timeDelta.seconds + (timeDelta.days * 24 * 3600)
+                # Compressed Path
+                offset = self.marshallVarInt(
+                    self.encodeInt64(seconds), byteOutput, offset, 8)
+                offset = self.marshallVarInt(nanoSeconds, byteOutput, offset)
+
+        return self.marshallHeader(byteOutput, offset)
+
+    def marshallListBool(self, value, index, byteOutput, offset):
+        valueLength = len(value)
+
+        if valueLength != 0:
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+
+            byteOutput[offset] = index
+            offset += 1
+
+            # Compressed Path
+            offset = self.marshallVarInt(valueLength, byteOutput, offset)
+
+            # Flat - packed bit set, element 0 in the lowest bit of the first byte
+            bitSet = 0
+            for bitIndex, valueElement in enumerate(value):
+                if valueElement:
+                    bitSet |= 1 << bitIndex
+            offset = self.marshallBitSet(bitSet, (valueLength + 7) >> 3, byteOutput, offset)
+
+        return self.marshallHeader(byteOutput, offset)
+
+    def marshallBitSet(self, bitSet, length, byteOutput, offset):
+        for valueAsByte in bitSet.to_bytes(length, "little"):
+            byteOutput[offset] = valueAsByte
+            offset += 1
+        return offset
+
     def marshallBinary(self, value, index, byteOutput, offset):
         valueLength = len(value)
         if valueLength != 0:
@@ -312,32 +389,65 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
 
         return self.marshallHeader(byteOutput, offset)
 
-    def marshallString(self, value, index, byteOutput, offset):
+    def marshallText(self, value, byteOutput, offset, encodeCache=None):
+        # Encoded once, the length comes from the encoded bytes and they are copied in bulk
+        if encodeCache is None:
+            valueAsBytes, valueLength = self.encodeUTFBytes(value)
+        else:
+            valueAsBytes = encodeCache.encode(value)
+            valueLength = len(valueAsBytes)
+        assert (valueLength <= self.COLFER_MAX_SIZE)
+
+        # Compressed Path
+        offset = self.marshallVarInt(valueLength, byteOutput, offset)
+
+        # Flat
+        byteOutput[offset:offset+valueLength] = valueAsBytes
+        return offset + valueLength
+
+    def marshallString(self, value, index, byteOutput, offset, encodeCache=None):
+        if len(value) != 0:
+            byteOutput[offset] = index
+            offset += 1
+            offset = self.marshallText(value, byteOutput, offset, encodeCache)
+
+        return self.marshallHeader(byteOutput, offset)
+
+    def marshallListString(self, value, index, byteOutput, offset, encodeCache=None):
         valueLength = len(value)
+
         if valueLength != 0:
-            assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
 
-            # Compressed Path
             byteOutput[offset] = index
             offset += 1
 
-            valueAsBytes, valueLength = self.encodeUTFBytes(value)
-            assert (valueLength <= self.COLFER_MAX_SIZE)
-
+            # Compressed Path
             offset = self.marshallVarInt(valueLength, byteOutput, offset)
 
             # Flat
-            for valueAsByte in valueAsBytes:
-                byteOutput[offset] = valueAsByte
-                offset += 1
+            for valueAsString in value:
+                offset = self.marshallText(valueAsString, byteOutput, offset, encodeCache)
+
+        return self.marshallHeader(byteOutput, offset)
+
+    def marshallEnum(self, value, index, byteOutput, offset, variableType=None):
+        # Every member is written, the first one included, so only None decodes as None
+        _, ordinals = self.getEnumTable(variableType or type(value))
+        byteOutput[offset] = index
+        offset += 1
+
+        # Compressed Path
+        offset = self.marshallVarInt(ordinals[value], byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
-    def marshallListString(self, value, index, byteOutput, offset):
+    def marshallListEnum(self, value, index, byteOutput, offset, variableType=None):
         valueLength = len(value)
 
         if valueLength != 0:
             assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+            _, ordinals = self.getEnumTable(variableType or type(value[0]))
 
             byteOutput[offset] = index
             offset += 1
@@ -345,21 +455,25 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             # Compressed Path
             offset = self.marshallVarInt(valueLength, byteOutput, offset)
 
-            # Flat
-            for valueAsString in value:
-                valueLength = len(valueAsString)
-                assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
+            for valueElement in value:
+                # Compressed Path
+                offset = self.marshallVarInt(ordinals[valueElement], byteOutput, offset)
 
-                valueAsBytes, valueLength = self.encodeUTFBytes(valueAsString)
-                assert (valueLength <= self.COLFER_MAX_SIZE)
+        return self.marshallHeader(byteOutput, offset)
 
-                # Compressed Path
-                offset = self.marshallVarInt(valueLength, byteOutput, offset)
+    def marshallBoolBitmap(self, index, byteOutput, offset):
+        # Bit i holds the i-th bool field, only True is written as in the other modes
+        _, boolNames = self.getBoolFields()
+        bitSet = 0
+        for bitIndex, name in enumerate(boolNames):
+            if getattr(self, name):
+                bitSet |= 1 << bitIndex
 
-                # Flat
-                for valueAsByte in valueAsBytes:
-                    byteOutput[offset] = valueAsByte
-                    offset += 1
+        if bitSet != 0:
+            byteOutput[offset] = index
+            offset += 1
+            # Compressed Path
+            offset = self.marshallVarInt(bitSet, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -369,7 +483,95 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             offset += 1
 
             # Flat
-            offset = value.marshall(byteOutput, offset)
+            offset = value.marshallMessage(byteOutput, offset, value.getUnknownFields())
+
+        return self.marshallHeader(byteOutput, offset)
+
+    def marshallElementBool(self, value, byteOutput, offset):
+        byteOutput[offset] = 1 if value else 0
+        return offset + 1
+
+    def marshallElementUint8(self, value, byteOutput, offset):
+        byteOutput[offset] = self.getIntValue(value)
+        return offset + 1
+
+    def marshallElementUint(self, value, byteOutput, offset):
+        return self.marshallVarInt(self.getIntValue(value), byteOutput, offset)
+
+    def marshallElementUint64(self, value, byteOutput, offset):
+        return self.marshallVarInt(self.getIntValue(value), byteOutput, offset, 8)
+
+    def marshallElementInt32(self, value, byteOutput, offset):
+        return self.marshallVarInt(self.encodeInt32(self.getIntValue(value, signed=True)), byteOutput, offset)
+
+    def marshallElementInt64(self, value, byteOutput, offset):
+        return self.marshallVarInt(self.encodeInt64(value), byteOutput, offset, 8)
+
+    def marshallElementFloat32(self, value, byteOutput, offset):
+        byteOutput[offset:offset+4] = self.getFloatAsBytes(value)
+        return offset + 4
+
+    def marshallElementFloat64(self, value, byteOutput, offset):
+        byteOutput[offset:offset+8] = self.getDoubleAsBytes(value)
+        return offset + 8
+
+    def marshallElementTimestamp(self, value, byteOutput, offset):
+        # As the elements of List[datetime.datetime]
+        timeDelta = value - datetime.datetime.utcfromtimestamp(0)
+        seconds = timeDelta.seconds + (timeDelta.days * 24 * 3600)
+        offset = self.marshallVarInt(self.encodeInt64(seconds), byteOutput, offset, 8)
+        return self.marshallVarInt(timeDelta.microseconds * (10**3), byteOutput, offset)
+
+    def marshallElementBinary(self, value, byteOutput, offset):
+        valueLength = len(value)
+        assert (valueLength <= self.COLFER_MAX_SIZE)
+        offset = self.marshallVarInt(valueLength, byteOutput, offset)
+        byteOutput[offset:offset+valueLength] = value
+        return offset + valueLength
+
+    def marshallElementString(self, value, byteOutput, offset):
+        return self.marshallText(value, byteOutput, offset)
+
+    def getMarshallElementFunction(self, elementType):
+        # Resolved functions are all called as function(self, value, byteOutput, offset)
+        if elementType in MARSHALL_ELEMENT_TYPES_MAP:
+            return MARSHALL_ELEMENT_TYPES_MAP[elementType]
+        if self.isEnumType(elementType):
+            _, ordinals = self.getEnumTable(elementType)
+            return lambda colfer, value, byteOutput, offset: \
+                colfer.marshallVarInt(ordinals[value], byteOutput, offset)
+        raise ValueError('{} cannot be a map key or value'.format(elementType))
+
+    def getElementBytes(self, marshallElement, valueElement):
+        elementOutput = bytearray(marshallElement(self, valueElement, NullOutput(), 0))
+        marshallElement(self, valueElement, elementOutput, 0)
+        return bytes(elementOutput)
+
+    def marshallMap(self, value, index, byteOutput, offset, variableOuterType):
+        valueLength = len(value)
+
+        if valueLength != 0:
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+            keyType, valueType = typing.get_args(variableOuterType)
+            marshallKey = self.getMarshallElementFunction(keyType)
+            marshallValue = self.getMarshallElementFunction(valueType)
+
+            byteOutput[offset] = index
+            offset += 1
+
+            # Compressed Path
+            offset = self.marshallVarInt(valueLength, byteOutput, offset)
+
+            # Keys and values alternate, each encoded as a list element of its type. Entries
+            # go in the order of their encoded keys, so equal dicts encode to the same bytes
+            # whatever order their keys were inserted in.
+            entries = [(self.getElementBytes(marshallKey, key), valueElement) for key, valueElement in value.items()]
+            entries.sort(key=lambda entry: entry[0])
+            for keyAsBytes, valueElement in entries:
+                # Flat
+                byteOutput[offset:offset+len(keyAsBytes)] = keyAsBytes
+                offset += len(keyAsBytes)
+                offset = marshallValue(self, valueElement, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -388,60 +590,213 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             # Flat
             for valueAsObject in value:
                 # Flat
-                offset = valueAsObject.marshall(byteOutput, offset)
+                offset = valueAsObject.marshallMessage(
+                    byteOutput, offset, valueAsObject.getUnknownFields())
 
         return self.marshallHeader(byteOutput, offset)
 
-    def marshallList(self, value, index, byteOutput, offset, variableOuterType=None):
-        STRING_TYPES_MAP = {
-            List[int]: ColferMarshallerMixin.marshallListInt64,
-            List[Int32]: ColferMarshallerMixin.marshallListInt32,
-            List[float]: ColferMarshallerMixin.marshallListFloat64,
-            List[bytes]: ColferMarshallerMixin.marshallListBinary,
-            List[str]: ColferMarshallerMixin.marshallListString,
-        }
-
-        if variableOuterType in STRING_TYPES_MAP:
-            functionToCall = STRING_TYPES_MAP[variableOuterType]
+    def marshallList(self, value, index, byteOutput, offset, variableOuterType=None, variableType=None):
+
+        if variableOuterType in MARSHALL_LIST_TYPES_MAP:
+            functionToCall = MARSHALL_LIST_TYPES_MAP[variableOuterType]
             return functionToCall(self, value, index, byteOutput, offset)
+        elementType = self.getElementType(variableType, variableOuterType)
+        if self.isEnumType(elementType):
+            return self.marshallListEnum(value, index, byteOutput, offset, elementType)
+        elif self.isObjectType(elementType):
+            return self.marshallListObject(value, index, byteOutput, offset)
         else:  # pragma: no cover
             return offset
 
     def marshallType(self, variableType, variableOuterType, value, index, byteOutput, offset):
-        STRING_TYPES_MAP = {
-            bool: ColferMarshallerMixin.marshallBool,
-            int: ColferMarshallerMixin.marshallInt64,
-            Int32: ColferMarshallerMixin.marshallInt32,
-            UInt8: ColferMarshallerMixin.marshallUint8,
-            UInt16: ColferMarshallerMixin.marshallUint16,
-            UInt32: ColferMarshallerMixin.marshallUint32,
-            UInt64: ColferMarshallerMixin.marshallUint64,
-            float: ColferMarshallerMixin.marshallFloat64,
-            bytes: ColferMarshallerMixin.marshallBinary,
-            str: ColferMarshallerMixin.marshallString,
-            dict: ColferMarshallerMixin.marshallObject,
-        }
-
-        if type(variableOuterType) == typing._GenericAlias:
+
+        outerKind, variableOuterType = self.getOuterKind(variableOuterType)
+        if outerKind == OUTER_MAP:
+            return self.marshallMap(value, index, byteOutput, offset, variableOuterType)
+        if outerKind == OUTER_LIST:
             return self.marshallList(value, index, byteOutput,
-                                     offset, variableOuterType)
-        if variableType in STRING_TYPES_MAP:
-            functionToCall = STRING_TYPES_MAP[variableType]
+                                     offset, variableOuterType, variableType)
+        if variableType in MARSHALL_TYPES_MAP:
+            functionToCall = MARSHALL_TYPES_MAP[variableType]
             return functionToCall(self, value, index, byteOutput, offset)
+        elif self.isEnumType(variableType):
+            return self.marshallEnum(value, index, byteOutput, offset, variableType)
+        elif self.isObjectType(variableType):
+            return self.marshallObject(value, index, byteOutput, offset)
         else:  # pragma: no cover
             return offset
 
+    def marshallField(self, variableType, variableOuterType, value, index, byteOutput, offset):
+        if value is None:
+            return self.marshallHeader(byteOutput, offset)
+        return self.marshallType(variableType, variableOuterType, value, index, byteOutput, offset)
+
+    def getEncodeCaches(self):
+        colferType = type(self)
+        if colferType not in ENCODE_CACHES:
+            encodeCaches = {}
+            if self.COLFER_ENCODE_CACHE_FIELDS:
+                from .colf_cache import ColferEncodeCache
+                for index in self.getStringFieldIndexes(self.COLFER_ENCODE_CACHE_FIELDS,
+                                                        'COLFER_ENCODE_CACHE_FIELDS'):
+                    encodeCaches[index] = ColferEncodeCache(self.COLFER_ENCODE_CACHE_MAX)
+            ENCODE_CACHES[colferType] = encodeCaches
+        return ENCODE_CACHES[colferType]
+
+    def getEncodeCache(self, name):
+        # ColferEncodeCache of a field in COLFER_ENCODE_CACHE_FIELDS, for its stats
+        return self.getEncodeCaches()[list(self.getColferFields()).index(name)]
+
+    def getUnknownFields(self):  # pragma: no cover
+        return None
+
     def marshall(self, byteOutput, offset=0):
         assert (byteOutput != None)
         assert (self.isBinary(byteOutput, True))
         assert (offset >= 0)
+        if isinstance(byteOutput, bytearray):
+            return self.marshallMessage(byteOutput, offset, self.getUnknownFields())
+
+        # Fixed size buffers cannot grow, check the computed size once up front and write
+        # through a flat byte view
+        with memoryview(byteOutput) as view, view.cast('B') as byteView:
+            end = self.marshallMessage(NullOutput(), offset, self.getUnknownFields())
+            if end > len(byteView):
+                raise ValueError('{} needs {} bytes from offset {}, the buffer holds {}'.format(
+                    type(self).__name__, end - offset, offset, len(byteView)))
+            return self.marshallMessage(byteView, offset, self.getUnknownFields())
+
+    def marshallMessage(self, byteOutput, offset, unknownFields=None):
+        encodeCaches = self.getEncodeCaches()
+        isBitmap = self.COLFER_WIRE_MODE == ColferConstants.COLFER_WIRE_BITMAP
         index = 0
-        for name, modelField in self.__fields__.items():
+        for name, modelField in self.getColferFields().items():
             variableType = modelField.type_
             variableOuterType = modelField.outer_type_
             value = getattr(self, name)
 
-            offset = self.marshallType(
-                variableType, variableOuterType, value, index, byteOutput, offset)
+            if isBitmap and variableOuterType is bool:
+                # All bool fields go at the first one
+                if index == self.getBoolFields()[0]:
+                    offset = self.marshallBoolBitmap(index, byteOutput, offset)
+            elif index in encodeCaches and value is not None:
+                functionToCall = self.marshallListString \
+                    if self.getOuterKind(variableOuterType)[0] == OUTER_LIST \
+                    else self.marshallString
+                offset = functionToCall(value, index, byteOutput, offset, encodeCaches[index])
+            else:
+                offset = self.marshallField(
+                    variableType, variableOuterType, value, index, byteOutput, offset)
             index += 1
+
+        # Fields of a newer schema kept by unmarshall, relayed unchanged
+        if unknownFields is not None:
+            byteOutput[offset:offset+len(unknownFields)] = unknownFields
+            offset += len(unknownFields)
+
+        if self.COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+            byteOutput[offset] = 0x7f
+            offset += 1
         return offset
+
+    def canonicalBytes(self):
+        # The same field values always encode to the same bytes: zero values, empty lists
+        # and None are all left out, NaN is written as one quiet NaN, and fields of a newer
+        # schema kept by unmarshall are left out.
+        byteOutput = bytearray(self.marshallMessage(NullOutput(), 0))
+        self.marshallMessage(byteOutput, 0)
+        return byteOutput
+
+    def digest(self, hashName='sha256'):
+        # Hash of canonicalBytes(), fed to hashlib while marshalling
+        import hashlib
+        byteOutput = DigestOutput(hashlib.new(hashName))
+        return byteOutput.digest(self.marshallMessage(byteOutput, 0))
+
+    @classmethod
+    def patch(cls, byteInput, offset=0, **fieldValues):
+        # Replaces fields of the message at offset without decoding it. The fields before
+        # the last patched one are skipped over, everything else is copied in bulk.
+        colfer = cls()
+        colferFields = colfer.getColferFields()
+        fieldIndexes = {name: index for index, name in enumerate(colferFields)}
+        patchFields = []
+        for name, value in fieldValues.items():
+            if name not in fieldIndexes:
+                raise AttributeError('Attribute {} does not exist.'.format(name))
+            modelField = colferFields[name]
+            if colfer.COLFER_WIRE_MODE == ColferConstants.COLFER_WIRE_BITMAP and modelField.outer_type_ is bool:
+                raise ValueError('Bool field {} shares its bitmap with the other bool fields, '
+                                 'decode and marshall the message instead'.format(name))
+            value = colfer.validateKnownAttribute(name, modelField.type_, value, modelField.outer_type_)
+            patchFields.append((fieldIndexes[name], modelField, value))
+        if not patchFields:
+            return bytearray(byteInput)
+        patchFields.sort(key=lambda patchField: patchField[0])
+
+        spans = colfer.scanFields(byteInput, offset, patchFields[-1][0])
+
+        outputLength = len(byteInput)
+        for index, modelField, value in patchFields:
+            start, end = spans[index]
+            outputLength += colfer.marshallField(modelField.type_, modelField.outer_type_, value,
+                                                 index, NullOutput(), 0) - (end - start)
+
+        byteOutput = bytearray(outputLength)
+        sourceInput = memoryview(byteInput)
+        inputOffset = outputOffset = 0
+        for index, modelField, value in patchFields:
+            start, end = spans[index]
+            # Flat
+            byteOutput[outputOffset:outputOffset+start-inputOffset] = sourceInput[inputOffset:start]
+            outputOffset += start - inputOffset
+            outputOffset = colfer.marshallField(modelField.type_, modelField.outer_type_, value,
+                                                index, byteOutput, outputOffset)
+            inputOffset = end
+        # Flat
+        byteOutput[outputOffset:] = sourceInput[inputOffset:]
+        return byteOutput
+
+
+# Dispatch by field type, built once when the module loads
+MARSHALL_LIST_TYPES_MAP = {
+    List[bool]: ColferMarshallerMixin.marshallListBool,
+    List[int]: ColferMarshallerMixin.marshallListInt64,
+    List[Int32]: ColferMarshallerMixin.marshallListInt32,
+    List[Float32]: ColferMarshallerMixin.marshallListFloat32,
+    List[float]: ColferMarshallerMixin.marshallListFloat64,
+    List[datetime.datetime]: ColferMarshallerMixin.marshallListTimestamp,
+    List[bytes]: ColferMarshallerMixin.marshallListBinary,
+    List[str]: ColferMarshallerMixin.marshallListString,
+}
+
+MARSHALL_TYPES_MAP = {
+    bool: ColferMarshallerMixin.marshallBool,
+    int: ColferMarshallerMixin.marshallInt64,
+    Int32: ColferMarshallerMixin.marshallInt32,
+    UInt8: ColferMarshallerMixin.marshallUint8,
+    UInt16: ColferMarshallerMixin.marshallUint16,
+    UInt32: ColferMarshallerMixin.marshallUint32,
+    UInt64: ColferMarshallerMixin.marshallUint64,
+    Float32: ColferMarshallerMixin.marshallFloat32,
+    float: ColferMarshallerMixin.marshallFloat64,
+    datetime.datetime: ColferMarshallerMixin.marshallTimestamp,
+    bytes: ColferMarshallerMixin.marshallBinary,
+    str: ColferMarshallerMixin.marshallString,
+    SortedIntList: ColferMarshallerMixin.marshallSortedIntList,
+}
+
+MARSHALL_ELEMENT_TYPES_MAP = {
+    bool: ColferMarshallerMixin.marshallElementBool,
+    int: ColferMarshallerMixin.marshallElementInt64,
+    Int32: ColferMarshallerMixin.marshallElementInt32,
+    UInt8: ColferMarshallerMixin.marshallElementUint8,
+    UInt16: ColferMarshallerMixin.marshallElementUint,
+    UInt32: ColferMarshallerMixin.marshallElementUint,
+    UInt64: ColferMarshallerMixin.marshallElementUint64,
+    Float32: ColferMarshallerMixin.marshallElementFloat32,
+    float: ColferMarshallerMixin.marshallElementFloat64,
+    datetime.datetime: ColferMarshallerMixin.marshallElementTimestamp,
+    bytes: ColferMarshallerMixin.marshallElementBinary,
+    str: ColferMarshallerMixin.marshallElementString,
+}
@@ -0,0 +1,76 @@
+import typing
+
+import pydantic
+from pydantic import BaseModel, PrivateAttr, ValidationError
+
+from .colf_record import ColferRecordField
+
+# Colfer models run on pydantic v1 or v2, everything version specific goes through here
+PYDANTIC_V2 = str(pydantic.VERSION).startswith('2')
+
+# Per model class under v2: name to ColferRecordField, and name to TypeAdapter
+MODEL_FIELDS = {}
+FIELD_ADAPTERS = {}
+
+
+def setOptionalDefaults(modelType):
+    # v1 gives Optional fields an implicit None default while v2 makes them required. Called
+    # before v2 collects the fields of a new model class, so Colfer models mean the same on both.
+    if not PYDANTIC_V2:
+        return
+    for name, annotation in modelType.__dict__.get('__annotations__', {}).items():
+        if name.startswith('_') or name in modelType.__dict__:
+            continue
+        if isinstance(annotation, str):
+            isOptional = annotation.startswith(('Optional[', 'typing.Optional['))
+        else:
+            isOptional = typing.get_origin(annotation) is typing.Union \
+                         and type(None) in typing.get_args(annotation)
+        if isOptional:
+            setattr(modelType, name, None)
+
+
+def resolveForwardRefs(modelType):
+    # Annotations given as strings, for models that refer to each other
+    if PYDANTIC_V2:
+        modelType.model_rebuild()
+    else:
+        modelType.update_forward_refs()
+
+
+def getModelFields(modelType):
+    # Name to field in declaration order, each with the type_ and outer_type_ the codecs use
+    if not PYDANTIC_V2:
+        return modelType.__fields__
+
+    modelFields = MODEL_FIELDS.get(modelType)
+    if modelFields is None:
+        # v2 keeps only the annotation, derive type_ and outer_type_ the way v1 does
+        modelFields = {}
+        for name, fieldInfo in modelType.model_fields.items():
+            default = None if fieldInfo.is_required() else fieldInfo.default
+            modelFields[name] = ColferRecordField(name, fieldInfo.annotation, default)
+        MODEL_FIELDS[modelType] = modelFields
+    return modelFields
+
+
+def validateModelField(model, name, value):
+    modelType = type(model)
+    if not PYDANTIC_V2:
+        value, errors = modelType.__fields__[name].validate(value, {}, loc=name, cls=modelType)
+        if errors:
+            raise ValidationError([errors], modelType)
+        return value
+
+    # TypeAdapter compiles the annotation into a pydantic-core validator once per field
+    fieldAdapters = FIELD_ADAPTERS.setdefault(modelType, {})
+    if name not in fieldAdapters:
+        fieldAdapters[name] = pydantic.TypeAdapter(modelType.model_fields[name].annotation)
+    return fieldAdapters[name].validate_python(value)
+
+
+def getFieldsSet(model):
+    if PYDANTIC_V2:
+        return model.__pydantic_fields_set__
+    return model.__fields_set__
+
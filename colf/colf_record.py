@@ -0,0 +1,144 @@
+import enum
+import typing
+from typing import List
+
+from .colf_marshall import ColferMarshallerMixin
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+
+class ColferRecordField(object):
+    # Mirrors the type_ and outer_type_ of a pydantic field for the codecs
+    __slots__ = ('name', 'type_', 'outer_type_', 'default', 'validator')
+
+    def __init__(self, name, annotation, default=None):
+        self.name = name
+        self.default = default
+
+        if typing.get_origin(annotation) is typing.Union:
+            # Optional[X]
+            annotationArgs = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+            if len(annotationArgs) == 1:
+                annotation = annotationArgs[0]
+        self.outer_type_ = annotation
+
+        if typing.get_origin(annotation) in (list, List):
+            self.type_ = typing.get_args(annotation)[0]
+            self.outer_type_ = List[self.type_]
+        else:
+            self.type_ = annotation
+
+        # Enum members are looked up by value
+        if isinstance(self.type_, type) and issubclass(self.type_, enum.Enum):
+            validator = self.type_
+        else:
+            validator = getattr(self.type_, 'validate', None)
+        if validator is not None and self.outer_type_ is not self.type_:
+            self.validator = lambda value: [validator(element) for element in value]
+        else:
+            self.validator = validator
+
+    def validate(self, value):
+        if value is None or self.validator is None:
+            return value
+        return self.validator(value)
+
+
+def isClassVar(annotation):
+    if isinstance(annotation, str):
+        return annotation.startswith(('ClassVar', 'typing.ClassVar'))
+    return annotation is typing.ClassVar or typing.get_origin(annotation) is typing.ClassVar
+
+
+class ColferRecordMeta(type):
+    # Turns the annotations of a ColferRecord subclass into __slots__
+
+    def __new__(mcs, name, bases, namespace):
+        annotations = namespace.get('__annotations__', {})
+        fieldNames = [fieldName for fieldName, annotation in annotations.items()
+                      if not isClassVar(annotation)]
+
+        # Slots cannot have class level values, keep them as defaults
+        defaults = {}
+        for fieldName in fieldNames:
+            if fieldName in namespace:
+                defaults[fieldName] = namespace.pop(fieldName)
+        namespace['__slots__'] = tuple(namespace.get('__slots__', ())) + tuple(fieldNames)
+        namespace['__colferDefaults__'] = defaults
+        namespace['__colferFields__'] = None
+        return super(ColferRecordMeta, mcs).__new__(mcs, name, bases, namespace)
+
+
+class ColferRecord(ColferMarshallerMixin, ColferUnmarshallerMixin, metaclass=ColferRecordMeta):
+    # Immutable alternative to Colfer without a per instance __dict__, built from the same
+    # annotations and using the same codecs. Only unmarshall fills in the fields of a record
+    # after it is constructed.
+    __slots__ = ('_colferUnknownFields',)
+
+    def __init__(self, **fieldValues):
+        colferFields = self.getColferFields()
+        for name in fieldValues:
+            if name not in colferFields:
+                raise AttributeError('Attribute {} does not exist.'.format(name))
+        for name, colferField in colferFields.items():
+            value = fieldValues.get(name, colferField.default)
+            object.__setattr__(self, name, colferField.validate(value))
+        object.__setattr__(self, '_colferUnknownFields', None)
+
+    @classmethod
+    def getColferFields(cls):
+        colferFields = cls.__dict__['__colferFields__']
+        if colferFields is None:
+            # Resolved on first use so records may refer to records declared after them
+            colferFields = {}
+            for base in reversed(cls.__mro__):
+                if '__colferDefaults__' not in base.__dict__:
+                    continue
+                typeHints = typing.get_type_hints(base)
+                for name in base.__slots__:
+                    if name in typeHints:
+                        colferFields[name] = ColferRecordField(
+                            name, typeHints[name], base.__dict__['__colferDefaults__'].get(name))
+            type.__setattr__(cls, '__colferFields__', colferFields)
+        return colferFields
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable.'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable.'.format(type(self).__name__))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.getColferFields())
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name)) for name in self.getColferFields()))
+
+    def __reduce__(self):
+        return type(self), (), dict(self.items())
+
+    def __setstate__(self, state):
+        self.setKnownAttributes(state)
+
+    def items(self):
+        return iter((name, getattr(self, name)) for name in self.getColferFields())
+
+    def copy(self, update=None):
+        values = dict(self.items())
+        values.update(update or {})
+        return type(self)(**values)
+
+    def validateKnownAttribute(self, name, variableType, value, variableSubType=None):
+        return self.getColferFields()[name].validate(value)
+
+    def setKnownAttributes(self, values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def getUnknownFields(self):
+        return self._colferUnknownFields
+
+    def setUnknownFields(self, unknownFields):
+        object.__setattr__(self, '_colferUnknownFields', unknownFields)
@@ -0,0 +1,243 @@
+import typing
+
+from .colf_base import ColferConstants, OUTER_LIST, OUTER_MAP
+from .colf_unmarshall import ColferUnmarshallerMixin, DECODE_STATE
+
+# Per-class index table of (fieldKind, argument) used to find message boundaries, built on
+# first use
+SCAN_TABLES = {}
+
+# A field is skipped whole, is a nested message, a list of nested messages, a list skipped
+# element by element, or a map skipped entry by entry
+FIELD_LEAF, FIELD_OBJECT, FIELD_OBJECTS, FIELD_ELEMENTS, FIELD_ENTRIES = range(5)
+
+# Frames of the scan stack, the last item of a list frame counts what is left. A map is
+# scanned in an element frame whose elements are its entries.
+FRAME_MESSAGE, FRAME_TRAILER, FRAME_OBJECTS, FRAME_ELEMENTS = range(4)
+
+
+def skipVarIntElement(colfer, byteInput, offset):
+    return colfer.skipVarInt(byteInput, offset)
+
+
+def skipInt64Element(colfer, byteInput, offset):
+    return colfer.skipVarInt(byteInput, offset, 8)
+
+
+def skipTimestampElement(colfer, byteInput, offset):
+    offset = colfer.skipVarInt(byteInput, offset, 8)
+    return colfer.skipVarInt(byteInput, offset)
+
+
+def skipBinaryElement(colfer, byteInput, offset):
+    valueLength, offset = colfer.unmarshallVarInt(byteInput, offset)
+    colfer.checkLength(valueLength, byteInput, offset)
+    return offset + valueLength
+
+
+def getSkipEntry(colfer, keyType, valueType):
+    # Skips one key and its value, so a long map is not scanned again from its first entry
+    skipKey = colfer.getSkipElementFunction(keyType)
+    skipValue = colfer.getSkipElementFunction(valueType)
+    return lambda colfer, byteInput, offset: skipValue(colfer, byteInput, skipKey(colfer, byteInput, offset))
+
+
+# Lists whose elements are skipped one at a time, so a long list that arrives in many
+# chunks is not scanned again from its first element
+SKIP_ELEMENTS_MAP = {
+    ColferUnmarshallerMixin.skipListInt32: skipVarIntElement,
+    ColferUnmarshallerMixin.skipListInt64: skipInt64Element,
+    ColferUnmarshallerMixin.skipListTimestamp: skipTimestampElement,
+    ColferUnmarshallerMixin.skipListBinary: skipBinaryElement,
+}
+
+
+class ColferDecoder(object):
+    # Push style decoder for a stream of messages of one Colfer type, fed with chunks as
+    # they arrive. The scan for the end of the current message keeps its place in a stack
+    # of frames, one per nested message or list being skipped, so a chunk only resumes it.
+    # Only a field cut short by the end of a chunk is scanned again, from its own header.
+    # Each complete message is then decoded once with unmarshall.
+    #
+    # The compact layout has no sizes for unknown fields, so every field of a streamed
+    # message must be known to colferType. After a ValueError the stream is out of sync and
+    # the decoder must be discarded. limits overrides the limits of colferType for every
+    # message, as in unmarshall.
+
+    def __init__(self, colferType, limits=None):
+        self.colferType = colferType
+        self.colfer = colferType()
+        self.colfer.checkLimits(limits)
+        self.limits = limits
+        self.buffer = bytearray()
+        self.start = 0
+        self.offset = 0
+        self.stack = []
+
+    def getScanTable(self, colfer):
+        colferType = type(colfer)
+        if colferType not in SCAN_TABLES:
+            _, indexTable = colfer.getUnmarshallTable()
+            scanTable = [None] * len(indexTable)
+            for index, modelField in enumerate(colfer.getColferFields().values()):
+                _, _, skipFunction = indexTable[index]
+                outerKind, outerType = colfer.getOuterKind(modelField.outer_type_)
+                if outerKind == OUTER_LIST:
+                    elementType = colfer.getElementType(modelField.type_, outerType)
+                    isObjectList = colfer.isObjectType(elementType)
+                else:
+                    isObjectList = False
+
+                if outerKind == OUTER_MAP:
+                    keyType, valueType = typing.get_args(outerType)
+                    scanTable[index] = (FIELD_ENTRIES, getSkipEntry(colfer, keyType, valueType))
+                elif isObjectList:
+                    scanTable[index] = (FIELD_OBJECTS, elementType)
+                elif colfer.isObjectType(modelField.type_):
+                    scanTable[index] = (FIELD_OBJECT, modelField.type_)
+                elif skipFunction in SKIP_ELEMENTS_MAP:
+                    scanTable[index] = (FIELD_ELEMENTS, SKIP_ELEMENTS_MAP[skipFunction])
+                else:
+                    scanTable[index] = (FIELD_LEAF, skipFunction)
+            SCAN_TABLES[colferType] = scanTable
+        return SCAN_TABLES[colferType]
+
+    def pushMessage(self, colfer, depth):
+        maxDepth = self.colfer.getLimit('COLFER_MAX_DEPTH')
+        if depth > maxDepth:
+            raise ValueError('Messages are nested deeper than COLFER_MAX_DEPTH {}'.format(maxDepth))
+        # Legacy messages end after one slot per field instead of at a terminator
+        slotCount = len(colfer.getColferFields())
+        self.stack.append([FRAME_MESSAGE, colfer, self.getScanTable(colfer), depth, slotCount])
+
+    def skipPartial(self, skipFunction, colfer):
+        # Offset after the field or element at offset, or None when its end has not arrived
+        try:
+            end = skipFunction(colfer, self.buffer, self.offset)
+        except IndexError:
+            return None
+        return end if end <= len(self.buffer) else None
+
+    def readCount(self, colfer, elementSize):
+        # List length or map entry count after the header at offset, or None when it has
+        # not arrived
+        try:
+            valueLength, offset = colfer.unmarshallVarInt(self.buffer, self.offset + 1)
+        except IndexError:
+            return None, self.offset
+        colfer.checkListLength(valueLength, self.buffer, offset, elementSize)
+        return valueLength, offset
+
+    def scanField(self, frame):
+        colfer, scanTable, depth = frame[1:4]
+        header = self.buffer[self.offset]
+        if scanTable[header & 0x7f] is None:
+            raise ValueError('Field index {} is unknown, its size is not on the wire'.format(header & 0x7f))
+        fieldKind, argument = scanTable[header & 0x7f]
+
+        if fieldKind == FIELD_LEAF:
+            end = self.skipPartial(argument, colfer)
+            if end is None:
+                return False
+            self.offset = end
+        elif fieldKind == FIELD_OBJECT:
+            self.offset += 1
+            self.stack.append([FRAME_TRAILER, colfer, 1])
+            self.pushMessage(argument(), depth + 1)
+        else:
+            valueLength, offset = self.readCount(colfer, 2 if fieldKind == FIELD_ENTRIES else 1)
+            if valueLength is None:
+                return False
+            self.offset = offset
+            self.stack.append([FRAME_TRAILER, colfer, 1])
+            if fieldKind == FIELD_OBJECTS:
+                self.stack.append([FRAME_OBJECTS, argument, depth + 1, valueLength])
+            else:
+                self.stack.append([FRAME_ELEMENTS, colfer, argument, valueLength])
+        frame[-1] -= 1
+        return True
+
+    def scanStep(self, frame):
+        # Advances the top frame by one step, False when the step needs more input
+        frameKind = frame[0]
+        if frameKind == FRAME_MESSAGE:
+            header = self.buffer[self.offset]
+            if header != 0x7f:
+                return self.scanField(frame)
+            self.offset += 1
+            frame[-1] -= 1
+            if frame[1].COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+                self.stack.pop()
+        elif frameKind == FRAME_TRAILER:
+            _, self.offset = frame[1].unmarshallHeader(None, self.buffer, self.offset)
+            self.stack.pop()
+        elif frameKind == FRAME_OBJECTS:
+            frame[-1] -= 1
+            self.pushMessage(frame[1](), frame[2])
+        else:
+            end = self.skipPartial(frame[2], frame[1])
+            if end is None:
+                return False
+            self.offset = end
+            frame[-1] -= 1
+        return True
+
+    def scan(self):
+        # True once the message at start is complete, with offset at its end
+        stack = self.stack
+        while stack:
+            frame = stack[-1]
+            if frame[-1] == 0 and (frame[0] != FRAME_MESSAGE or
+                                   frame[1].COLFER_WIRE_MODE == ColferConstants.COLFER_WIRE_LEGACY):
+                # List or legacy message without anything left
+                stack.pop()
+                continue
+            if self.offset >= len(self.buffer) or not self.scanStep(frame):
+                return False
+        return True
+
+    def feed(self, chunk):
+        # Appends chunk to the stream, returns the messages it completed in stream order
+        self.buffer += chunk
+        spans = []
+
+        DECODE_STATE.limits = self.limits
+        maxSize = self.colfer.getLimit('COLFER_MAX_SIZE')
+        DECODE_STATE.end = self.start + maxSize
+        DECODE_STATE.partial = True
+        try:
+            while True:
+                if not self.stack:
+                    if self.offset >= len(self.buffer):
+                        break
+                    self.start = self.offset
+                    DECODE_STATE.end = self.start + maxSize
+                    self.pushMessage(self.colfer, 0)
+                if not self.scan():
+                    if len(self.buffer) - self.start > maxSize:
+                        raise ValueError('Message of over {} bytes exceeds COLFER_MAX_SIZE {}'.format(
+                            len(self.buffer) - self.start, maxSize))
+                    break
+                spans.append((self.start, self.offset))
+        finally:
+            DECODE_STATE.end = None
+            DECODE_STATE.partial = False
+            DECODE_STATE.limits = None
+
+        # Each message is decoded from its own copy, so values never share the buffer
+        values = []
+        for start, end in spans:
+            value, _ = self.colferType().unmarshall(
+                bytes(self.buffer[start:end]), end=end - start, limits=self.limits)
+            values.append(value)
+
+        # Keep only the message still being received
+        consumed = self.start if self.stack else self.offset
+        del self.buffer[:consumed]
+        self.offset -= consumed
+        self.start = 0
+        return values
+
+    def getPendingSize(self):
+        # Bytes received of a message that is not complete yet
+        return len(self.buffer) - self.start if self.stack else 0
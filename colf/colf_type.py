@@ -1,3 +1,5 @@
+import struct
+
 def validate_number(v, size, byte_order='little', signed=False):
     if not isinstance(v, int) and not isinstance(v, bytes):
         raise TypeError('must be int or bytes')
@@ -15,6 +17,19 @@ def validate_number(v, size, byte_order='little', signed=False):
     return v
 
 
+def get_core_schema(validator):
+    # pydantic v2 has no __get_validators__, wrap the same validator for pydantic-core,
+    # which turns ValueError but not TypeError into a ValidationError
+    from pydantic_core import core_schema
+
+    def validate(v):
+        try:
+            return validator(v)
+        except TypeError as error:
+            raise ValueError(str(error))
+    return core_schema.no_info_plain_validator_function(validate)
+
+
 class UInt64(bytes):
 
     @classmethod
@@ -22,8 +37,8 @@ class UInt64(bytes):
         yield cls.validate
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        pass
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
 
     @classmethod
     def validate(cls, v):
@@ -40,8 +55,8 @@ class UInt32(bytes):
         yield cls.validate
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        pass
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
 
     @classmethod
     def validate(cls, v):
@@ -58,8 +73,8 @@ class UInt16(bytes):
         yield cls.validate
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        pass
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
 
     @classmethod
     def validate(cls, v):
@@ -76,8 +91,8 @@ class UInt8(bytes):
         yield cls.validate
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        pass
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
 
     @classmethod
     def validate(cls, v):
@@ -94,8 +109,8 @@ class Int32(bytes):
         yield cls.validate
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        pass
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
 
     @classmethod
     def validate(cls, v):
@@ -103,3 +118,60 @@ class Int32(bytes):
 
     def __repr__(self):
         return f'Int32({super().__repr__()})'
+
+
+class Float32(float):
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
+
+    @classmethod
+    def validate(cls, v):
+        if not isinstance(v, (int, float)):
+            raise TypeError('must be float')
+
+        # Round to single precision so the value survives a marshall round trip
+        try:
+            rounded = struct.unpack('<f', struct.pack('<f', v))[0]
+        except OverflowError:
+            raise ValueError('convert out-of-bound')
+
+        return cls(rounded)
+
+    def __repr__(self):
+        return f'Float32({super().__repr__()})'
+
+
+class SortedIntList(list):
+    # List[int] written as the differences between consecutive elements, which take one or
+    # two bytes each when the list is sorted. Any order decodes back, unsorted lists are only
+    # larger.
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return get_core_schema(cls.validate)
+
+    @classmethod
+    def validate(cls, v):
+        if not isinstance(v, (list, tuple, range)):
+            raise TypeError('must be a list of int')
+
+        for element in v:
+            if not isinstance(element, int) or isinstance(element, bool):
+                raise TypeError('must be a list of int')
+            if not -2 ** 63 <= element < 2 ** 63:
+                raise ValueError('convert out-of-bound')
+
+        return v if type(v) is cls else cls(v)
+
+    def __repr__(self):
+        return f'SortedIntList({super().__repr__()})'
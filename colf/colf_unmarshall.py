@@ -1,15 +1,49 @@
 import datetime
+import itertools
+import struct
+import threading
 from typing import List
 import typing
 
-from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants
-from .colf_type import Int32, UInt8, UInt16, UInt32, UInt64
+from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants, \
+    OUTER_LIST, OUTER_MAP
+from .colf_type import Int32, UInt8, UInt16, UInt32, UInt64, Float32, SortedIntList
+
+EPOCH = datetime.datetime.utcfromtimestamp(0)
+
+# Per-class (fieldNames, indexTable) used by unmarshall, built on first use
+UNMARSHALL_TABLES = {}
+
+# Per-class field index to ColferInternTable of the COLFER_INTERN_FIELDS
+INTERN_TABLES = {}
+
+# Limits of the unmarshall running in this thread: end of the outermost message, nesting
+# depth, whether the input is partial and the limits given to the call. Also whether it
+# decodes into the existing objects, and the end of the outermost message when the caller
+# knows it.
+DECODE_STATE = threading.local()
+
+# Per-class free-lists of nested objects that unmarshall(reuse=True) no longer needs
+FREE_LISTS = {}
+
+# Varints of 32-bit values, lengths, counts and ordinals take at most 5 bytes, and a bool
+# bitmap at most one bit per field index. 64-bit values take a whole ninth byte instead.
+VARINT32_MAX_BYTES = 5
+BITMAP_MAX_BYTES = (ColferConstants.COLFER_MAX_INDEX + 6) // 7
+
+# Limits that unmarshall(limits=...) and ColferDecoder(limits=...) may override
+LIMIT_NAMES = ('COLFER_MAX_SIZE', 'COLFER_LIST_MAX', 'COLFER_MAX_DEPTH')
 
 
 class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants):
+    __slots__ = ()
 
     def unmarshallHeader(self, value, byteInput, offset):
-        assert (byteInput[offset] == 0x7f)
+        if self.COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+            return value, offset
+        if byteInput[offset] != 0x7f:
+            raise ValueError('Expected the 0x7f trailer at offset {}, found 0x{:02x}'.format(
+                offset, byteInput[offset]))
         offset += 1
         return value, offset
 
@@ -20,7 +54,9 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
             offset += 1
         return value, offset
 
-    def unmarshallVarInt(self, byteInput, offset, limit=-1):
+    def unmarshallVarInt(self, byteInput, offset, limit=-1, maxBytes=VARINT32_MAX_BYTES):
+        # With limit the byte after limit bytes is taken whole, otherwise the varint may not
+        # run past maxBytes, so hostile input cannot make it build a huge int
         value = 0
         bitShift = 0
 
@@ -34,7 +70,10 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
                 bitShift += 7
                 limit -= 1
         else:
+            maxShift = 7 * (maxBytes - 1)
             while valueAsByte > 0x7f:
+                if bitShift == maxShift:
+                    raise ValueError('Varint at offset {} is longer than {} bytes'.format(offset - maxBytes, maxBytes))
                 value |= (valueAsByte & 0x7f) << bitShift
                 valueAsByte = byteInput[offset]
                 offset += 1
@@ -44,6 +83,10 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         return value, offset
 
+    def checkVarIntRange(self, value, maxValue, offset):
+        if value > maxValue:
+            raise ValueError('Varint {} ending at offset {} exceeds {}'.format(value, offset, maxValue))
+
     def unmarshallBool(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
@@ -53,6 +96,31 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         return self.unmarshallHeader(value, byteInput, offset)
 
+    def unmarshallBoolBitmap(self, index, byteInput, offset):
+        # Bool fields of a bitmap message, unpackBoolBitmap spreads them over the fields
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
+
+        # Compressed Path
+        value, offset = self.unmarshallVarInt(byteInput, offset, maxBytes=BITMAP_MAX_BYTES)
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unpackBoolBitmap(self, values):
+        _, boolNames = self.getBoolFields()
+        if not boolNames or values[boolNames[0]] is None:
+            return
+        # Bits of bool fields a newer schema appended are dropped
+        bitSet = values[boolNames[0]] & ((1 << len(boolNames)) - 1)
+        values[boolNames[0]] = None
+        # Visits the set bits only, lowest first
+        while bitSet:
+            lowestBit = bitSet & -bitSet
+            values[boolNames[lowestBit.bit_length() - 1]] = True
+            bitSet ^= lowestBit
+
     def unmarshallUint8(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
@@ -91,6 +159,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         value, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkVarIntRange(value, 0x80000000 if indexIsSigned else 0x7fffffff, offset)
         value = -value if indexIsSigned else value
 
         return self.unmarshallHeader(value, byteInput, offset)
@@ -103,7 +172,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset)
 
         value = []
 
@@ -111,6 +180,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
             # Compressed Path
             valueElementEncoded, offset = self.unmarshallVarInt(
                 byteInput, offset)
+            self.checkVarIntRange(valueElementEncoded, 0xffffffff, offset)
             # Move last bit to front
             valueElement = self.decodeInt32(valueElementEncoded)
             # Append to Array
@@ -132,6 +202,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         else:
             # Compressed
             value, offset = self.unmarshallVarInt(byteInput, offset)
+            self.checkVarIntRange(value, 0xffffffff, offset)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
@@ -145,6 +216,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         value, offset = self.unmarshallVarInt(byteInput, offset, 8)
+        self.checkVarIntRange(value, 0x8000000000000000 if indexIsSigned else 0x7fffffffffffffff, offset)
         value = -value if indexIsSigned else value
 
         return self.unmarshallHeader(value, byteInput, offset)
@@ -157,7 +229,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset)
         value = []
 
         for _ in range(valueLength):
@@ -171,6 +243,29 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         return self.unmarshallHeader(value, byteInput, offset)
 
+    def unmarshallSortedIntList(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
+
+        # Compressed Path
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkListLength(valueLength, byteInput, offset)
+
+        differences = []
+        for _ in range(valueLength):
+            # Compressed Path
+            valueElementEncoded, offset = self.unmarshallVarInt(byteInput, offset, 8)
+            differences.append(self.decodeInt64(valueElementEncoded))
+
+        # Prefix sums restore the elements, differences of far apart elements wrapped around
+        value = SortedIntList(itertools.accumulate(differences))
+        if value and (min(value) < -0x8000000000000000 or max(value) > 0x7fffffffffffffff):
+            value[:] = [self.wrapInt64(valueElement) for valueElement in value]
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
     def unmarshallUint64(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
@@ -183,8 +278,8 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
             # Flat
             value, offset = self.unmarshallInt(byteInput, offset, 8)
         else:
-            # Compressed
-            value, offset = self.unmarshallVarInt(byteInput, offset)
+            # Compressed, the writer uses at most 7 bytes, and 9 cannot exceed 64 bits
+            value, offset = self.unmarshallVarInt(byteInput, offset, 8)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
@@ -210,7 +305,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset, 4)
 
         value = []
 
@@ -247,7 +342,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset, 8)
         value = []
 
         for _ in range(valueLength):
@@ -272,17 +367,59 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         if indexIsFlat:
             seconds, offset = self.unmarshallInt(byteInput, offset, 8)
             nanoSeconds, offset = self.unmarshallInt(byteInput, offset, 4)
+            # Flat seconds are signed, times before the epoch are negative
+            if seconds & 0x8000000000000000:
+                seconds -= 0x10000000000000000
         else:
             seconds, offset = self.unmarshallInt(byteInput, offset, 4)
             nanoSeconds, offset = self.unmarshallInt(byteInput, offset, 4)
 
-        timeDelta = datetime.timedelta(
-            seconds=seconds, microseconds=nanoSeconds//1000)
+        value = self.getTimestamp(seconds, nanoSeconds)
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListTimestamp(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
+
+        # Compressed Path
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkListLength(valueLength, byteInput, offset, 2)
+
+        value = []
+
+        for _ in range(valueLength):
+            # Compressed Path
+            secondsEncoded, offset = self.unmarshallVarInt(byteInput, offset, 8)
+            nanoSeconds, offset = self.unmarshallVarInt(byteInput, offset)
+            # Append to Array
+            value.append(self.getTimestamp(self.decodeInt64(secondsEncoded), nanoSeconds))
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListBool(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
 
-        value = datetime.datetime.utcfromtimestamp(0) + timeDelta
+        # Compressed Path
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkListLength(valueLength, byteInput, offset, 0)
+        self.checkLength((valueLength + 7) >> 3, byteInput, offset)
+
+        # Flat - packed bit set, element 0 in the lowest bit of the first byte
+        bitSet, offset = self.unmarshallBitSet(byteInput, offset, (valueLength + 7) >> 3)
+        value = [bool((bitSet >> bitIndex) & 1) for bitIndex in range(valueLength)]
 
         return self.unmarshallHeader(value, byteInput, offset)
 
+    def unmarshallBitSet(self, byteInput, offset, length):
+        value = int.from_bytes(byteInput[offset:offset+length], "little")
+        return value, offset + length
+
     def unmarshallBinary(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
@@ -291,10 +428,10 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
+        self.checkLength(valueLength, byteInput, offset)
 
-        # Flat
-        value = byteInput[offset:offset+valueLength]
+        # Flat, copied so the value does not hold on to a buffer given to unmarshall
+        value = bytes(byteInput[offset:offset+valueLength])
         offset += valueLength
 
         return self.unmarshallHeader(value, byteInput, offset)
@@ -307,22 +444,22 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset)
 
         value = []
         # Flat
         for _ in range(valueLength):
             # Compressed Path
             valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-            assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
+            self.checkLength(valueLength, byteInput, offset)
             # Flat
-            valueAsBytes = byteInput[offset:offset + valueLength]
+            valueAsBytes = bytes(byteInput[offset:offset + valueLength])
             offset += valueLength
             value.append(valueAsBytes)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
-    def unmarshallString(self, index, byteInput, offset):
+    def unmarshallString(self, index, byteInput, offset, internTable=None):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
 
@@ -330,16 +467,19 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
+        self.checkLength(valueLength, byteInput, offset)
 
         # Flat
         valueAsBytes = byteInput[offset:offset+valueLength]
         offset += valueLength
-        value = self.decodeUTFBytes(valueAsBytes)
+        if internTable is None:
+            value = self.decodeUTFBytes(valueAsBytes)
+        else:
+            value = internTable.decode(valueAsBytes)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
-    def unmarshallListString(self, index, byteInput, offset):
+    def unmarshallListString(self, index, byteInput, offset, internTable=None):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
 
@@ -347,33 +487,170 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset)
 
         value = []
         # Flat
         for _ in range(valueLength):
             # Compressed Path
             valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-            assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
+            self.checkLength(valueLength, byteInput, offset)
             # Flat
             valueAsBytes = byteInput[offset:offset + valueLength]
             offset += valueLength
-            value.append(self.decodeUTFBytes(valueAsBytes))
+            if internTable is None:
+                value.append(self.decodeUTFBytes(valueAsBytes))
+            else:
+                value.append(internTable.decode(valueAsBytes))
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def getEnumMember(self, members, ordinal):
+        if ordinal >= len(members):
+            # Written by a newer schema, or not an enum at all
+            raise ValueError('Enum ordinal {} is out of range for {} members'.format(ordinal, len(members)))
+        return members[ordinal]
+
+    def unmarshallEnum(self, index, byteInput, offset, variableType):
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
+        members, _ = self.getEnumTable(variableType)
+
+        # Compressed Path
+        ordinal, offset = self.unmarshallVarInt(byteInput, offset)
+        value = self.getEnumMember(members, ordinal)
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListEnum(self, index, byteInput, offset, variableType):
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
+        members, _ = self.getEnumTable(variableType)
+
+        # Compressed Path
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkListLength(valueLength, byteInput, offset)
+
+        value = []
+        for _ in range(valueLength):
+            # Compressed Path
+            ordinal, offset = self.unmarshallVarInt(byteInput, offset)
+            value.append(self.getEnumMember(members, ordinal))
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallElementBool(self, byteInput, offset):
+        return byteInput[offset] != 0, offset + 1
+
+    def unmarshallElementUint8(self, byteInput, offset):
+        return byteInput[offset], offset + 1
+
+    def unmarshallElementUint(self, byteInput, offset):
+        value, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkVarIntRange(value, 0xffffffff, offset)
+        return value, offset
+
+    def unmarshallElementUint64(self, byteInput, offset):
+        return self.unmarshallVarInt(byteInput, offset, 8)
+
+    def unmarshallElementInt32(self, byteInput, offset):
+        valueEncoded, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkVarIntRange(valueEncoded, 0xffffffff, offset)
+        return self.decodeInt32(valueEncoded), offset
+
+    def unmarshallElementInt64(self, byteInput, offset):
+        valueEncoded, offset = self.unmarshallVarInt(byteInput, offset, 8)
+        return self.decodeInt64(valueEncoded), offset
+
+    def unmarshallElementFloat32(self, byteInput, offset):
+        return self.getBytesAsFloat(byteInput[offset:offset+4]), offset + 4
+
+    def unmarshallElementFloat64(self, byteInput, offset):
+        return self.getBytesAsDouble(byteInput[offset:offset+8]), offset + 8
+
+    def unmarshallElementTimestamp(self, byteInput, offset):
+        secondsEncoded, offset = self.unmarshallVarInt(byteInput, offset, 8)
+        nanoSeconds, offset = self.unmarshallVarInt(byteInput, offset)
+        return self.getTimestamp(self.decodeInt64(secondsEncoded), nanoSeconds), offset
+
+    def getTimestamp(self, seconds, nanoSeconds):
+        # Any 64 bit seconds can be on the wire, datetime only holds the years 1 to 9999
+        try:
+            return EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoSeconds//1000)
+        except OverflowError:
+            raise ValueError('Timestamp of {} seconds is out of the datetime range'.format(seconds))
+
+    def unmarshallElementBinary(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkLength(valueLength, byteInput, offset)
+        return bytes(byteInput[offset:offset+valueLength]), offset + valueLength
+
+    def unmarshallElementString(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkLength(valueLength, byteInput, offset)
+        return self.decodeUTFBytes(byteInput[offset:offset+valueLength]), offset + valueLength
+
+    def getUnmarshallElementFunction(self, elementType):
+        # Resolved functions are all called as function(self, byteInput, offset)
+        if elementType in UNMARSHALL_ELEMENT_TYPES_MAP:
+            return UNMARSHALL_ELEMENT_TYPES_MAP[elementType]
+        if self.isEnumType(elementType):
+            members, _ = self.getEnumTable(elementType)
+
+            def unmarshallElementEnum(colfer, byteInput, offset):
+                ordinal, offset = colfer.unmarshallVarInt(byteInput, offset)
+                return colfer.getEnumMember(members, ordinal), offset
+            return unmarshallElementEnum
+        raise ValueError('{} cannot be a map key or value'.format(elementType))
+
+    def unmarshallMap(self, index, byteInput, offset, variableOuterType):
+        if (byteInput[offset] & 0x7f) != index:
+            return None, offset
+
+        offset += 1
+        keyType, valueType = typing.get_args(variableOuterType)
+        unmarshallKey = self.getUnmarshallElementFunction(keyType)
+        unmarshallValue = self.getUnmarshallElementFunction(valueType)
+
+        # Compressed Path
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkListLength(valueLength, byteInput, offset, 2)
+
+        value = {}
+        for _ in range(valueLength):
+            key, offset = unmarshallKey(self, byteInput, offset)
+            value[key], offset = unmarshallValue(self, byteInput, offset)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
-    def unmarshallObject(self, index, byteInput, offset):
+    def unmarshallObject(self, index, byteInput, offset, variableType=None):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
 
         offset += 1
+        variableType = variableType or type(self)
+        if self.isReusing():
+            value = self.getReusableValue(self.getUnmarshallTable()[0][index])
+            if type(value) is not variableType:
+                value = self.acquireObject(variableType)
+        else:
+            value = variableType()
 
         # Flat
-        value, offset = type(self)().unmarshall(byteInput, offset)
+        self.enterNested()
+        try:
+            value, offset = value.unmarshall(byteInput, offset)
+        finally:
+            DECODE_STATE.depth -= 1
+        self.checkNestedEnd(value, byteInput, offset)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
-    def unmarshallListObject(self, index, byteInput, offset):
+    def unmarshallListObject(self, index, byteInput, offset, variableType=None):
         if (byteInput[offset] & 0x7f) != index:
             return None, offset
 
@@ -381,73 +658,692 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         # Compressed Path
         valueLength, offset = self.unmarshallVarInt(byteInput, offset)
-        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+        self.checkListLength(valueLength, byteInput, offset)
 
+        variableType = variableType or type(self)
         value = []
+        if self.isReusing():
+            # Refill the previous list and its elements in place
+            previous = self.getReusableValue(self.getUnmarshallTable()[0][index])
+            if isinstance(previous, list):
+                value = previous
+                for element in value[valueLength:]:
+                    self.releaseObject(element)
+                del value[valueLength:]
+
         # Flat
-        for _ in range(valueLength):
-            # Flat
-            valueAsObject, offset = type(self)().unmarshall(byteInput, offset)
-            value.append(valueAsObject)
+        self.enterNested()
+        try:
+            for position in range(valueLength):
+                if position < len(value) and type(value[position]) is variableType:
+                    valueAsObject = value[position]
+                elif self.isReusing():
+                    if position < len(value):
+                        self.releaseObject(value[position])
+                    valueAsObject = self.acquireObject(variableType)
+                else:
+                    valueAsObject = variableType()
+                # Flat
+                valueAsObject, offset = valueAsObject.unmarshall(byteInput, offset)
+                self.checkNestedEnd(valueAsObject, byteInput, offset)
+                if position < len(value):
+                    value[position] = valueAsObject
+                else:
+                    value.append(valueAsObject)
+        finally:
+            DECODE_STATE.depth -= 1
 
         return self.unmarshallHeader(value, byteInput, offset)
 
+    def isReusing(self):
+        return getattr(DECODE_STATE, 'reuse', False)
+
+    def acquireObject(self, variableType):
+        freeList = FREE_LISTS.get(variableType)
+        return freeList.pop() if freeList else variableType()
+
+    def releaseObject(self, value):
+        # Nested objects dropped by a reusing unmarshall wait here for the next message
+        if isinstance(value, ColferUnmarshallerMixin):
+            freeList = FREE_LISTS.setdefault(type(value), [])
+            if len(freeList) < value.COLFER_FREE_LIST_MAX:
+                freeList.append(value)
+
+    def recycleValues(self, values):
+        # Keeps the previous lists of a reusing unmarshall, refilled with the new elements,
+        # and releases the nested objects the new message no longer has
+        for name, value in values.items():
+            previous = self.getReusableValue(name)
+            if previous is None or previous is value:
+                continue
+            if isinstance(previous, list):
+                if isinstance(value, list):
+                    previous[:] = value
+                    values[name] = previous
+                else:
+                    for element in previous:
+                        self.releaseObject(element)
+            else:
+                self.releaseObject(previous)
+
+    def getInputEnd(self, byteInput):
+        # End of the outermost message, so a length prefix cannot reach past its size limit.
+        # Input still being received may grow up to that limit.
+        end = getattr(DECODE_STATE, 'end', None)
+        if end is None:
+            return len(byteInput)
+        return end if getattr(DECODE_STATE, 'partial', False) else min(end, len(byteInput))
+
+    def getLimit(self, name):
+        # Limit given to the running unmarshall, else the one of the class
+        limits = getattr(DECODE_STATE, 'limits', None)
+        if limits and name in limits:
+            return limits[name]
+        return getattr(self, name)
+
+    def checkLength(self, valueLength, byteInput, offset):
+        # Before slicing or allocating, the bytes must be in the input and within the limits
+        maxSize = self.getLimit('COLFER_MAX_SIZE')
+        if valueLength > maxSize:
+            raise ValueError('Length {} exceeds COLFER_MAX_SIZE {}'.format(valueLength, maxSize))
+        if valueLength > self.getInputEnd(byteInput) - offset:
+            raise ValueError('Length {} at offset {} runs past the end of the message'.format(valueLength, offset))
+
+    def checkListLength(self, valueLength, byteInput, offset, elementSize=1):
+        # Every element takes at least elementSize bytes, so a hostile count is rejected
+        # before the decode loop starts
+        listMax = self.getLimit('COLFER_LIST_MAX')
+        if valueLength > listMax:
+            raise ValueError('List length {} exceeds COLFER_LIST_MAX {}'.format(valueLength, listMax))
+        if valueLength * elementSize > self.getInputEnd(byteInput) - offset:
+            raise ValueError('List length {} at offset {} runs past the end of the message'.format(
+                valueLength, offset))
+
+    def enterNested(self):
+        depth = getattr(DECODE_STATE, 'depth', 0) + 1
+        maxDepth = self.getLimit('COLFER_MAX_DEPTH')
+        if depth > maxDepth:
+            raise ValueError('Messages are nested deeper than COLFER_MAX_DEPTH {}'.format(maxDepth))
+        DECODE_STATE.depth = depth
+
+    def checkNestedEnd(self, value, byteInput, offset):
+        # The parent always has a trailer or terminator after a nested message
+        if offset >= len(byteInput):
+            raise ValueError('Input ends inside the parent of a nested {}'.format(type(value).__name__))
+
+    def unmarshallNone(self, index, byteInput, offset):  # pragma: no cover
+        return None, offset
+
+    def getUnmarshallFunction(self, variableType, variableOuterType):
+
+        # Resolved functions are all called as function(self, index, byteInput, offset)
+        outerKind, variableOuterType = self.getOuterKind(variableOuterType)
+        if outerKind == OUTER_MAP:
+            return lambda colfer, index, byteInput, offset: \
+                colfer.unmarshallMap(index, byteInput, offset, variableOuterType)
+        if outerKind == OUTER_LIST:
+            if variableOuterType in UNMARSHALL_LIST_TYPES_MAP:
+                return UNMARSHALL_LIST_TYPES_MAP[variableOuterType]
+            elementType = self.getElementType(variableType, variableOuterType)
+            if self.isEnumType(elementType):
+                return lambda colfer, index, byteInput, offset: \
+                    colfer.unmarshallListEnum(index, byteInput, offset, elementType)
+            if self.isObjectType(elementType):
+                return lambda colfer, index, byteInput, offset: \
+                    colfer.unmarshallListObject(index, byteInput, offset, elementType)
+        elif variableType in UNMARSHALL_TYPES_MAP:
+            return UNMARSHALL_TYPES_MAP[variableType]
+        elif self.isEnumType(variableType):
+            return lambda colfer, index, byteInput, offset: \
+                colfer.unmarshallEnum(index, byteInput, offset, variableType)
+        elif self.isObjectType(variableType):
+            return lambda colfer, index, byteInput, offset: \
+                colfer.unmarshallObject(index, byteInput, offset, variableType)
+        return ColferUnmarshallerMixin.unmarshallNone  # pragma: no cover
+
+    def getUnmarshallTable(self):
+        colferType = type(self)
+        if colferType not in UNMARSHALL_TABLES:
+            fieldNames = []
+            indexTable = [None] * (ColferConstants.COLFER_MAX_INDEX + 1)
+            for index, (name, modelField) in enumerate(self.getColferFields().items()):
+                assert (index < ColferConstants.COLFER_MAX_INDEX)
+                fieldNames.append(name)
+                functionToCall = self.getUnmarshallFunction(modelField.type_, modelField.outer_type_)
+                skipFunction = self.getSkipFunction(modelField.type_, modelField.outer_type_)
+                internTable = self.getInternTables().get(index)
+                if internTable is not None:
+                    functionToCall = self.getInternFunction(functionToCall, internTable)
+                if self.COLFER_WIRE_MODE == ColferConstants.COLFER_WIRE_BITMAP \
+                        and index == self.getBoolFields()[0]:
+                    # Header and a varint of up to one bit per field index
+                    functionToCall = ColferUnmarshallerMixin.unmarshallBoolBitmap
+                    skipFunction = ColferUnmarshallerMixin.skipBoolBitmap
+                indexTable[index] = (name, functionToCall, skipFunction)
+            UNMARSHALL_TABLES[colferType] = (fieldNames, indexTable)
+        return UNMARSHALL_TABLES[colferType]
+
+    def getInternFunction(self, functionToCall, internTable):
+        return lambda colfer, index, byteInput, offset: \
+            functionToCall(colfer, index, byteInput, offset, internTable)
+
+    def getInternTables(self):
+        colferType = type(self)
+        if colferType not in INTERN_TABLES:
+            internTables = {}
+            if self.COLFER_INTERN_FIELDS:
+                from .colf_cache import ColferInternTable
+                for index in self.getStringFieldIndexes(self.COLFER_INTERN_FIELDS, 'COLFER_INTERN_FIELDS'):
+                    internTables[index] = ColferInternTable(self.COLFER_INTERN_MAX)
+            INTERN_TABLES[colferType] = internTables
+        return INTERN_TABLES[colferType]
+
+    def getInternTable(self, name):
+        # ColferInternTable of a field in COLFER_INTERN_FIELDS, for its stats
+        return self.getInternTables()[list(self.getColferFields()).index(name)]
+
     def unmarshallList(self, index, byteInput, offset, variableOuterType=None):
-        STRING_TYPES_MAP = {
-            List[int]: ColferUnmarshallerMixin.unmarshallListInt64,
-            List[Int32]: ColferUnmarshallerMixin.unmarshallListInt32,
-            List[float]: ColferUnmarshallerMixin.unmarshallListFloat64,
-            List[bytes]: ColferUnmarshallerMixin.unmarshallListBinary,
-            List[str]: ColferUnmarshallerMixin.unmarshallListString,
-        }
-
-        if variableOuterType in STRING_TYPES_MAP:
-            functionToCall = STRING_TYPES_MAP[variableOuterType]
-            return functionToCall(self, index, byteInput, offset)
-        else:  # pragma: no cover
-            return None, offset
+        functionToCall = self.getUnmarshallFunction(None, variableOuterType)
+        return functionToCall(self, index, byteInput, offset)
 
     def unmarshallType(self, variableType, variableOuterType, index, byteInput, offset):
-        STRING_TYPES_MAP = {
-            bool: ColferUnmarshallerMixin.unmarshallBool,
-            int: ColferUnmarshallerMixin.unmarshallInt64,
-            Int32: ColferUnmarshallerMixin.unmarshallInt32,
-            UInt8: ColferUnmarshallerMixin.unmarshallUint8,
-            UInt16: ColferUnmarshallerMixin.unmarshallUint16,
-            UInt32: ColferUnmarshallerMixin.unmarshallUint32,
-            UInt64: ColferUnmarshallerMixin.unmarshallUint64,
-            float: ColferUnmarshallerMixin.unmarshallFloat64,
-            bytes: ColferUnmarshallerMixin.unmarshallBinary,
-            str: ColferUnmarshallerMixin.unmarshallString,
-            dict: ColferUnmarshallerMixin.unmarshallObject,
-        }
-        if type(variableOuterType) == typing._GenericAlias:
-            return self.unmarshallList(index, byteInput, offset, variableOuterType)
-        if variableType in STRING_TYPES_MAP:
-            functionToCall = STRING_TYPES_MAP[variableType]
-            return functionToCall(self, index, byteInput, offset)
-        else:  # pragma: no cover
-            return None, offset
+        functionToCall = self.getUnmarshallFunction(variableType, variableOuterType)
+        return functionToCall(self, index, byteInput, offset)
+
+    def unmarshallField(self, indexTable, values, byteInput, offset):
+        index = byteInput[offset] & 0x7f
+        if indexTable[index] is None:
+            raise ValueError('Field index {} at offset {} is unknown to {}'.format(
+                index, offset, type(self).__name__))
+        name, functionToCall, _ = indexTable[index]
+        values[name], offset = functionToCall(self, index, byteInput, offset)
+        return offset
+
+    def skipVarInt(self, byteInput, offset, limit=-1, maxBytes=VARINT32_MAX_BYTES):
+        # The same bounds as unmarshallVarInt
+        if limit > 0:
+            while byteInput[offset] > 0x7f and limit:
+                offset += 1
+                limit -= 1
+            return offset + 1
+        end = offset + maxBytes
+        while byteInput[offset] > 0x7f:
+            offset += 1
+            if offset == end:
+                raise ValueError('Varint at offset {} is longer than {} bytes'.format(end - maxBytes, maxBytes))
+        return offset + 1
+
+    def skipFlat(self, byteInput, offset, length):
+        _, offset = self.unmarshallHeader(None, byteInput, offset + 1 + length)
+        return offset
+
+    def skipBool(self, byteInput, offset):
+        return self.skipFlat(byteInput, offset, 0)
+
+    def skipUint8(self, byteInput, offset):
+        return self.skipFlat(byteInput, offset, 1)
+
+    def skipUint16(self, byteInput, offset):
+        return self.skipFlat(byteInput, offset, 1 if byteInput[offset] & 0x80 else 2)
+
+    def skipInt32(self, byteInput, offset):
+        offset = self.skipVarInt(byteInput, offset + 1)
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipUint32(self, byteInput, offset):
+        if byteInput[offset] & 0x80:
+            return self.skipFlat(byteInput, offset, 4)
+        return self.skipInt32(byteInput, offset)
+
+    def skipInt64(self, byteInput, offset):
+        offset = self.skipVarInt(byteInput, offset + 1, 8)
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipUint64(self, byteInput, offset):
+        if byteInput[offset] & 0x80:
+            return self.skipFlat(byteInput, offset, 8)
+        return self.skipInt64(byteInput, offset)
+
+    def skipBoolBitmap(self, byteInput, offset):
+        offset = self.skipVarInt(byteInput, offset + 1, maxBytes=BITMAP_MAX_BYTES)
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipFloat32(self, byteInput, offset):
+        return self.skipFlat(byteInput, offset, 4)
+
+    def skipFloat64(self, byteInput, offset):
+        return self.skipFlat(byteInput, offset, 8)
+
+    def skipTimestamp(self, byteInput, offset):
+        return self.skipFlat(byteInput, offset, 12 if byteInput[offset] & 0x80 else 8)
+
+    def skipBinary(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkLength(valueLength, byteInput, offset)
+        _, offset = self.unmarshallHeader(None, byteInput, offset + valueLength)
+        return offset
+
+    def skipListVarInt(self, byteInput, offset, limit=-1):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset)
+        for _ in range(valueLength):
+            offset = self.skipVarInt(byteInput, offset, limit)
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipListInt32(self, byteInput, offset):
+        return self.skipListVarInt(byteInput, offset)
+
+    def skipListInt64(self, byteInput, offset):
+        return self.skipListVarInt(byteInput, offset, 8)
+
+    def skipListFlat(self, byteInput, offset, length):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset, length)
+        _, offset = self.unmarshallHeader(None, byteInput, offset + valueLength * length)
+        return offset
+
+    def skipListFloat32(self, byteInput, offset):
+        return self.skipListFlat(byteInput, offset, 4)
+
+    def skipListFloat64(self, byteInput, offset):
+        return self.skipListFlat(byteInput, offset, 8)
+
+    def skipListBool(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset, 0)
+        self.checkLength((valueLength + 7) >> 3, byteInput, offset)
+        _, offset = self.unmarshallHeader(None, byteInput, offset + ((valueLength + 7) >> 3))
+        return offset
+
+    def skipListTimestamp(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset, 2)
+        for _ in range(valueLength):
+            offset = self.skipVarInt(byteInput, offset, 8)
+            offset = self.skipVarInt(byteInput, offset)
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipListBinary(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset)
+        for _ in range(valueLength):
+            valueElementLength, offset = self.unmarshallVarInt(byteInput, offset)
+            self.checkLength(valueElementLength, byteInput, offset)
+            offset += valueElementLength
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipElementVarInt(self, byteInput, offset):
+        return self.skipVarInt(byteInput, offset)
+
+    def skipElementInt64(self, byteInput, offset):
+        return self.skipVarInt(byteInput, offset, 8)
 
-    def unmarshall(self, byteInput, offset=0):
+    def skipElementTimestamp(self, byteInput, offset):
+        offset = self.skipVarInt(byteInput, offset, 8)
+        return self.skipVarInt(byteInput, offset)
+
+    def skipElementBinary(self, byteInput, offset):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        self.checkLength(valueLength, byteInput, offset)
+        return offset + valueLength
+
+    def getSkipElementFunction(self, elementType):
+        if elementType in SKIP_ELEMENT_TYPES_MAP:
+            return SKIP_ELEMENT_TYPES_MAP[elementType]
+        if self.isEnumType(elementType):
+            return ColferUnmarshallerMixin.skipElementVarInt
+        raise ValueError('{} cannot be a map key or value'.format(elementType))
+
+    def skipMap(self, byteInput, offset, variableOuterType):
+        keyType, valueType = typing.get_args(variableOuterType)
+        skipKey = self.getSkipElementFunction(keyType)
+        skipValue = self.getSkipElementFunction(valueType)
+
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset, 2)
+        for _ in range(valueLength):
+            offset = skipValue(self, byteInput, skipKey(self, byteInput, offset))
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipObject(self, byteInput, offset, variableType=None):
+        self.enterNested()
+        try:
+            offset = (variableType or type(self))().skipMessage(byteInput, offset + 1)
+        finally:
+            DECODE_STATE.depth -= 1
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def skipListObject(self, byteInput, offset, variableType=None):
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset + 1)
+        self.checkListLength(valueLength, byteInput, offset)
+        valueObject = (variableType or type(self))()
+        self.enterNested()
+        try:
+            for _ in range(valueLength):
+                offset = valueObject.skipMessage(byteInput, offset)
+        finally:
+            DECODE_STATE.depth -= 1
+        _, offset = self.unmarshallHeader(None, byteInput, offset)
+        return offset
+
+    def getSkipFunction(self, variableType, variableOuterType):
+
+        # Resolved functions are all called as function(self, byteInput, offset) with offset
+        # at the header of a present field, and return the offset after its trailer
+        outerKind, variableOuterType = self.getOuterKind(variableOuterType)
+        if outerKind == OUTER_MAP:
+            return lambda colfer, byteInput, offset: \
+                colfer.skipMap(byteInput, offset, variableOuterType)
+        if outerKind == OUTER_LIST:
+            if variableOuterType in SKIP_LIST_TYPES_MAP:
+                return SKIP_LIST_TYPES_MAP[variableOuterType]
+            elementType = self.getElementType(variableType, variableOuterType)
+            if self.isEnumType(elementType):
+                # Ordinals are varints like the elements of List[Int32]
+                return ColferUnmarshallerMixin.skipListInt32
+            if self.isObjectType(elementType):
+                return lambda colfer, byteInput, offset: \
+                    colfer.skipListObject(byteInput, offset, elementType)
+        elif variableType in SKIP_TYPES_MAP:
+            return SKIP_TYPES_MAP[variableType]
+        elif self.isEnumType(variableType):
+            return ColferUnmarshallerMixin.skipInt32
+        elif self.isObjectType(variableType):
+            return lambda colfer, byteInput, offset: \
+                colfer.skipObject(byteInput, offset, variableType)
+        return None  # pragma: no cover
+
+    def skipField(self, indexTable, byteInput, offset):
+        index = byteInput[offset] & 0x7f
+        if indexTable[index] is None:
+            raise ValueError('Field index {} is unknown, its size is not on the wire'.format(index))
+        _, _, skipFunction = indexTable[index]
+        return skipFunction(self, byteInput, offset)
+
+    def skipMessage(self, byteInput, offset=0):
+        fieldNames, indexTable = self.getUnmarshallTable()
+        if self.COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+            while byteInput[offset] != 0x7f:
+                offset = self.skipField(indexTable, byteInput, offset)
+            return offset + 1
+
+        for _ in range(len(fieldNames)):
+            if byteInput[offset] == 0x7f:
+                offset += 1
+            else:
+                offset = self.skipField(indexTable, byteInput, offset)
+        return offset
+
+    def scanFields(self, byteInput, offset, lastIndex):
+        # Spans (start, end) of the fields up to lastIndex, found without decoding them.
+        # Absent fields of the compact layout get an empty span where they would be written.
+        fieldNames, indexTable = self.getUnmarshallTable()
+        lastIndex = min(lastIndex, len(fieldNames) - 1)
+        spans = []
+
+        if self.COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+            while len(spans) <= lastIndex:
+                header = byteInput[offset]
+                index = header & 0x7f
+                if header == 0x7f or indexTable[index] is None:
+                    # Terminator, or fields of a newer schema which all trail the known ones
+                    index = lastIndex + 1
+                while len(spans) < index and len(spans) <= lastIndex:
+                    spans.append((offset, offset))
+                if len(spans) <= lastIndex:
+                    end = self.skipField(indexTable, byteInput, offset)
+                    spans.append((offset, end))
+                    offset = end
+            return spans
+
+        for _ in range(lastIndex + 1):
+            if byteInput[offset] == 0x7f:
+                end = offset + 1
+            else:
+                end = self.skipField(indexTable, byteInput, offset)
+            spans.append((offset, end))
+            offset = end
+        return spans
+
+    def getMessageEnd(self):
+        # End of the message given to the outermost unmarshall, nested messages have none
+        if getattr(DECODE_STATE, 'depth', 0):
+            return None
+        return getattr(DECODE_STATE, 'messageEnd', None)
+
+    def unmarshallUnknown(self, byteInput, offset, keepUnknown):
+        # Fields are written in index order and new fields are only ever appended to a
+        # schema, so everything from the first unknown field to the end of the message
+        # belongs to fields this class does not know. Their sizes are not on the wire, so
+        # only the caller can tell where the message ends, see unmarshall(end=...).
+        messageEnd = self.getMessageEnd()
+        if self.COLFER_WIRE_MODE == ColferConstants.COLFER_WIRE_LEGACY:
+            # Slots of a newer schema look the same as the input that follows the message
+            if messageEnd is None or offset > messageEnd:
+                return None, offset
+            unknownEnd = messageEnd
+        else:
+            if messageEnd is None:
+                raise ValueError('Field index {} is unknown to {} and its size is not on the wire, '
+                                 'unknown fields can only be skipped in a message of known end'.format(
+                                     byteInput[offset] & 0x7f, type(self).__name__))
+            if byteInput[messageEnd - 1] != 0x7f:
+                raise ValueError('Message does not end with 0x7f at the given end {}'.format(messageEnd))
+            unknownEnd = messageEnd - 1
+
+        unknownFields = memoryview(byteInput)[offset:unknownEnd] if keepUnknown and unknownEnd > offset else None
+        return unknownFields, messageEnd
+
+    def unmarshall(self, byteInput, offset=0, keepUnknown=False, reuse=False, end=None, limits=None):
+        # With reuse, nested objects and lists already held by self are refilled in place
+        # and the ones no longer needed go to a per-class free-list, so a consumer decoding
+        # one message at a time into the same object allocates almost nothing. Every object
+        # reachable from self before the call may be overwritten.
+        #
+        # end marks byteInput[offset:end] as exactly one message, which lets fields of a
+        # newer schema be skipped or kept. Without it they raise ValueError in the compact
+        # layout and are left unread in the legacy one, as the message may be followed by more.
+        #
+        # limits maps any of LIMIT_NAMES to a value for this call, in place of the ClassVars.
+        # Malformed input of any kind raises ValueError.
+        #
+        # byteInput may also be a memoryview, mmap, shared_memory or other buffer, which is
+        # read in place. Decoded values never refer to it, except the unknown fields kept
+        # with keepUnknown.
         assert (byteInput is not None)
-        assert (self.isBinary(byteInput))
+        assert (self.isBinary(byteInput) or self.isReadableBuffer(byteInput))
         assert (offset >= 0)
-        index = 0
-        for name, modelField in self.__fields__.items():
-            variableType = modelField.type_
-            variableOuterType = modelField.outer_type_
-
-            newValue, offset = self.unmarshallType(
-                variableType, variableOuterType, index, byteInput, offset)
-            self.setKnownAttribute(
-                name, variableType, newValue, variableOuterType)
-            index += 1
+        if getattr(DECODE_STATE, 'end', None) is not None:
+            # Nested message, the outermost unmarshall has set the limits
+            return self.unmarshallMessage(byteInput, offset, keepUnknown)
+        if self.isBinary(byteInput):
+            return self.unmarshallInput(byteInput, offset, keepUnknown, reuse, end, limits)
+        # Indexing a byte view gives ints and slicing gives views, as with bytes
+        with memoryview(byteInput) as view, view.cast('B') as byteView:
+            return self.unmarshallInput(byteView, offset, keepUnknown, reuse, end, limits)
+
+    def unmarshallInput(self, byteInput, offset, keepUnknown, reuse, end, limits):
+        # Outermost message of unmarshall, in bytes, a bytearray or a byte view
+        if offset >= len(byteInput):
+            raise ValueError('No input left at offset {}'.format(offset))
+        if end is not None and not offset < end <= len(byteInput):
+            raise ValueError('End {} is not within the input from offset {}'.format(end, offset))
+        self.checkLimits(limits)
+        DECODE_STATE.limits = limits
+        try:
+            maxSize = self.getLimit('COLFER_MAX_SIZE')
+            if end is not None and end - offset > maxSize:
+                raise ValueError('Message of {} bytes exceeds COLFER_MAX_SIZE {}'.format(end - offset, maxSize))
+            DECODE_STATE.end = min(len(byteInput) if end is None else end, offset + maxSize)
+            DECODE_STATE.depth = 0
+            DECODE_STATE.reuse = reuse
+            DECODE_STATE.messageEnd = end
+            value, messageEnd = self.unmarshallMessage(byteInput, offset, keepUnknown)
+        except (IndexError, struct.error):
+            # A header, varint or flat value was cut off by the end of the input
+            raise ValueError('Input ends inside a {} from offset {}'.format(type(self).__name__, offset))
+        finally:
+            DECODE_STATE.end = None
+            DECODE_STATE.reuse = False
+            DECODE_STATE.messageEnd = None
+            DECODE_STATE.limits = None
+        if messageEnd - offset > maxSize:
+            raise ValueError('Message of {} bytes exceeds COLFER_MAX_SIZE {}'.format(
+                messageEnd - offset, maxSize))
+        if end is not None and messageEnd != end:
+            raise ValueError('{} ends at offset {}, not at the given end {}'.format(
+                type(self).__name__, messageEnd, end))
+        return value, messageEnd
+
+    def checkLimits(self, limits):
+        for name in limits or ():
+            if name not in LIMIT_NAMES:
+                raise ValueError('Limit {} is not one of {}'.format(name, ', '.join(LIMIT_NAMES)))
+
+    def unmarshallMessage(self, byteInput, offset, keepUnknown=False):
+        fieldNames, indexTable = self.getUnmarshallTable()
+        values = dict.fromkeys(fieldNames)
+        unknownFields = None
+
+        if self.COLFER_WIRE_MODE != ColferConstants.COLFER_WIRE_LEGACY:
+            # Only present fields are on the wire, followed by a single 0x7f
+            header = byteInput[offset]
+            while header != 0x7f:
+                if indexTable[header & 0x7f] is None:
+                    # Written by a newer schema
+                    unknownFields, offset = self.unmarshallUnknown(byteInput, offset, keepUnknown)
+                    break
+                offset = self.unmarshallField(indexTable, values, byteInput, offset)
+                header = byteInput[offset]
+            else:
+                offset += 1
+        else:
+            # Every field slot is on the wire, absent ones hold only the trailer
+            for _ in range(len(fieldNames)):
+                if byteInput[offset] == 0x7f:
+                    offset += 1
+                else:
+                    offset = self.unmarshallField(indexTable, values, byteInput, offset)
+            # Slots of a newer schema follow, up to the end of the message when it is known
+            unknownFields, offset = self.unmarshallUnknown(byteInput, offset, keepUnknown)
+
+        if self.COLFER_WIRE_MODE == ColferConstants.COLFER_WIRE_BITMAP:
+            self.unpackBoolBitmap(values)
+        self.setKnownAttributes(values)
+        self.setUnknownFields(unknownFields)
         return self, offset
 
+    def setUnknownFields(self, unknownFields):  # pragma: no cover
+        pass
+
+    def setFrozen(self, frozen):  # pragma: no cover
+        pass
+
+    def setKnownAttributes(self, values):  # pragma: no cover
+        for name, value in values.items():
+            self.setKnownAttribute(name, None, value)
+
+    def getReusableValue(self, name):  # pragma: no cover
+        return None
+
     def getAttributeWithType(self, name):  # pragma: no cover
         value = self.__getattr__(name)
         return None, value, None
 
     def setKnownAttribute(self, name, variableType, value, variableSubType=None):  # pragma: no cover
         self.__setattr__(name, value)
+
+
+# Dispatch by field type, built once when the module loads
+UNMARSHALL_LIST_TYPES_MAP = {
+    List[bool]: ColferUnmarshallerMixin.unmarshallListBool,
+    List[int]: ColferUnmarshallerMixin.unmarshallListInt64,
+    List[Int32]: ColferUnmarshallerMixin.unmarshallListInt32,
+    List[Float32]: ColferUnmarshallerMixin.unmarshallListFloat32,
+    List[float]: ColferUnmarshallerMixin.unmarshallListFloat64,
+    List[datetime.datetime]: ColferUnmarshallerMixin.unmarshallListTimestamp,
+    List[bytes]: ColferUnmarshallerMixin.unmarshallListBinary,
+    List[str]: ColferUnmarshallerMixin.unmarshallListString,
+}
+
+UNMARSHALL_TYPES_MAP = {
+    bool: ColferUnmarshallerMixin.unmarshallBool,
+    int: ColferUnmarshallerMixin.unmarshallInt64,
+    Int32: ColferUnmarshallerMixin.unmarshallInt32,
+    UInt8: ColferUnmarshallerMixin.unmarshallUint8,
+    UInt16: ColferUnmarshallerMixin.unmarshallUint16,
+    UInt32: ColferUnmarshallerMixin.unmarshallUint32,
+    UInt64: ColferUnmarshallerMixin.unmarshallUint64,
+    Float32: ColferUnmarshallerMixin.unmarshallFloat32,
+    float: ColferUnmarshallerMixin.unmarshallFloat64,
+    datetime.datetime: ColferUnmarshallerMixin.unmarshallTimestamp,
+    bytes: ColferUnmarshallerMixin.unmarshallBinary,
+    str: ColferUnmarshallerMixin.unmarshallString,
+    SortedIntList: ColferUnmarshallerMixin.unmarshallSortedIntList,
+}
+
+SKIP_LIST_TYPES_MAP = {
+    List[bool]: ColferUnmarshallerMixin.skipListBool,
+    List[int]: ColferUnmarshallerMixin.skipListInt64,
+    List[Int32]: ColferUnmarshallerMixin.skipListInt32,
+    List[Float32]: ColferUnmarshallerMixin.skipListFloat32,
+    List[float]: ColferUnmarshallerMixin.skipListFloat64,
+    List[datetime.datetime]: ColferUnmarshallerMixin.skipListTimestamp,
+    List[bytes]: ColferUnmarshallerMixin.skipListBinary,
+    List[str]: ColferUnmarshallerMixin.skipListBinary,
+}
+
+SKIP_TYPES_MAP = {
+    bool: ColferUnmarshallerMixin.skipBool,
+    int: ColferUnmarshallerMixin.skipInt64,
+    Int32: ColferUnmarshallerMixin.skipInt32,
+    UInt8: ColferUnmarshallerMixin.skipUint8,
+    UInt16: ColferUnmarshallerMixin.skipUint16,
+    UInt32: ColferUnmarshallerMixin.skipUint32,
+    UInt64: ColferUnmarshallerMixin.skipUint64,
+    Float32: ColferUnmarshallerMixin.skipFloat32,
+    float: ColferUnmarshallerMixin.skipFloat64,
+    datetime.datetime: ColferUnmarshallerMixin.skipTimestamp,
+    bytes: ColferUnmarshallerMixin.skipBinary,
+    str: ColferUnmarshallerMixin.skipBinary,
+    SortedIntList: ColferUnmarshallerMixin.skipListInt64,
+}
+
+# Keys and values of maps, encoded as the elements of a list of their type
+UNMARSHALL_ELEMENT_TYPES_MAP = {
+    bool: ColferUnmarshallerMixin.unmarshallElementBool,
+    int: ColferUnmarshallerMixin.unmarshallElementInt64,
+    Int32: ColferUnmarshallerMixin.unmarshallElementInt32,
+    UInt8: ColferUnmarshallerMixin.unmarshallElementUint8,
+    UInt16: ColferUnmarshallerMixin.unmarshallElementUint,
+    UInt32: ColferUnmarshallerMixin.unmarshallElementUint,
+    UInt64: ColferUnmarshallerMixin.unmarshallElementUint64,
+    Float32: ColferUnmarshallerMixin.unmarshallElementFloat32,
+    float: ColferUnmarshallerMixin.unmarshallElementFloat64,
+    datetime.datetime: ColferUnmarshallerMixin.unmarshallElementTimestamp,
+    bytes: ColferUnmarshallerMixin.unmarshallElementBinary,
+    str: ColferUnmarshallerMixin.unmarshallElementString,
+}
+
+SKIP_ELEMENT_TYPES_MAP = {
+    bool: lambda colfer, byteInput, offset: offset + 1,
+    int: ColferUnmarshallerMixin.skipElementInt64,
+    Int32: ColferUnmarshallerMixin.skipElementVarInt,
+    UInt8: lambda colfer, byteInput, offset: offset + 1,
+    UInt16: ColferUnmarshallerMixin.skipElementVarInt,
+    UInt32: ColferUnmarshallerMixin.skipElementVarInt,
+    UInt64: ColferUnmarshallerMixin.skipElementInt64,
+    Float32: lambda colfer, byteInput, offset: offset + 4,
+    float: lambda colfer, byteInput, offset: offset + 8,
+    datetime.datetime: ColferUnmarshallerMixin.skipElementTimestamp,
+    bytes: ColferUnmarshallerMixin.skipElementBinary,
+    str: ColferUnmarshallerMixin.skipElementBinary,
+}
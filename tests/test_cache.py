@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+from typing import ClassVar, Dict, List, Optional, Tuple
+
+from colf import Colfer, ColferDecodeCache
+from colf.colf_cache import ColferEncodeCache, ColferInternTable
+from tests.test_model import Point, Shape
+
+
+class Visit(Colfer):
+    COLFER_INTERN_FIELDS: ClassVar[Tuple[str, ...]] = ('country', 'tags')
+    COLFER_INTERN_MAX: ClassVar[int] = 2
+
+    country: Optional[str]
+    tags: Optional[List[str]]
+    note: Optional[str]
+
+
+class Tenant(Visit):
+    COLFER_ENCODE_CACHE_FIELDS: ClassVar[Tuple[str, ...]] = ('country', 'tags')
+
+
+class Basket(Colfer):
+    counts: Optional[Dict[str, int]]
+    tags: Optional[List[str]]
+    origin: Optional[Point]
+
+
+class TestDecodeCache(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(100)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def testHitReturnsSharedInstance(self):
+        cache = ColferDecodeCache(Point, copyOnHit=False)
+        byteInput = self.encode(Point(x=1, y=2))
+
+        firstObject, offset = cache.unmarshall(byteInput)
+        self.assertEqual((Point(x=1, y=2), len(byteInput)), (firstObject, offset))
+        secondObject, offset = cache.unmarshall(bytes(byteInput))
+        self.assertIs(firstObject, secondObject)
+        self.assertEqual(len(byteInput), offset)
+
+        stats = cache.getStats()
+        self.assertEqual((1, 1, 1), (stats['hits'], stats['misses'], stats['entries']))
+        self.assertEqual(0.5, stats['hitRate'])
+
+    def testSharedInstanceIsFrozen(self):
+        cache = ColferDecodeCache(Basket)
+        value = Basket(counts={'a': 1}, tags=['t'], origin=Point(x=1))
+        byteInput = self.encode(value)
+        cache.unmarshall(byteInput)
+        shared, _ = cache.unmarshall(byteInput)
+        self.assertEqual(value, shared)
+        for change in (lambda: setattr(shared, 'tags', []), lambda: shared.tags.append('u'),
+                       lambda: shared.tags.__setitem__(0, 'u'), lambda: shared.counts.update(b=2),
+                       lambda: shared.counts.__setitem__('a', 2), lambda: setattr(shared.origin, 'x', 2)):
+            with self.assertRaises(AttributeError):
+                change()
+        self.assertEqual(value, cache.unmarshall(byteInput)[0])
+
+        # Copies of the shared instance can be changed
+        copied, _ = ColferDecodeCache(Basket, copyOnHit=True).unmarshall(byteInput)
+        copied.tags.append('u')
+        copied.origin.x = 2
+        self.assertEqual(['t', 'u'], copied.tags)
+        self.assertEqual(value, cache.unmarshall(byteInput)[0])
+
+    def testCopyOnHit(self):
+        cache = ColferDecodeCache(Shape, copyOnHit=True)
+        value = Shape(name='s', origin=Point(x=1), points=[Point(y=2)])
+        byteInput = self.encode(value)
+        firstObject, _ = cache.unmarshall(byteInput)
+        firstObject.name = 'changed'
+        firstObject.origin.x = 5
+        firstObject.points[0].y = 6
+        firstObject.points.append(Point())
+        secondObject, _ = cache.unmarshall(byteInput)
+        self.assertIsNot(firstObject, secondObject)
+        self.assertEqual(value, secondObject)
+        self.assertEqual(1, cache.getStats()['hits'])
+
+    def testOffsetAndEnd(self):
+        cache = ColferDecodeCache(Point)
+        firstInput = self.encode(Point(x=1))
+        secondInput = self.encode(Point(y=-2))
+        byteInput = b'\x00' + firstInput + secondInput
+
+        firstObject, offset = cache.unmarshall(byteInput, 1, 1 + len(firstInput))
+        secondObject, end = cache.unmarshall(byteInput, offset)
+        self.assertEqual([Point(x=1), Point(y=-2)], [firstObject, secondObject])
+        self.assertEqual(len(byteInput), end)
+        self.assertEqual(firstObject, cache.unmarshall(firstInput)[0])
+        self.assertEqual(1, cache.getStats()['hits'])
+
+    def testEviction(self):
+        byteInputs = [self.encode(Point(x=index)) for index in range(1, 11)]
+        cache = ColferDecodeCache(Point, maxBytes=len(byteInputs[0]) * 3)
+        for byteInput in byteInputs:
+            cache.unmarshall(byteInput)
+        self.assertEqual(3, len(cache))
+        self.assertEqual(7, cache.getStats()['evictions'])
+
+        # Least recently used goes first
+        cache.unmarshall(byteInputs[7])
+        cache.unmarshall(byteInputs[0])
+        self.assertEqual(3, len(cache))
+        cache.unmarshall(byteInputs[7])
+        self.assertEqual(2, cache.getStats()['hits'])
+
+        cache.clear()
+        self.assertEqual(0, cache.getStats()['bytes'])
+
+    def testThreads(self):
+        byteInputs = [self.encode(Point(x=index)) for index in range(1, 13)]
+        cache = ColferDecodeCache(Point, maxBytes=len(byteInputs[0]) * 8)
+        results = []
+        errors = []
+
+        def decodeAll():
+            try:
+                results.append([cache.unmarshall(byteInput)[0].x for _ in range(50) for byteInput in byteInputs])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=decodeAll) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual([list(range(1, 13)) * 50] * 8, results)
+        stats = cache.getStats()
+        self.assertEqual(8 * 50 * 12, stats['hits'] + stats['misses'])
+        self.assertEqual((8, len(byteInputs[0]) * 8), (stats['entries'], stats['bytes']))
+
+    def testOversizedNotCached(self):
+        cache = ColferDecodeCache(Shape, maxBytes=4)
+        cache.unmarshall(self.encode(Shape(name='a longer name')))
+        self.assertEqual(0, len(cache))
+
+
+class TestInternTable(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(1000)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def testSharedStrings(self):
+        first, _ = Visit().unmarshall(self.encode(Visit(country='KR', tags=['a', 'KR'], note='n')))
+        second, _ = Visit().unmarshall(self.encode(Visit(country='KR', tags=['a'], note='n')))
+        self.assertEqual(Visit(country='KR', tags=['a'], note='n'), second)
+        self.assertIs(first.country, second.country)
+        self.assertIs(first.tags[0], second.tags[0])
+
+        stats = Visit().getInternTable('country').getStats()
+        self.assertEqual((1, 1, 1), (stats['hits'], stats['misses'], stats['entries']))
+        self.assertEqual(1, Visit().getInternTable('tags').getStats()['hits'])
+
+    def testEviction(self):
+        internTable = ColferInternTable(maxEntries=2, maxLength=4)
+        first = internTable.decode(b'one')
+        internTable.decode(b'two')
+        self.assertIs(first, internTable.decode(bytearray(b'one')))
+        internTable.decode(b'six')
+        self.assertEqual(2, len(internTable))
+        self.assertEqual(1, internTable.getStats()['evictions'])
+        self.assertIs(first, internTable.decode(b'one'))
+        # Long values bypass the table
+        self.assertEqual(u'다섯', internTable.decode(u'다섯'.encode('utf-8')))
+        self.assertEqual(2, len(internTable))
+
+    def testNotAStringField(self):
+        class BadVisit(Colfer):
+            COLFER_INTERN_FIELDS: ClassVar[Tuple[str, ...]] = ('count',)
+            count: Optional[int]
+
+        with self.assertRaises(ValueError):
+            BadVisit().unmarshall(b'\x7f')
+
+
+    def testThreads(self):
+        internTable = ColferInternTable(maxEntries=8)
+        keys = [str(index).encode() for index in range(12)]
+        results = []
+        errors = []
+
+        def decodeAll():
+            try:
+                results.append([internTable.decode(key) for _ in range(200) for key in keys])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=decodeAll) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        expected = [key.decode() for _ in range(200) for key in keys]
+        self.assertEqual([expected] * 8, results)
+        stats = internTable.getStats()
+        self.assertEqual(8 * 200 * 12, stats['hits'] + stats['misses'])
+        self.assertEqual(8, stats['entries'])
+        # Threads missing the same key at once both count a miss, one of them inserts it
+        self.assertLessEqual(stats['evictions'], stats['misses'] - 8)
+
+
+class TestEncodeCache(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(1000)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def testSameBytes(self):
+        for value in (Tenant(country=u'대한민국', tags=['a', 'a', ''], note='n'), Tenant(country='KR'), Tenant()):
+            with self.subTest(value=value):
+                expected = self.encode(Visit(**dict(value)))
+                self.assertEqual(expected, self.encode(value))
+                self.assertEqual(expected, self.encode(value))
+                self.assertEqual(bytes(expected), bytes(value.canonicalBytes()))
+
+        stats = Tenant().getEncodeCache('tags').getStats()
+        self.assertEqual((2, 2), (stats['entries'], stats['misses']))
+
+    def testEviction(self):
+        encodeCache = ColferEncodeCache(maxEntries=2, maxLength=4)
+        first = encodeCache.encode('one')
+        encodeCache.encode('two')
+        self.assertIs(first, encodeCache.encode('one'))
+        encodeCache.encode('six')
+        self.assertEqual(1, encodeCache.getStats()['evictions'])
+        self.assertIs(first, encodeCache.encode('one'))
+        self.assertEqual(u'다섯 개입니다'.encode('utf-8'), encodeCache.encode(u'다섯 개입니다'))
+        self.assertEqual(2, len(encodeCache))
+        self.assertEqual(2.0 / 5, encodeCache.getStats()['hitRate'])
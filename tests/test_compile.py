@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import datetime
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from typing import ClassVar, Tuple
+
+from colf import ColferMarshallerMixin, ColferUnmarshallerMixin
+from colf.colf_base import ColferConstants
+from colf.colf_compile import ColferSchema, compileSchema, main
+
+SCHEMA = '''
+// Package demo offers a demonstration.
+package demo
+
+// Course is the grounds where the game of golf is played.
+type course struct {
+	ID    uint64
+	name  text
+	holes []hole
+	image binary
+	tags  []text
+	next  course
+}
+
+type hole struct {
+	// Lat is the latitude of the cup.
+	lat    float64
+	lon    float32
+	par    uint8
+	water  bool
+	depth  int32
+	offset int64
+	flags  []bool
+	stamp  timestamp
+	sizes  []float32
+	counts []int64
+	codes  []int32
+	blobs  []binary
+}
+
+type empty struct {}
+'''
+
+
+def loadSchema(name, wireMode):
+    source = compileSchema(SCHEMA, wireMode)
+    directory = tempfile.mkdtemp()
+    fileName = os.path.join(directory, name + '.py')
+    with open(fileName, 'w') as moduleFile:
+        moduleFile.write(source)
+    spec = importlib.util.spec_from_file_location(name, fileName)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+compact = loadSchema('colf_demo_compact', ColferConstants.COLFER_WIRE_COMPACT)
+legacy = loadSchema('colf_demo_legacy', ColferConstants.COLFER_WIRE_LEGACY)
+
+
+def getExampleCourse(module):
+    hole = module.Hole(lat=52.5, lon=-1.25, par=4, water=True, depth=-3, offset=-2 ** 40,
+                       flags=[True, False, True], stamp=datetime.datetime(2020, 1, 2, 3, 4, 5),
+                       sizes=[0.5], counts=[1, -2, 3], codes=[-7], blobs=[b'\x00\x01'])
+    return module.Course(ID=2 ** 50, name=u'골프', holes=[hole, module.Hole(par=3)], image=b'\xff',
+                         tags=['a', 'b'], next=module.Course(name='next'))
+
+
+class TestCompile(unittest.TestCase):
+
+    def encodeGeneric(self, value):
+        # The same message through the introspecting marshall of the mixin
+        byteOutput = bytearray(1000)
+        return byteOutput[:ColferMarshallerMixin.marshallMessage(value, byteOutput, 0)]
+
+    def encode(self, value):
+        byteOutput = bytearray(1000)
+        return byteOutput[:value.marshall(byteOutput)]
+
+    def assertMatchesGeneric(self, module):
+        course = getExampleCourse(module)
+        byteInput = self.encode(course)
+        self.assertEqual(self.encodeGeneric(course), byteInput)
+
+        decoded, offset = module.Course().unmarshall(byteInput)
+        self.assertEqual(len(byteInput), offset)
+        self.assertEqual(byteInput, self.encode(decoded))
+        genericDecoded, _ = ColferUnmarshallerMixin.unmarshallMessage(module.Course(), byteInput, 0)
+        self.assertEqual(genericDecoded, decoded)
+
+    def testCompact(self):
+        self.assertMatchesGeneric(compact)
+        self.assertEqual(b'\x7f', self.encode(compact.Empty()))
+        self.assertEqual(b'\x02\x03\x7f', self.encode(compact.Hole(par=3)))
+
+    def testLegacy(self):
+        self.assertMatchesGeneric(legacy)
+
+    def testCompactOutOfOrder(self):
+        # Field 2 before field 0 still decodes, through the generic decoder
+        byteInput = b'\x02\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00\x7f'
+        decoded, offset = compact.Hole().unmarshall(byteInput)
+        self.assertEqual((0.0, 3, 12), (decoded.lat, decoded.par, offset))
+
+    def testCompactUnknownFields(self):
+        newerOutput = self.encode(compact.Course(name='x', tags=['t']))
+        olderInput = newerOutput[:3] + b'\x7f'
+        decoded, _ = compact.Course().unmarshall(newerOutput)
+        self.assertEqual(['t'], decoded.tags)
+        self.assertEqual(compact.Course(name='x'), compact.Course().unmarshall(olderInput)[0])
+
+    def testInternFields(self):
+        class InternCourse(compact.Course):
+            COLFER_INTERN_FIELDS: ClassVar[Tuple[str, ...]] = ('name', 'tags')
+            COLFER_ENCODE_CACHE_FIELDS: ClassVar[Tuple[str, ...]] = ('name', 'tags')
+
+        byteInput = self.encode(compact.Course(name='n', tags=['t']))
+        first, _ = InternCourse().unmarshall(byteInput)
+        second, _ = InternCourse().unmarshall(byteInput)
+        self.assertIs(first.name, second.name)
+        self.assertIs(first.tags[0], second.tags[0])
+        self.assertEqual(byteInput, self.encode(first))
+        self.assertEqual(1, InternCourse().getEncodeCache('name').getStats()['misses'])
+
+    def testSchemaErrors(self):
+        invalidSchemas = [
+            'type a struct {\n\tb unknown\n}',
+            'type a struct {\n\tb int64\n\tb int64\n}',
+            'type a struct {\n\tb []uint8\n}',
+            'type a struct {\n\tb other.type\n}',
+            'type a struct {\n\tb int64',
+            'package a\npackage b',
+            'type a struct {\n\tclass int64\n}',
+            'struct a',
+        ]
+        for schema in invalidSchemas:
+            with self.assertRaises(ValueError):
+                ColferSchema().parse(schema).validate()
+
+    def testMain(self):
+        directory = tempfile.mkdtemp()
+        schemaName = os.path.join(directory, 'demo.colf')
+        outputName = os.path.join(directory, 'demo.py')
+        with open(schemaName, 'w') as schemaFile:
+            schemaFile.write(SCHEMA)
+        self.assertEqual(0, main([schemaName, '-o', outputName, '--wire-mode', 'legacy']))
+        with open(outputName) as outputFile:
+            source = outputFile.read()
+        self.assertIn('COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_LEGACY', source)
+        self.assertIn('# Course is the grounds where the game of golf is played.', source)
+        compile(source, outputName, 'exec')
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import io
+import unittest
+
+from colf import ColferFileReader, ColferFileWriter
+from colf.colf_file import BLOCK_HEADER, FILE_HEADER
+from tests.test_model import CompactEvent, CompactPoint, CompactPointV2, Node, Point, Shape
+from tests.test_stream import getEvents
+
+
+class TestColferFile(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(10000)
+        return bytes(byteOutput[:marshallableObject.marshall(byteOutput)])
+
+    def writeFile(self, values, **options):
+        fileObject = io.BytesIO()
+        with ColferFileWriter(fileObject, **options) as writer:
+            writer.writeAll(values)
+        return fileObject
+
+    def assertRecords(self, expected, actual):
+        self.assertEqual([self.encode(value) for value in expected], [self.encode(value) for value in actual])
+
+    def testRoundTrip(self):
+        values = getEvents(CompactEvent) * 50
+        for codec in ('zlib', 'lzma', 'bz2'):
+            for blockRecords in (1, 7, 1000):
+                with self.subTest(codec=codec, blockRecords=blockRecords):
+                    reader = ColferFileReader(self.writeFile(values, codec=codec, blockRecords=blockRecords),
+                                              CompactEvent, workers=3)
+                    self.assertEqual(len(values), len(reader))
+                    self.assertEqual(-(-len(values) // blockRecords), reader.getBlockCount())
+                    self.assertRecords(values, reader)
+
+    def testRandomAccess(self):
+        values = [Node(name=str(number)) for number in range(100)]
+        reader = ColferFileReader(self.writeFile(values, blockRecords=16), Node)
+        for recordIndex in (0, 15, 16, 99, 40, 41):
+            self.assertEqual(values[recordIndex], reader[recordIndex])
+        self.assertRecords(values[37:], reader.iterRecords(37))
+        self.assertEqual([], list(reader.iterRecords(100)))
+        with self.assertRaises(IndexError):
+            reader.getRecord(100)
+
+    def testBlockBytes(self):
+        values = [CompactEvent(label='x' * 100)] * 30
+        reader = ColferFileReader(self.writeFile(values, blockBytes=1000), CompactEvent)
+        self.assertEqual(3, reader.getBlockCount())
+        self.assertRecords(values, reader)
+
+    def testGrowsBlock(self):
+        # Records larger than the spare capacity, partly written before they overflow
+        values = [Shape(name='s' * size, points=[Point(x=size, y=-size)] * (size // 10), origin=Point(x=size))
+                  for size in (5, 300, 40, 2000, 1, 3000)]
+        writer = ColferFileWriter(io.BytesIO(), blockBytes=64)
+        writer.write(values[0])
+        self.assertEqual(64, len(writer.block))
+        for blockRecords in (1, 4, 1000):
+            with self.subTest(blockRecords=blockRecords):
+                reader = ColferFileReader(self.writeFile(values, blockRecords=blockRecords, blockBytes=64), Shape)
+                self.assertRecords(values, reader)
+
+    def testCompresses(self):
+        values = getEvents(CompactEvent) * 100
+        fileObject = self.writeFile(values)
+        self.assertLess(len(fileObject.getvalue()) * 6, sum(len(self.encode(value)) for value in values))
+
+    def testEmpty(self):
+        reader = ColferFileReader(self.writeFile([]), Node)
+        self.assertEqual((0, 0), (len(reader), reader.getBlockCount()))
+        self.assertEqual([], list(reader))
+
+    def testInvalid(self):
+        with self.assertRaises(ValueError):
+            ColferFileWriter(io.BytesIO(), codec='gzip')
+        with self.assertRaises(ValueError):
+            ColferFileReader(io.BytesIO(b'not a record file'), Node)
+
+        # No footer without close
+        fileObject = io.BytesIO()
+        ColferFileWriter(fileObject).write(Node(name='a'))
+        with self.assertRaises(ValueError):
+            ColferFileReader(fileObject, Node)
+
+        # A block that inflates beyond its recorded size
+        byteInput = bytearray(self.writeFile([Node(name='a' * 50)]).getvalue())
+        BLOCK_HEADER.pack_into(byteInput, FILE_HEADER.size, 1, 10, 0, BLOCK_HEADER.unpack_from(
+            byteInput, FILE_HEADER.size)[3])
+        with self.assertRaises(ValueError):
+            ColferFileReader(io.BytesIO(byteInput), Node).getRecord(0)
+
+        # Records are not framed, unknown fields of one would swallow the next
+        fileObject = self.writeFile([CompactPointV2(x=1, z=2), CompactPointV2(x=3)])
+        with self.assertRaises(ValueError):
+            list(ColferFileReader(fileObject, CompactPoint))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import time
+import unittest
+from typing import ClassVar, List, Optional
+
+from colf import Colfer
+from colf.colf_compile import compileSchema
+from colf.colf_type import Float32, Int32, UInt8, UInt16, UInt32, UInt64
+
+GOLDEN_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Set to rewrite the golden files from the current encoder, after a deliberate layout change
+REGENERATE = os.environ.get('COLF_REGENERATE_GOLDEN') == '1'
+
+# Decode throughput of the whole corpus, in encoded megabytes per second. Override with
+# COLF_GOLDEN_MIN_MBPS on slow machines.
+MIN_DECODE_MBPS = float(os.environ.get('COLF_GOLDEN_MIN_MBPS', 0.5))
+
+
+class GoldenInner(Colfer):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+    name: Optional[str]
+    value: Optional[int]
+
+
+class Golden(Colfer):
+    # Field order matches tests/golden/golden.colf
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+    b: Optional[bool]
+    u8: Optional[UInt8]
+    u16: Optional[UInt16]
+    u32: Optional[UInt32]
+    u64: Optional[UInt64]
+    i32: Optional[Int32]
+    i64: Optional[int]
+    f32: Optional[Float32]
+    f64: Optional[float]
+    t: Optional[datetime.datetime]
+    s: Optional[str]
+    a: Optional[bytes]
+    o: Optional[GoldenInner]
+    os: Optional[List[GoldenInner]]
+    ss: Optional[List[str]]
+    bins: Optional[List[bytes]]
+    f32s: Optional[List[Float32]]
+    f64s: Optional[List[float]]
+    i32s: Optional[List[Int32]]
+    i64s: Optional[List[int]]
+    bs: Optional[List[bool]]
+    ts: Optional[List[datetime.datetime]]
+
+
+class LegacyGolden(Golden):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_LEGACY
+
+
+# Name to message. Layouts of the scalar, text, binary, float and object fields follow the
+# Colfer specification. Integer, bool and timestamp lists are extensions of this library,
+# their files pin its own layout.
+GOLDEN_CASES = {
+    'empty': Golden(),
+    'bool_true': Golden(b=True),
+    'uint8_max': Golden(u8=0xff),
+    'uint16_compressed': Golden(u16=0xff),
+    'uint16_flat': Golden(u16=0x100),
+    'uint16_max': Golden(u16=0xffff),
+    'uint32_compressed_max': Golden(u32=(1 << 21) - 1),
+    'uint32_flat': Golden(u32=1 << 21),
+    'uint32_max': Golden(u32=0xffffffff),
+    'uint64_compressed_max': Golden(u64=(1 << 49) - 1),
+    'uint64_flat': Golden(u64=1 << 49),
+    'uint64_max': Golden(u64=0xffffffffffffffff),
+    'int32_one': Golden(i32=1),
+    'int32_negative_one': Golden(i32=-1),
+    'int32_min': Golden(i32=-(1 << 31)),
+    'int32_max': Golden(i32=(1 << 31) - 1),
+    'int64_negative_one': Golden(i64=-1),
+    'int64_min': Golden(i64=-(1 << 63)),
+    'int64_max': Golden(i64=(1 << 63) - 1),
+    'float32_one': Golden(f32=1.0),
+    'float32_max': Golden(f32=3.4028234663852886e38),
+    'float32_subnormal': Golden(f32=1.401298464324817e-45),
+    'float32_nan': Golden(f32=float('nan')),
+    'float64_negative': Golden(f64=-2.0),
+    'float64_max': Golden(f64=1.7976931348623157e308),
+    'float64_infinity': Golden(f64=float('-inf')),
+    'timestamp_seconds': Golden(t=datetime.datetime(2017, 1, 1)),
+    'timestamp_nanoseconds': Golden(t=datetime.datetime(2017, 1, 1, 0, 0, 0, 999999)),
+    'timestamp_negative': Golden(t=datetime.datetime(1969, 12, 31, 23, 59, 59)),
+    'timestamp_wide': Golden(t=datetime.datetime(2200, 1, 1)),
+    'text_ascii': Golden(s='Colfer'),
+    'text_utf8': Golden(s=u'한국어 ∂ 😀'),
+    'text_long': Golden(s='x' * 300),
+    'binary': Golden(a=b'\x00\x7f\x80\xff'),
+    'object': Golden(o=GoldenInner(name='inner', value=-5)),
+    'object_empty': Golden(o=GoldenInner()),
+    'list_object': Golden(os=[GoldenInner(name='a'), GoldenInner(), GoldenInner(value=1 << 40)]),
+    'list_text': Golden(ss=['', 'a', u'é' * 100]),
+    'list_binary': Golden(bins=[b'', b'\x00', b'\xff' * 200]),
+    'list_float32': Golden(f32s=[0.0, -1.5, 3.4028234663852886e38]),
+    'list_float64': Golden(f64s=[0.0, -1.5, 1.7976931348623157e308]),
+    'list_int32': Golden(i32s=[0, 1, -1, (1 << 31) - 1, -(1 << 31)]),
+    'list_int64': Golden(i64s=[0, 1, -1, (1 << 63) - 1, -(1 << 63)]),
+    'list_bool': Golden(bs=[True, False, True, True, False, False, False, False, True]),
+    'list_timestamp': Golden(ts=[datetime.datetime(2017, 1, 1), datetime.datetime(1969, 12, 31, 23, 59, 59, 5)]),
+    'list_long': Golden(i64s=list(range(-500, 500, 3))),
+    'all_fields': Golden(
+        b=True, u8=1, u16=2, u32=3, u64=4, i32=-5, i64=-6, f32=7.5, f64=8.25,
+        t=datetime.datetime(2020, 2, 29, 12, 0, 0, 1), s='text', a=b'binary',
+        o=GoldenInner(name='o'), os=[GoldenInner(value=1)], ss=['s'], bins=[b'a'],
+        f32s=[1.0], f64s=[2.0], i32s=[-3], i64s=[4], bs=[True], ts=[datetime.datetime(2000, 1, 1)]),
+    'legacy_empty': LegacyGolden(),
+    'legacy_all_fields': LegacyGolden(
+        b=True, u8=1, u16=0x1234, u32=1 << 30, u64=1 << 60, i32=-5, i64=6, f32=-7.5, f64=8.25,
+        t=datetime.datetime(2020, 2, 29), s='text', a=b'binary', ss=['s']),
+}
+
+
+def getGoldenPath(name):
+    return os.path.join(GOLDEN_DIRECTORY, name + '.bin')
+
+
+def encode(value):
+    byteOutput = bytearray(4096)
+    return bytes(byteOutput[:value.marshall(byteOutput)])
+
+
+def readGolden(name):
+    with open(getGoldenPath(name), 'rb') as goldenFile:
+        return goldenFile.read()
+
+
+class TestGolden(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if REGENERATE:  # pragma: no cover
+            for name, value in GOLDEN_CASES.items():
+                with open(getGoldenPath(name), 'wb') as goldenFile:
+                    goldenFile.write(encode(value))
+
+    def testCorpusComplete(self):
+        goldenNames = sorted(fileName[:-len('.bin')] for fileName in os.listdir(GOLDEN_DIRECTORY)
+                             if fileName.endswith('.bin'))
+        self.assertEqual(sorted(GOLDEN_CASES), goldenNames)
+
+    def testEncode(self):
+        for name, value in GOLDEN_CASES.items():
+            with self.subTest(name=name):
+                self.assertEqual(readGolden(name).hex(), encode(value).hex())
+
+    def testDecode(self):
+        for name, value in GOLDEN_CASES.items():
+            with self.subTest(name=name):
+                byteInput = readGolden(name)
+                decoded, offset = type(value)().unmarshall(byteInput)
+                self.assertEqual(len(byteInput), offset)
+                # Decoded unsigned integers are int rather than bytes, compare re-encoded
+                self.assertEqual(byteInput, encode(decoded))
+
+    def testSkip(self):
+        for name, value in GOLDEN_CASES.items():
+            with self.subTest(name=name):
+                byteInput = readGolden(name)
+                self.assertEqual(len(byteInput), type(value)().skipMessage(byteInput))
+
+    def testCompiledSchema(self):
+        # Classes generated from golden.colf encode the corpus byte for byte
+        with open(os.path.join(GOLDEN_DIRECTORY, 'golden.colf')) as schemaFile:
+            namespace = {}
+            exec(compileSchema(schemaFile.read()), namespace)
+        for name, value in GOLDEN_CASES.items():
+            if type(value) is not Golden:
+                continue
+            with self.subTest(name=name):
+                byteInput = readGolden(name)
+                decoded, offset = namespace['Golden']().unmarshall(byteInput)
+                self.assertEqual(len(byteInput), offset)
+                self.assertEqual(byteInput, encode(decoded))
+
+    def testDecodeThroughput(self):
+        corpus = [(type(value), readGolden(name)) for name, value in GOLDEN_CASES.items()]
+        corpusBytes = sum(len(byteInput) for _, byteInput in corpus)
+
+        rounds = 0
+        start = time.perf_counter()
+        while rounds < 20 or time.perf_counter() - start < 0.2:
+            for colferType, byteInput in corpus:
+                colferType().unmarshall(byteInput)
+            rounds += 1
+        elapsed = time.perf_counter() - start
+
+        megabytesPerSecond = corpusBytes * rounds / elapsed / 1e6
+        self.assertGreater(megabytesPerSecond, MIN_DECODE_MBPS)
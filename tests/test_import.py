@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import unittest
+
+# Microseconds the colf modules may spend importing themselves, excluding the
+# standard library and pydantic. Override with COLF_IMPORT_BUDGET_US on slow machines.
+IMPORT_BUDGET_US = int(os.environ.get('COLF_IMPORT_BUDGET_US', 100000))
+
+
+def runPython(code, *options):
+    return subprocess.run([sys.executable] + list(options) + ['-c', code],
+                          capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestImport(unittest.TestCase):
+
+    def getLoadedModules(self, code):
+        code += '\nimport sys\nprint(" ".join(sys.modules))'
+        return set(runPython(code).stdout.split())
+
+    def testLazyImport(self):
+        loadedModules = self.getLoadedModules('import colf')
+        for module in ('pydantic', 'ctypes', 'json', 'six', 'multiprocessing', 'colf.colf_base'):
+            self.assertNotIn(module, loadedModules)
+
+    def testRecordWithoutPydantic(self):
+        loadedModules = self.getLoadedModules('from colf import ColferRecord')
+        self.assertIn('colf.colf_record', loadedModules)
+        for module in ('pydantic', 'ctypes', 'json', 'hashlib', 'multiprocessing'):
+            self.assertNotIn(module, loadedModules)
+
+    def testUnknownName(self):
+        import colf
+        with self.assertRaises(AttributeError):
+            colf.ColferMissing
+        self.assertIn('ColferRecord', dir(colf))
+
+    def testImportTimeBudget(self):
+        importTimes = runPython('from colf import Colfer, ColferRecord', '-X', 'importtime').stderr
+        selfTime = 0
+        for line in importTimes.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip().startswith('colf'):
+                selfTime += int(fields[0].split(':')[1])
+        self.assertGreater(selfTime, 0)
+        self.assertLess(selfTime, IMPORT_BUDGET_US)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import queue
+import unittest
+
+from colf import ColferRing
+from tests.test_model import Point, Shape
+
+
+def consume(ring, results, count):
+    for _ in range(count):
+        results.put(ring.get(timeout=10).x)
+    ring.close()
+
+
+def echo(ring, replies, count):
+    # Both rings arrive pickled, a spawned process attaches to them by name
+    for _ in range(count):
+        point = ring.get(timeout=10)
+        replies.put(Point(x=point.x, y=-point.x), timeout=10)
+    ring.close()
+    replies.close()
+
+
+class TestColferRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = ColferRing(Point, slotCount=4, slotSize=32)
+
+    def tearDown(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def testPutAndGet(self):
+        for round in range(3):
+            for index in range(4):
+                self.ring.put(Point(x=round + 1, y=-index - 1))
+            self.assertEqual(4, self.ring.qsize())
+            for index in range(4):
+                self.assertEqual(Point(x=round + 1, y=-index - 1), self.ring.get())
+        self.assertEqual(0, self.ring.qsize())
+
+    def testReading(self):
+        self.ring.put(Point(x=5))
+        with self.ring.reading() as payload:
+            self.assertEqual(Point(x=5).canonicalBytes(), bytes(payload))
+            self.assertEqual(Point(x=5), Point().unmarshall(bytes(payload))[0])
+        self.assertEqual(0, self.ring.qsize())
+
+    def testFullAndEmpty(self):
+        with self.assertRaises(queue.Empty):
+            self.ring.getNoWait()
+        for index in range(4):
+            self.ring.putNoWait(Point(x=index + 1))
+        with self.assertRaises(queue.Full):
+            self.ring.put(Point(x=5), timeout=0.01)
+        self.assertEqual(Point(x=1), self.ring.getNoWait())
+        self.ring.putNoWait(Point(x=5))
+
+    def testSlotTooSmall(self):
+        ring = ColferRing(Shape, slotCount=2, slotSize=16)
+        try:
+            with self.assertRaises(ValueError):
+                ring.put(Shape(name='too long for one slot'))
+            ring.put(Shape(name='fits'))
+            self.assertEqual(Shape(name='fits'), ring.get())
+        finally:
+            ring.close()
+            ring.unlink()
+
+    def testConsumerProcesses(self):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        ring = ColferRing(Point, slotCount=4, slotSize=32, lock=context.Lock())
+        workers = [context.Process(target=consume, args=(ring, results, 25)) for _ in range(4)]
+        try:
+            for worker in workers:
+                worker.start()
+            for index in range(100):
+                ring.put(Point(x=index + 1), timeout=10)
+            self.assertEqual(list(range(1, 101)), sorted(results.get(timeout=10) for _ in range(100)))
+            for worker in workers:
+                worker.join(10)
+                self.assertEqual(0, worker.exitcode)
+        finally:
+            ring.close()
+            ring.unlink()
+
+    def testSpawnedProcesses(self):
+        context = multiprocessing.get_context('spawn')
+        ring = ColferRing(Point, slotCount=4, slotSize=32, lock=context.Lock())
+        # The worker is the only producer of replies, with room for all of them
+        replies = ColferRing(Point, slotCount=32, slotSize=32, lock=context.Lock())
+        worker = context.Process(target=echo, args=(ring, replies, 20))
+        try:
+            worker.start()
+            for index in range(20):
+                ring.put(Point(x=index + 1), timeout=10)
+            received = [replies.get(timeout=10) for _ in range(20)]
+            self.assertEqual([Point(x=index, y=-index) for index in range(1, 21)], received)
+            worker.join(10)
+            self.assertEqual(0, worker.exitcode)
+        finally:
+            for openRing in (ring, replies):
+                openRing.close()
+                openRing.unlink()
@@ -0,0 +1,958 @@
+# -*- coding: utf-8 -*-
+import datetime
+import enum
+import hashlib
+import mmap
+import struct
+from random import Random
+import unittest
+import subprocess
+import sys
+from multiprocessing import shared_memory
+from typing import ClassVar, Dict, List, Optional
+
+from pydantic import ValidationError, create_model
+
+from colf import Colfer
+from colf.colf_base import DigestOutput
+from colf.colf_type import Float32, Int32, SortedIntList, UInt8, UInt32, UInt64
+
+
+class Point(Colfer):
+    x: Optional[int]
+    y: Optional[int]
+
+
+class Shape(Colfer):
+    name: Optional[str]
+    flags: Optional[List[bool]]
+    times: Optional[List[datetime.datetime]]
+    points: Optional[List[Point]]
+    origin: Optional[Point]
+
+
+class Tree(Colfer):
+    name: Optional[str]
+    children: Optional[List['Tree']]
+
+
+Tree.update_forward_refs()
+
+
+class Embedding(Colfer):
+    scale: Optional[Float32]
+    vector: Optional[List[Float32]]
+
+
+class CompactPoint(Colfer):
+    COLFER_WIRE_MODE = Colfer.COLFER_WIRE_COMPACT
+    x: Optional[int]
+    y: Optional[int]
+
+
+class CompactShape(Colfer):
+    COLFER_WIRE_MODE = Colfer.COLFER_WIRE_COMPACT
+    name: Optional[str]
+    size: Optional[float]
+    active: Optional[bool]
+    origin: Optional[CompactPoint]
+    points: Optional[List[CompactPoint]]
+
+
+class RoundTripMixin(object):
+
+    def roundTrip(self, marshallableObject, size=200):
+        byteOutput = bytearray(size)
+        length = marshallableObject.marshall(byteOutput)
+        unmarshalledObject, offset = type(marshallableObject)().unmarshall(byteOutput[:length])
+        self.assertEqual(length, offset)
+        return unmarshalledObject, byteOutput[:length]
+
+
+class TestModelMarshall(unittest.TestCase, RoundTripMixin):
+
+    def testAbsentFields(self):
+        unmarshalledObject, byteInput = self.roundTrip(Point(y=5))
+        self.assertEqual(b'\x7f\x01\x05\x7f', byteInput)
+        self.assertEqual(Point(y=5), unmarshalledObject)
+
+    def testListBool(self):
+        testVectors = [
+            [True],
+            [False, True],
+            [True, False, True, True, False, False, True, False, True],
+            [bool(bit % 3) for bit in range(100)],
+        ]
+        for vector in testVectors:
+            shape = Shape(name='s', flags=vector, times=[datetime.datetime(2020, 1, 1)],
+                          points=[Point(x=1, y=2)], origin=Point(x=3, y=4))
+            unmarshalledObject, _ = self.roundTrip(shape)
+            self.assertEqual(vector, unmarshalledObject.flags)
+
+    def testListBoolIsPacked(self):
+        shape = Shape(name='s', flags=[True] * 16, times=[datetime.datetime(2020, 1, 1)],
+                      points=[Point(x=1, y=2)], origin=Point(x=3, y=4))
+        _, byteInput = self.roundTrip(shape)
+        self.assertIn(b'\x01\x10\xff\xff\x7f', byteInput)
+
+    def testListTimestamp(self):
+        testVectors = [
+            [datetime.datetime.utcfromtimestamp(0)],
+            [datetime.datetime(2020, 1, 1, 12, 30, 15, 250)],
+            [datetime.datetime(1960, 5, 4), datetime.datetime.utcfromtimestamp(10000000000)],
+        ]
+        for vector in testVectors:
+            shape = Shape(name='s', flags=[True], times=vector,
+                          points=[Point(x=1, y=2)], origin=Point(x=3, y=4))
+            unmarshalledObject, _ = self.roundTrip(shape)
+            self.assertEqual(vector, unmarshalledObject.times)
+
+    def testListObject(self):
+        points = [Point(x=1, y=2), Point(x=-3, y=4), Point(x=5, y=-6)]
+        shape = Shape(name='s', flags=[True], times=[datetime.datetime(2020, 1, 1)],
+                      points=points, origin=Point(x=7, y=8))
+        unmarshalledObject, _ = self.roundTrip(shape)
+        self.assertEqual(points, unmarshalledObject.points)
+        self.assertIsInstance(unmarshalledObject.points[0], Point)
+        self.assertEqual(Point(x=7, y=8), unmarshalledObject.origin)
+
+    def testListSelfReference(self):
+        # The element of outer_type_ stays a ForwardRef, it must not drop the list
+        tree = Tree(name='root', children=[Tree(name='a', children=[])])
+        byteOutput = bytearray(100)
+        length = tree.marshall(byteOutput)
+        self.assertEqual(b'\x00\x04root\x7f\x01\x01\x00\x01a\x7f\x7f\x7f', byteOutput[:length])
+
+    def testFloat32(self):
+        embedding = Embedding(scale=0.1, vector=[0.5, -2.0, 9.8, 0.01171875])
+        unmarshalledObject, byteInput = self.roundTrip(embedding)
+        self.assertEqual(embedding.scale, unmarshalledObject.scale)
+        self.assertEqual(embedding.vector, unmarshalledObject.vector)
+        # Header, 4 flat bytes, trailer, header, count, 4 * 4 flat bytes, trailer
+        self.assertEqual(1 + 4 + 1 + 1 + 1 + 4 * 4 + 1, len(byteInput))
+
+    def testFloat32OutOfBound(self):
+        with self.assertRaises(ValueError):
+            Embedding(scale=1e39)
+
+    def testFloat32OutOfBoundUnvalidated(self):
+        # Values set without validation are written as the float32 nearest to them
+        construct = getattr(Embedding, 'model_construct', Embedding.construct)
+        embedding = construct(scale=1e39, vector=[-1e39, 3.5])
+        unmarshalledObject, _ = self.roundTrip(embedding)
+        self.assertEqual(float('inf'), unmarshalledObject.scale)
+        self.assertEqual([float('-inf'), 3.5], unmarshalledObject.vector)
+
+
+class TestCompactWireMode(unittest.TestCase, RoundTripMixin):
+
+    def testSparseLayout(self):
+        shape = CompactShape(active=True)
+        unmarshalledObject, byteInput = self.roundTrip(shape)
+        self.assertEqual(b'\x02\x7f', byteInput)
+        self.assertEqual(shape, unmarshalledObject)
+
+        _, byteInput = self.roundTrip(Shape(name='s'))
+        self.assertEqual(b'\x00\x01s\x7f\x7f\x7f\x7f\x7f', byteInput)
+
+    def testEmpty(self):
+        unmarshalledObject, byteInput = self.roundTrip(CompactShape())
+        self.assertEqual(b'\x7f', byteInput)
+        self.assertEqual(CompactShape(), unmarshalledObject)
+
+    def testNestedLayout(self):
+        shape = CompactShape(name='s', origin=CompactPoint(x=1, y=-2),
+                             points=[CompactPoint(x=3), CompactPoint()])
+        unmarshalledObject, byteInput = self.roundTrip(shape)
+        self.assertEqual(b'\x00\x01s\x03\x00\x01\x81\x02\x7f\x04\x02\x00\x03\x7f\x7f\x7f', byteInput)
+        self.assertEqual(shape, unmarshalledObject)
+
+    def testUnmarshallResetsAbsentFields(self):
+        byteOutput = bytearray(20)
+        length = CompactShape(size=2.5).marshall(byteOutput)
+        unmarshalledObject, _ = CompactShape(name='stale', active=True).unmarshall(byteOutput[:length])
+        self.assertEqual(CompactShape(size=2.5), unmarshalledObject)
+
+    def testSparseWideMessage(self):
+        WideType = create_model('WideType', __base__=CompactPoint,
+                                **{'f{}'.format(index): (Optional[int], None) for index in range(60)})
+        wideObject = WideType(f3=3, f40=-40, f59=59)
+        unmarshalledObject, byteInput = self.roundTrip(wideObject)
+        self.assertEqual(wideObject, unmarshalledObject)
+        self.assertEqual(3 * 2 + 1, len(byteInput))
+
+    def testIndexTable(self):
+        fieldNames, indexTable = CompactShape().getUnmarshallTable()
+        self.assertEqual(['name', 'size', 'active', 'origin', 'points'], fieldNames)
+        self.assertEqual(Colfer.COLFER_MAX_INDEX + 1, len(indexTable))
+        self.assertEqual('origin', indexTable[3][0])
+        self.assertIsNone(indexTable[5])
+        self.assertIs(indexTable, CompactShape().getUnmarshallTable()[1])
+
+        self.assertEqual((CompactShape(), 2), CompactShape().unmarshall(bytearray(b'\x05\x7f'), end=2))
+
+
+class PointV2(Point):
+    z: Optional[int]
+    label: Optional[str]
+
+
+class ShapeV2(Colfer):
+    name: Optional[str]
+    flags: Optional[List[bool]]
+    times: Optional[List[datetime.datetime]]
+    points: Optional[List[PointV2]]
+    origin: Optional[PointV2]
+
+
+class CompactPointV2(CompactPoint):
+    z: Optional[int]
+    label: Optional[str]
+
+
+class CompactLine(Colfer):
+    COLFER_WIRE_MODE = Colfer.COLFER_WIRE_COMPACT
+    start: Optional[CompactPoint]
+    end: Optional[CompactPoint]
+
+
+class CompactLineV2(Colfer):
+    COLFER_WIRE_MODE = Colfer.COLFER_WIRE_COMPACT
+    start: Optional[CompactPointV2]
+    end: Optional[CompactPointV2]
+
+
+class TestSchemaEvolution(unittest.TestCase):
+
+    def relay(self, newerObject, olderType, keepUnknown=True):
+        byteOutput = bytearray(100)
+        length = newerObject.marshall(byteOutput)
+        byteInput = byteOutput[:length]
+
+        olderObject, offset = olderType().unmarshall(byteInput, keepUnknown=keepUnknown, end=length)
+        self.assertEqual(length, offset)
+
+        relayOutput = bytearray(100)
+        relayLength = olderObject.marshall(relayOutput)
+        return olderObject, byteInput, relayOutput[:relayLength]
+
+    def testCompactSkipsUnknown(self):
+        newerObject = CompactPointV2(x=1, z=-3, label='new')
+        olderObject, _, relayed = self.relay(newerObject, CompactPoint, keepUnknown=False)
+        self.assertEqual(CompactPoint(x=1), olderObject)
+        self.assertEqual(b'\x00\x01\x7f', relayed)
+
+    def testCompactRelaysUnknown(self):
+        newerObject = CompactPointV2(x=1, z=-3, label='new')
+        olderObject, byteInput, relayed = self.relay(newerObject, CompactPoint)
+        self.assertEqual(CompactPoint(x=1), olderObject)
+        self.assertEqual(byteInput, relayed)
+        self.assertEqual(newerObject, CompactPointV2().unmarshall(relayed)[0])
+
+    def testCompactRelaysUnknownWithChange(self):
+        olderObject, _, _ = self.relay(CompactPointV2(x=1, z=-3, label='new'), CompactPoint)
+        olderObject.y = 2
+        relayOutput = bytearray(100)
+        relayLength = olderObject.marshall(relayOutput)
+        self.assertEqual(CompactPointV2(x=1, y=2, z=-3, label='new'),
+                         CompactPointV2().unmarshall(relayOutput[:relayLength])[0])
+
+    def testLegacyRelaysUnknown(self):
+        newerObject = PointV2(y=2, label='new')
+        olderObject, byteInput, relayed = self.relay(newerObject, Point)
+        self.assertEqual(Point(y=2), olderObject)
+        self.assertEqual(byteInput, relayed)
+
+    def testLegacyIgnoresUnknown(self):
+        byteOutput = bytearray(100)
+        length = PointV2(y=2, label='new').marshall(byteOutput)
+        olderObject, offset = Point().unmarshall(byteOutput[:length])
+        self.assertEqual(Point(y=2), olderObject)
+        self.assertEqual(4, offset)
+
+    def testLegacyEndDoesNotDependOnKeepUnknown(self):
+        byteOutput = bytearray(100)
+        length = PointV2(y=2, label='new').marshall(byteOutput)
+        for keepUnknown in (False, True):
+            self.assertEqual(4, Point().unmarshall(byteOutput[:length], keepUnknown=keepUnknown)[1])
+            self.assertEqual(length, Point().unmarshall(byteOutput[:length], keepUnknown=keepUnknown,
+                                                        end=length)[1])
+
+    def testConcatenatedUnknownRaises(self):
+        # Without an end the unknown fields cannot be told apart from the next message
+        byteOutput = bytearray(100)
+        length = CompactPointV2(x=1, z=2).marshall(byteOutput)
+        length = CompactPointV2(x=3, label='b').marshall(byteOutput, length)
+        for keepUnknown in (False, True):
+            with self.assertRaises(ValueError):
+                CompactPoint().unmarshall(byteOutput[:length], keepUnknown=keepUnknown)
+
+        first = CompactPointV2(x=1, z=2).marshall(bytearray(100))
+        olderObject, offset = CompactPoint().unmarshall(byteOutput[:length], end=first)
+        self.assertEqual((CompactPoint(x=1), first), (olderObject, offset))
+        olderObject, offset = CompactPoint().unmarshall(byteOutput[:length], first, end=length)
+        self.assertEqual((CompactPoint(x=3), length), (olderObject, offset))
+
+    def testEndMismatchRaises(self):
+        byteInput = bytes(CompactPoint(x=1).canonicalBytes()) * 2
+        with self.assertRaises(ValueError):
+            CompactPoint().unmarshall(byteInput, end=len(byteInput))
+        with self.assertRaises(ValueError):
+            CompactPoint().unmarshall(byteInput, end=len(byteInput) + 1)
+
+    def testNestedUnknownRaises(self):
+        byteOutput = bytearray(100)
+        length = CompactLineV2(start=CompactPointV2(x=1, z=2)).marshall(byteOutput)
+        for end in (None, length):
+            with self.assertRaises(ValueError):
+                CompactLine().unmarshall(byteOutput[:length], end=end)
+
+    def testLegacyNestedUnknownRaises(self):
+        byteOutput = bytearray(100)
+        length = ShapeV2(name='s', origin=PointV2(x=1, z=5)).marshall(byteOutput)
+        for end in (None, length):
+            with self.assertRaises(ValueError):
+                Shape().unmarshall(byteOutput[:length], end=end)
+
+
+class Event(Colfer):
+    flag: Optional[bool]
+    level: Optional[UInt8]
+    code: Optional[Int32]
+    stamp: Optional[datetime.datetime]
+    ratio: Optional[Float32]
+    payload: Optional[bytes]
+    origin: Optional[Point]
+    points: Optional[List[Point]]
+    counts: Optional[List[int]]
+    weights: Optional[List[float]]
+    names: Optional[List[str]]
+    flags: Optional[List[bool]]
+    times: Optional[List[datetime.datetime]]
+    status: Optional[int]
+    label: Optional[str]
+
+
+class CompactEvent(Event):
+    COLFER_WIRE_MODE = Colfer.COLFER_WIRE_COMPACT
+
+
+class TestPatch(unittest.TestCase):
+
+    def getExampleObject(self, eventType):
+        return eventType(flag=True, level=3, code=-77, stamp=datetime.datetime(2021, 2, 3, 4, 5, 6, 7),
+                         ratio=0.25, payload=b'\x7f\x7f', origin=Point(x=1), points=[Point(y=2), Point()],
+                         counts=[1, -1 << 62], weights=[0.5], names=['a', u'한'], flags=[True, False],
+                         times=[datetime.datetime(1999, 1, 1)], status=1, label='x')
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(300)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def assertPatched(self, marshallableObject, **fieldValues):
+        patched = type(marshallableObject).patch(self.encode(marshallableObject), **fieldValues)
+        expectedObject = marshallableObject.copy(update=fieldValues)
+        self.assertEqual(self.encode(expectedObject), patched)
+        unmarshalledObject, offset = type(marshallableObject)().unmarshall(patched)
+        self.assertEqual(len(patched), offset)
+        self.assertEqual(patched, self.encode(unmarshalledObject))
+
+    def testSkipMessage(self):
+        for eventType in (Event, CompactEvent):
+            byteInput = self.encode(self.getExampleObject(eventType))
+            self.assertEqual(len(byteInput), eventType().skipMessage(byteInput))
+
+    def testPatch(self):
+        for eventType in (Event, CompactEvent):
+            exampleObject = self.getExampleObject(eventType)
+            self.assertPatched(exampleObject, status=2)
+            self.assertPatched(exampleObject, status=-300, label='a longer label')
+            self.assertPatched(exampleObject, flag=None, status=None)
+            self.assertPatched(exampleObject, origin=Point(x=5, y=6), weights=[])
+            self.assertPatched(eventType(label='x'), status=4, flag=True)
+            self.assertPatched(eventType(), level=9)
+            self.assertPatched(exampleObject)
+
+    def testPatchKeepsTrailingInput(self):
+        byteInput = self.encode(CompactEvent(status=1)) + b'next'
+        patched = CompactEvent.patch(byteInput, status=2)
+        self.assertEqual(self.encode(CompactEvent(status=2)) + b'next', patched)
+
+    def testPatchAssertions(self):
+        byteInput = self.encode(Event(status=1))
+        with self.assertRaises(AttributeError):
+            Event.patch(byteInput, unknownKey=1)
+        with self.assertRaises(ValueError):
+            Event.patch(byteInput, level=1000)
+
+
+class TestCanonical(unittest.TestCase):
+
+    def testCanonicalNaN(self):
+        negativeNaN = struct.unpack('>d', b'\xff\xf8\x00\x00\x00\x00\x00\x01')[0]
+        self.assertEqual(Event(ratio=float('nan'), weights=[float('nan')]).canonicalBytes(),
+                         Event(ratio=negativeNaN, weights=[negativeNaN]).canonicalBytes())
+
+    def testCanonicalAbsentValues(self):
+        self.assertEqual(Event().canonicalBytes(),
+                         Event(flag=False, status=0, label='', counts=[], ratio=-0.0).canonicalBytes())
+
+    def testCanonicalLeavesOutUnknownFields(self):
+        byteOutput = bytearray(100)
+        length = CompactPointV2(x=1, z=-3).marshall(byteOutput)
+        olderObject, _ = CompactPoint().unmarshall(byteOutput[:length], keepUnknown=True, end=length)
+        self.assertEqual(CompactPoint(x=1).canonicalBytes(), olderObject.canonicalBytes())
+
+    def testDigest(self):
+        testVectors = [
+            Event(),
+            TestPatch().getExampleObject(Event),
+            TestPatch().getExampleObject(CompactEvent),
+            Event(label=u'한' * 5000, counts=list(range(-3000, 3000, 7)), payload=b'\x01' * 9000),
+            Shape(name='s', points=[Point(x=index, y=-index) for index in range(2000)]),
+        ]
+        for vector in testVectors:
+            self.assertEqual(hashlib.sha256(vector.canonicalBytes()).digest(), vector.digest())
+            self.assertEqual(hashlib.md5(vector.canonicalBytes()).digest(), vector.digest('md5'))
+
+            byteOutput = DigestOutput(hashlib.sha256(), windowSize=32)
+            self.assertEqual(hashlib.sha256(vector.canonicalBytes()).digest(),
+                             byteOutput.digest(vector.marshallMessage(byteOutput, 0)))
+
+
+class TestBufferTargets(unittest.TestCase):
+
+    def getExampleObject(self):
+        return Shape(name=u'도형', points=[Point(x=1, y=-2), Point(x=300)])
+
+    def testMemoryview(self):
+        expected = self.getExampleObject().canonicalBytes()
+        byteOutput = bytearray(len(expected) + 4)
+        length = self.getExampleObject().marshall(memoryview(byteOutput), 2)
+        self.assertEqual(len(expected) + 2, length)
+        self.assertEqual(expected, byteOutput[2:length])
+
+    def testMmap(self):
+        expected = self.getExampleObject().canonicalBytes()
+        byteOutput = mmap.mmap(-1, 4096)
+        try:
+            length = self.getExampleObject().marshall(byteOutput)
+            self.assertEqual(expected, byteOutput[:length])
+            self.assertEqual(self.getExampleObject(), Shape().unmarshall(byteOutput[:length])[0])
+        finally:
+            byteOutput.close()
+
+    def testSharedMemory(self):
+        expected = self.getExampleObject().canonicalBytes()
+        block = shared_memory.SharedMemory(create=True, size=len(expected))
+        try:
+            length = self.getExampleObject().marshall(block.buf)
+            self.assertEqual(expected, bytes(block.buf[:length]))
+        finally:
+            block.close()
+            block.unlink()
+
+    def testBufferTooSmall(self):
+        expected = self.getExampleObject().canonicalBytes()
+        byteOutput = bytearray(len(expected))
+        with self.assertRaises(ValueError):
+            self.getExampleObject().marshall(memoryview(byteOutput), 1)
+        self.assertEqual(bytearray(len(expected)), byteOutput)
+
+    def testReadOnlyBuffer(self):
+        with self.assertRaises(AssertionError):
+            Point(x=1).marshall(memoryview(bytes(10)))
+
+    def testUnmarshallMemoryview(self):
+        value = Event(payload=b'\x00\xff', names=[u'도형', 'b'], origin=Point(x=1), label='x')
+        byteOutput = bytearray(100)
+        length = value.marshall(byteOutput, 3)
+        for byteInput in (memoryview(byteOutput), memoryview(bytes(byteOutput)).toreadonly()):
+            with self.subTest(readonly=byteInput.readonly):
+                unmarshalledObject, offset = Event().unmarshall(byteInput, 3, end=length)
+                self.assertEqual((value, length), (unmarshalledObject, offset))
+                self.assertIs(bytes, type(unmarshalledObject.payload))
+
+    def testUnmarshallInPlace(self):
+        # Nothing decoded refers to the buffer, so it closes right after
+        expected = self.getExampleObject().canonicalBytes()
+        byteOutput = mmap.mmap(-1, 4096)
+        self.getExampleObject().marshall(byteOutput)
+        self.assertEqual(self.getExampleObject(), Shape().unmarshall(byteOutput, end=len(expected))[0])
+        byteOutput.close()
+
+        block = shared_memory.SharedMemory(create=True, size=len(expected))
+        try:
+            self.getExampleObject().marshall(block.buf)
+            self.assertEqual(self.getExampleObject(), Shape().unmarshall(block.buf)[0])
+        finally:
+            block.close()
+            block.unlink()
+
+
+class TestPydanticBackend(unittest.TestCase):
+
+    def testColferFields(self):
+        colferFields = Event.getColferFields()
+        self.assertEqual(list(Event().dict()), list(colferFields))
+        self.assertIs(int, colferFields['counts'].type_)
+        self.assertEqual(List[int], colferFields['counts'].outer_type_)
+        self.assertIs(Point, colferFields['points'].type_)
+        self.assertIs(UInt8, colferFields['level'].type_)
+        self.assertIs(Point, colferFields['origin'].outer_type_)
+
+    def testOptionalDefaults(self):
+        self.assertIsNone(Event().label)
+        self.assertEqual(Point(x=1), Point(x=1, y=None))
+
+    def testValidateKnownAttribute(self):
+        self.assertEqual(Float32(0.5), Event().validateKnownAttribute('ratio', Float32, 0.5))
+        with self.assertRaises(ValidationError):
+            Event().validateKnownAttribute('level', UInt8, 'a')
+
+
+class Node(Colfer):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+    COLFER_MAX_DEPTH: ClassVar[int] = 3
+
+    name: Optional[str]
+    child: Optional['Node']
+    children: Optional[List['Node']]
+
+
+Node.update_forward_refs()
+
+
+class LimitedEvent(CompactEvent):
+    COLFER_MAX_SIZE: ClassVar[int] = 16
+    COLFER_LIST_MAX: ClassVar[int] = 2
+
+
+class Counters(Colfer):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+    small: Optional[UInt32]
+    large: Optional[UInt64]
+    sizes: Optional[Dict[str, UInt64]]
+
+
+def getHostileInputs():
+    hugeLength = b'\xff' * 8 + b'\x7f'
+    return [
+        bytes([11]) + hugeLength + b'\x7f',            # List[bool]
+        bytes([8]) + hugeLength + b'\x7f',             # List[int]
+        bytes([9]) + hugeLength + b'\x7f',             # List[float]
+        bytes([10]) + hugeLength + b'\x7f',            # List[str]
+        bytes([7]) + hugeLength + b'\x7f',             # List[Point]
+        bytes([14]) + b'\x80\x01' + b'a' * 10 + b'\x7f',  # str longer than the input
+        bytes([5]) + b'\x05\x01\x7f',                   # bytes longer than the input
+    ]
+
+
+class TestDecodeLimits(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(1000)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def testHostileLengths(self):
+        for byteInput in getHostileInputs():
+            with self.subTest(byteInput=byteInput):
+                with self.assertRaises(ValueError):
+                    CompactEvent().unmarshall(byteInput)
+
+    def testHostileLengthsWithoutAsserts(self):
+        code = 'from tests.test_model import *\n' \
+               'for byteInput in getHostileInputs():\n' \
+               '    try:\n' \
+               '        CompactEvent().unmarshall(byteInput)\n' \
+               '    except ValueError:\n' \
+               '        continue\n' \
+               '    raise SystemExit(1)\n'
+        subprocess.run([sys.executable, '-O', '-c', code], check=True, timeout=60)
+
+    def testEmptyInput(self):
+        with self.assertRaises(ValueError):
+            CompactEvent().unmarshall(b'')
+
+    def testListMax(self):
+        LimitedEvent().unmarshall(self.encode(CompactEvent(counts=[1, 2])))
+        with self.assertRaises(ValueError):
+            LimitedEvent().unmarshall(self.encode(CompactEvent(counts=[1, 2, 3])))
+
+    def testMaxSize(self):
+        LimitedEvent().unmarshall(self.encode(CompactEvent(label='x' * 10)))
+        with self.assertRaises(ValueError):
+            LimitedEvent().unmarshall(self.encode(CompactEvent(label='x' * 20)))
+        with self.assertRaises(ValueError):
+            LimitedEvent().unmarshall(self.encode(CompactEvent(status=1, counts=[1, 2], flag=True,
+                                                               ratio=1.0, code=-1, level=5)))
+
+    def testMaxSizeFromOffset(self):
+        byteInput = b'\x00' * 100 + self.encode(CompactEvent(label='x' * 10))
+        value, _ = LimitedEvent().unmarshall(byteInput, 100)
+        self.assertEqual('x' * 10, value.label)
+
+    def testMaxDepth(self):
+        def nest(depth):
+            return Node(name=str(depth), child=nest(depth - 1)) if depth else Node(name='leaf')
+
+        self.assertEqual(nest(3), Node().unmarshall(self.encode(nest(3)))[0])
+        for value in (nest(4), Node(children=[Node(children=[Node(children=[Node(child=Node())])])])):
+            byteInput = self.encode(value)
+            with self.assertRaises(ValueError):
+                Node().unmarshall(byteInput)
+            with self.assertRaises(ValueError):
+                Node().skipMessage(byteInput)
+        # The depth resets after a failed decode
+        self.assertEqual(nest(3), Node().unmarshall(self.encode(nest(3)))[0])
+
+
+    def testLimitsPerCall(self):
+        byteInput = self.encode(CompactEvent(counts=[1, 2, 3], label='x' * 20))
+        value, _ = LimitedEvent().unmarshall(byteInput, limits={'COLFER_MAX_SIZE': 100, 'COLFER_LIST_MAX': 3})
+        self.assertEqual([1, 2, 3], value.counts)
+        with self.assertRaises(ValueError):
+            CompactEvent().unmarshall(byteInput, limits={'COLFER_LIST_MAX': 2})
+        with self.assertRaises(ValueError):
+            CompactEvent().unmarshall(byteInput, end=len(byteInput), limits={'COLFER_MAX_SIZE': 16})
+        with self.assertRaises(ValueError):
+            Node().unmarshall(self.encode(Node(child=Node(child=Node()))), limits={'COLFER_MAX_DEPTH': 1})
+        with self.assertRaises(ValueError):
+            CompactEvent().unmarshall(byteInput, limits={'COLFER_MAX_ITEMS': 2})
+        # The limits last for one call only
+        self.assertEqual([1, 2, 3], CompactEvent().unmarshall(byteInput)[0].counts)
+
+    def testHostileVarInts(self):
+        largest = self.encode(Counters(small=0xffffffff, large=0xffffffffffffffff, sizes={'a': 0xffffffffffffffff}))
+        self.assertEqual(largest, self.encode(Counters().unmarshall(largest)[0]))
+        self.assertEqual(-0x80000000, CompactEvent().unmarshall(b'\x82\x80\x80\x80\x80\x08\x7f')[0].code)
+
+        # Varints that do not end within their size are rejected by skipMessage as well
+        for colferType, byteInput in (
+                (Counters, b'\x00' + b'\xff' * 640000 + b'\x01\x7f'),
+                (Counters, b'\x02' + b'\xff' * 10 + b'\x01\x7f'),
+                (CompactEvent, b'\x08' + b'\xff' * 10000 + b'\x01\x7f'),
+                (CompactEvent, b'\x08\x01' + b'\xff' * 10 + b'\x01\x7f')):
+            with self.subTest(byteInput=byteInput[:16]):
+                with self.assertRaises(ValueError):
+                    colferType().unmarshall(byteInput)
+                with self.assertRaises(ValueError):
+                    colferType().skipMessage(byteInput)
+
+        # Values past the range of their type
+        for colferType, byteInput in (
+                (Counters, b'\x00\xff\xff\xff\xff\x1f\x7f'),
+                (CompactEvent, b'\x02\x80\x80\x80\x80\x08\x7f'),
+                (CompactEvent, b'\x0d' + b'\xff' * 9 + b'\x7f')):
+            with self.subTest(byteInput=byteInput):
+                with self.assertRaises(ValueError):
+                    colferType().unmarshall(byteInput)
+
+    def testTimestampOutOfRange(self):
+        seconds = struct.pack('>q', 1 << 62)
+        for byteInput in (bytes([3 | 0x80]) + seconds + bytes(4) + b'\x7f',
+                          bytes([12, 1]) + b'\xff' * 8 + b'\x7f\x00\x7f'):
+            with self.subTest(byteInput=byteInput):
+                with self.assertRaises(ValueError):
+                    CompactEvent().unmarshall(byteInput)
+
+    def testMutatedInputs(self):
+        # Whatever the corruption, decoding fails with ValueError and nothing else
+        random = Random(41)
+        for colferType in (Event, CompactEvent):
+            encoded = self.encode(colferType(
+                flag=True, level=UInt8.validate(7), code=Int32.validate(-3),
+                stamp=datetime.datetime(2021, 5, 4, 3, 2, 1), ratio=Float32.validate(0.5), payload=b'\x7f',
+                origin=Point(x=1), points=[Point(y=2)], counts=[1, -300], weights=[1.5], names=['a', 'b'],
+                flags=[True, False], times=[datetime.datetime(1969, 12, 31)], status=1 << 40, label='last'))
+            for _ in range(2000):
+                byteInput = bytearray(encoded)
+                for _ in range(random.randrange(1, 4)):
+                    operation = random.randrange(3)
+                    if operation == 0:
+                        byteInput[random.randrange(len(byteInput))] = random.randrange(256)
+                    elif operation == 1:
+                        del byteInput[random.randrange(1, len(byteInput) + 1):]
+                    else:
+                        byteInput.insert(random.randrange(len(byteInput) + 1), random.randrange(256))
+                for end in (None, len(byteInput)):
+                    try:
+                        colferType().unmarshall(bytes(byteInput), end=end)
+                    except ValueError:
+                        pass
+
+
+class TestReuse(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(1000)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def testRefillsInPlace(self):
+        for shapeType in (Shape, CompactShape):
+            pointType = CompactPoint if shapeType is CompactShape else Point
+            with self.subTest(shapeType=shapeType):
+                target = shapeType()
+                first = shapeType(name='a', origin=pointType(x=1), points=[pointType(x=2), pointType(y=3)])
+                second = shapeType(name='b', origin=pointType(y=4), points=[pointType(x=5)])
+
+                value, _ = target.unmarshall(self.encode(first), reuse=True)
+                self.assertIs(target, value)
+                self.assertEqual(first, target)
+                origin, points, firstPoint = target.origin, target.points, target.points[0]
+
+                target.unmarshall(self.encode(second), reuse=True)
+                self.assertEqual(second, target)
+                self.assertIs(origin, target.origin)
+                self.assertIs(points, target.points)
+                self.assertIs(firstPoint, target.points[0])
+
+    def testFreeList(self):
+        target = Shape()
+        target.unmarshall(self.encode(Shape(origin=Point(x=1), points=[Point(x=2), Point(x=3)])), reuse=True)
+        dropped = target.points[1]
+        target.unmarshall(self.encode(Shape(points=[Point(x=4)])), reuse=True)
+        self.assertIsNone(target.origin)
+        target.unmarshall(self.encode(Shape(points=[Point(x=5), Point(x=6), Point(x=7)])), reuse=True)
+        self.assertEqual(Shape(points=[Point(x=5), Point(x=6), Point(x=7)]), target)
+        self.assertTrue(any(point is dropped for point in target.points))
+
+    def testWithoutReuse(self):
+        target = Shape()
+        target.unmarshall(self.encode(Shape(origin=Point(x=1), points=[Point(x=2)])))
+        origin, points = target.origin, target.points
+        target.unmarshall(self.encode(Shape(origin=Point(x=3), points=[Point(x=4)])))
+        self.assertIsNot(origin, target.origin)
+        self.assertIsNot(points, target.points)
+        self.assertEqual(Point(x=1), origin)
+
+
+class Color(enum.Enum):
+    RED = 'red'
+    GREEN = 'green'
+    BLUE = 'blue'
+
+
+class Priority(enum.IntEnum):
+    LOW = 10
+    HIGH = 20
+
+
+class Paint(Colfer):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+    color: Optional[Color]
+    priority: Optional[Priority]
+    palette: Optional[List[Color]]
+
+
+class TestEnum(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(100)
+        return bytes(byteOutput[:marshallableObject.marshall(byteOutput)])
+
+    def testOrdinals(self):
+        paint = Paint(color='red', priority=20, palette=[Color.BLUE, Color.RED])
+        self.assertIs(Color.RED, paint.color)
+        byteInput = self.encode(paint)
+        self.assertEqual(b'\x00\x00\x01\x01\x02\x02\x02\x00\x7f', byteInput)
+        decoded, offset = Paint().unmarshall(byteInput)
+        self.assertEqual((paint, len(byteInput)), (decoded, offset))
+        self.assertIs(Priority.HIGH, decoded.priority)
+
+    def testAbsent(self):
+        self.assertEqual(b'\x7f', self.encode(Paint()))
+        self.assertEqual(Paint(), Paint().unmarshall(b'\x7f')[0])
+
+    def testUnknownOrdinal(self):
+        with self.assertRaises(ValueError):
+            Paint().unmarshall(b'\x00\x03\x7f')
+        with self.assertRaises(ValueError):
+            Paint().unmarshall(b'\x02\x01\x05\x7f')
+
+    def testSkip(self):
+        byteInput = self.encode(Paint(color=Color.GREEN, palette=[Color.GREEN] * 3))
+        self.assertEqual(len(byteInput), Paint().skipMessage(byteInput))
+
+    def testValidation(self):
+        with self.assertRaises(ValidationError):
+            Paint(color='purple')
+
+
+class Inventory(Colfer):
+    counts: Optional[Dict[str, int]]
+    prices: Optional[Dict[int, float]]
+    blobs: Optional[Dict[str, bytes]]
+    sizes: Optional[Dict[UInt8, Float32]]
+    seen: Optional[Dict[Int32, datetime.datetime]]
+    flags: Optional[Dict[Color, bool]]
+    total: Optional[int]
+
+
+class CompactInventory(Inventory):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+
+class Catalog(Colfer):
+    counts: Optional[Dict[str, int]]
+    ids: Optional[List[int]]
+    points: Optional[List[Point]]
+
+
+class BuiltinCatalog(Colfer):
+    counts: Optional[dict[str, int]]
+    ids: Optional[list[int]]
+    points: Optional[list[Point]]
+
+
+class TestMap(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(1000)
+        return bytes(byteOutput[:marshallableObject.marshall(byteOutput)])
+
+    def getExampleInventory(self, inventoryType):
+        return inventoryType(counts={'a': 1, '': 0, u'나': -300}, prices={0: 0.5, -2 ** 40: -1.0},
+                             blobs={'b': b'\x00\xff'}, sizes={0: 1.5, 255: -2.0},
+                             seen={-1: datetime.datetime(1969, 1, 2, 3, 4, 5, 6000)},
+                             flags={Color.RED: False, Color.BLUE: True}, total=3)
+
+    def testRoundTrip(self):
+        for inventoryType in (Inventory, CompactInventory):
+            with self.subTest(inventoryType=inventoryType):
+                inventory = self.getExampleInventory(inventoryType)
+                byteInput = self.encode(inventory)
+                decoded, offset = inventoryType().unmarshall(byteInput)
+                self.assertEqual(len(byteInput), offset)
+                self.assertEqual(byteInput, self.encode(decoded))
+                self.assertEqual(inventory.counts, decoded.counts)
+                self.assertEqual(inventory.flags, decoded.flags)
+                self.assertEqual(len(byteInput), inventoryType().skipMessage(byteInput))
+
+    def testLayout(self):
+        # Count, then keys and values alternating
+        self.assertEqual(b'\x00\x02\x01a\x02\x01b\x04\x7f',
+                         self.encode(CompactInventory(counts={'a': 1, 'b': 2})))
+        self.assertEqual(b'\x7f', self.encode(CompactInventory(counts={})))
+
+    def testHostileCount(self):
+        with self.assertRaises(ValueError):
+            CompactInventory().unmarshall(b'\x00\xff\xff\x03a\x7f')
+
+    def testInsertionOrder(self):
+        inventory = self.getExampleInventory(CompactInventory)
+        reordered = CompactInventory(**{name: dict(reversed(list(value.items()))) if isinstance(value, dict)
+                                        else value for name, value in dict(inventory).items()})
+        self.assertEqual(inventory, reordered)
+        self.assertNotEqual(list(inventory.counts), list(reordered.counts))
+        self.assertEqual(inventory.canonicalBytes(), reordered.canonicalBytes())
+        self.assertEqual(inventory.digest(), reordered.digest())
+        self.assertEqual(self.encode(inventory), self.encode(reordered))
+
+    def testBuiltinGenerics(self):
+        values = dict(counts={'a': 1, 'b': -2}, ids=[3, 4], points=[Point(x=1, y=2)])
+        byteInput = self.encode(Catalog(**values))
+        self.assertEqual(byteInput, self.encode(BuiltinCatalog(**values)))
+        decoded, offset = BuiltinCatalog().unmarshall(byteInput)
+        self.assertEqual((values['counts'], values['ids'], len(byteInput)), (decoded.counts, decoded.ids, offset))
+        self.assertEqual(values['points'][0].x, decoded.points[0].x)
+        self.assertEqual(len(byteInput), BuiltinCatalog().skipMessage(byteInput))
+
+    def testUntypedMap(self):
+        class Untyped(Colfer):
+            counts: Optional[dict]
+
+        for use in (lambda: Untyped(counts={'a': 1}).marshall(bytearray(100)),
+                    lambda: Untyped().unmarshall(b'\x7f'),
+                    lambda: Untyped().skipMessage(b'\x7f')):
+            with self.assertRaisesRegex(ValueError, 'Map fields need key and value types'):
+                use()
+
+
+class Timeline(Colfer):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+    ids: Optional[SortedIntList]
+    plain: Optional[List[int]]
+
+
+class TestSortedIntList(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(10000)
+        return bytes(byteOutput[:marshallableObject.marshall(byteOutput)])
+
+    def testRoundTrip(self):
+        for ids in ([5], [1, 2, 3, 1000, 1000, 10 ** 12], [3, -7, 2, 0],
+                    [-2 ** 63, 2 ** 63 - 1, -2 ** 63, 0]):
+            with self.subTest(ids=ids):
+                byteInput = self.encode(Timeline(ids=ids))
+                decoded, offset = Timeline().unmarshall(byteInput)
+                self.assertEqual((ids, len(byteInput)), (decoded.ids, offset))
+                self.assertIsInstance(decoded.ids, SortedIntList)
+                self.assertEqual(len(byteInput), Timeline().skipMessage(byteInput))
+
+    def testDeltas(self):
+        self.assertEqual(b'\x00\x03\x14\x02\x02\x7f', self.encode(Timeline(ids=[10, 11, 12])))
+        ids = list(range(10 ** 15, 10 ** 15 + 1000 * 7, 7))
+        self.assertLess(len(self.encode(Timeline(ids=ids))) * 4, len(self.encode(Timeline(plain=ids))))
+        self.assertEqual(b'\x7f', self.encode(Timeline(ids=[])))
+
+    def testValidation(self):
+        self.assertEqual(SortedIntList([1, 2]), Timeline(ids=(1, 2)).ids)
+        for ids in ([1.5], ['1'], [2 ** 63], 'abc'):
+            with self.subTest(ids=ids):
+                with self.assertRaises(ValidationError):
+                    Timeline(ids=ids)
+
+
+class Settings(Colfer):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_BITMAP
+
+    visible: Optional[bool]
+    name: Optional[str]
+    locked: Optional[bool]
+    shared: Optional[bool]
+    flags: Optional[List[bool]]
+    archived: Optional[bool]
+
+
+class SettingsV2(Settings):
+    pinned: Optional[bool]
+
+
+class TestBoolBitmap(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(1000)
+        return bytes(byteOutput[:marshallableObject.marshall(byteOutput)])
+
+    def testRoundTrip(self):
+        for settings in (Settings(), Settings(visible=True), Settings(name='a', shared=True, archived=True),
+                         Settings(visible=True, locked=True, shared=True, archived=True, flags=[True, False])):
+            with self.subTest(settings=settings):
+                byteInput = self.encode(settings)
+                decoded, offset = Settings().unmarshall(byteInput)
+                self.assertEqual((settings, len(byteInput)), (decoded, offset))
+                self.assertEqual(len(byteInput), Settings().skipMessage(byteInput))
+
+    def testLayout(self):
+        # One field at the index of visible, bit i for the i-th bool field
+        self.assertEqual(b'\x00\x0c\x01\x01a\x7f', self.encode(Settings(name='a', shared=True, archived=True)))
+        self.assertEqual(b'\x7f', self.encode(Settings(visible=False, locked=False)))
+        self.assertEqual(b'\x04\x03\x05\x7f', self.encode(Settings(flags=[True, False, True])))
+
+    def testSchemaEvolution(self):
+        byteInput = self.encode(SettingsV2(locked=True, pinned=True))
+        decoded, _ = Settings().unmarshall(byteInput)
+        self.assertEqual(Settings(locked=True), decoded)
+        decoded, _ = SettingsV2().unmarshall(self.encode(Settings(archived=True)))
+        self.assertEqual(SettingsV2(archived=True), decoded)
+
+    def testPatch(self):
+        byteInput = self.encode(Settings(visible=True, name='a'))
+        self.assertEqual(self.encode(Settings(visible=True, name='bc')), Settings.patch(byteInput, name='bc'))
+        with self.assertRaises(ValueError):
+            Settings.patch(byteInput, locked=True)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import datetime
+import pickle
+import unittest
+from typing import ClassVar, List, Optional
+
+from colf import Colfer, ColferDecodeCache, ColferRecord
+from colf.colf_type import Float32, UInt8
+from tests.test_model import Color, Paint, Point
+
+
+class PointRecord(ColferRecord):
+    x: Optional[int]
+    y: Optional[int]
+
+
+class EventRecord(ColferRecord):
+    flag: Optional[bool]
+    level: Optional[UInt8]
+    ratio: Optional[Float32]
+    stamp: Optional[datetime.datetime]
+    origin: Optional[PointRecord]
+    points: Optional[List[PointRecord]]
+    names: Optional[List[str]]
+    status: Optional[int] = 7
+
+
+class CompactPointRecord(PointRecord):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+    z: Optional[int]
+
+
+class PaintRecord(ColferRecord):
+    COLFER_WIRE_MODE: ClassVar[int] = Colfer.COLFER_WIRE_COMPACT
+
+    color: Optional[Color]
+    priority: Optional[int]
+    palette: Optional[List[Color]]
+
+
+class TestRecord(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(200)
+        return byteOutput[:marshallableObject.marshall(byteOutput)]
+
+    def getExampleRecord(self):
+        return EventRecord(flag=True, level=3, ratio=0.1, stamp=datetime.datetime(2020, 1, 2),
+                           origin=PointRecord(x=1), points=[PointRecord(y=2), PointRecord()],
+                           names=['a', u'한'], status=-5)
+
+    def testSlots(self):
+        record = PointRecord(x=1)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(('z',), CompactPointRecord.__slots__)
+        self.assertEqual(['x', 'y', 'z'], list(CompactPointRecord.getColferFields()))
+        self.assertEqual(7, EventRecord().status)
+        self.assertEqual(UInt8.validate(3), EventRecord(level=3).level)
+
+    def testImmutable(self):
+        record = PointRecord(x=1)
+        with self.assertRaises(AttributeError):
+            record.x = 2
+        with self.assertRaises(AttributeError):
+            PointRecord(unknownKey=1)
+        self.assertEqual(PointRecord(x=1, y=2), record.copy(update={'y': 2}))
+
+    def testRoundTrip(self):
+        record = self.getExampleRecord()
+        byteInput = self.encode(record)
+        unmarshalledRecord, offset = EventRecord().unmarshall(byteInput)
+        self.assertEqual(len(byteInput), offset)
+        self.assertEqual(byteInput, self.encode(unmarshalledRecord))
+        self.assertIsInstance(unmarshalledRecord.points[0], PointRecord)
+
+    def testWireCompatibleWithColfer(self):
+        byteInput = self.encode(Point(x=5, y=-6))
+        self.assertEqual(byteInput, self.encode(PointRecord(x=5, y=-6)))
+        self.assertEqual(PointRecord(x=5, y=-6), PointRecord().unmarshall(byteInput)[0])
+
+        record = CompactPointRecord(x=1, z=3)
+        self.assertEqual(b'\x00\x01\x02\x03\x7f', self.encode(record))
+        self.assertEqual(record, CompactPointRecord().unmarshall(self.encode(record))[0])
+
+    def testPatchAndPickle(self):
+        record = self.getExampleRecord()
+        patched = EventRecord.patch(self.encode(record), status=9)
+        self.assertEqual(9, EventRecord().unmarshall(patched)[0].status)
+        self.assertEqual(record, pickle.loads(pickle.dumps(record)))
+
+    def testEnum(self):
+        record = PaintRecord(color='green', palette=['blue'])
+        self.assertEqual((Color.GREEN, [Color.BLUE]), (record.color, record.palette))
+        byteInput = self.encode(record)
+        self.assertEqual(self.encode(Paint(color=Color.GREEN, palette=[Color.BLUE])), byteInput)
+        self.assertEqual(record, PaintRecord().unmarshall(byteInput)[0])
+        with self.assertRaises(ValueError):
+            PaintRecord(color='purple')
+
+    def testDecodeCache(self):
+        byteInput = self.encode(self.getExampleRecord())
+        cache = ColferDecodeCache(EventRecord)
+        first, _ = cache.unmarshall(byteInput)
+        second, _ = cache.unmarshall(byteInput)
+        self.assertIs(first, second)
+        with self.assertRaises(AttributeError):
+            first.points.append(PointRecord())
+        third, _ = ColferDecodeCache(EventRecord, copyOnHit=True).unmarshall(byteInput)
+        third.points.append(PointRecord())
+        self.assertEqual(3, len(third.points))
+        self.assertEqual(1, cache.getStats()['hits'])
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+from colf import ColferDecoder
+from colf.colf_type import Float32, Int32, UInt8
+from tests.test_model import CompactEvent, CompactInventory, Event, Inventory, LimitedEvent, Node, Point, Settings
+
+
+def getEvents(eventType):
+    return [
+        eventType(flag=True, level=UInt8.validate(7), code=Int32.validate(-3),
+                  stamp=datetime.datetime(2021, 5, 4, 3, 2, 1, 123456),
+                  ratio=Float32.validate(0.5), payload=b'\x00\x7f\xff', origin=Point(x=1, y=2),
+                  points=[Point(x=3), Point(y=-4)], counts=[1, 300, -70000], weights=[1.5, -2.25],
+                  names=['a', 'bé', ''], flags=[True, False, True],
+                  times=[datetime.datetime(1969, 12, 31)],
+                  status=1 << 40, label='last'),
+        eventType(label='x' * 300),
+        eventType(counts=list(range(1, 200)), names=['n'] * 50),
+        eventType(),
+    ]
+
+
+class TestColferDecoder(unittest.TestCase):
+
+    def encode(self, marshallableObject):
+        byteOutput = bytearray(10000)
+        return bytes(byteOutput[:marshallableObject.marshall(byteOutput)])
+
+    def assertStream(self, colferType, values, chunkSize):
+        stream = b''.join(self.encode(value) for value in values)
+        decoder = ColferDecoder(colferType)
+        decoded = []
+        for offset in range(0, len(stream), chunkSize):
+            decoded.extend(decoder.feed(stream[offset:offset+chunkSize]))
+        self.assertEqual(0, decoder.getPendingSize())
+        self.assertEqual([self.encode(value) for value in values], [self.encode(value) for value in decoded])
+
+    def testChunkSizes(self):
+        for colferType in (Event, CompactEvent):
+            for chunkSize in (1, 2, 3, 7, 64, 100000):
+                with self.subTest(colferType=colferType, chunkSize=chunkSize):
+                    self.assertStream(colferType, getEvents(colferType), chunkSize)
+
+    def testNested(self):
+        tree = Node(name='root', child=Node(name='child'), children=[Node(name='a'), Node(child=Node(name='b'))])
+        self.assertStream(Node, [tree, Node(name='next')], 1)
+
+    def testBoolBitmap(self):
+        self.assertStream(Settings, [Settings(name='a', locked=True), Settings(), Settings(archived=True)], 1)
+
+    def testPartialMessage(self):
+        byteInput = self.encode(Point(x=5, y=6))
+        decoder = ColferDecoder(Point)
+        self.assertEqual([], decoder.feed(byteInput[:-1]))
+        self.assertEqual(len(byteInput) - 1, decoder.getPendingSize())
+        self.assertEqual([Point(x=5, y=6), Point(x=5, y=6)], decoder.feed(byteInput[-1:] + byteInput))
+        self.assertEqual(0, decoder.getPendingSize())
+
+    def testResumesInsideList(self):
+        # Elements already scanned are not scanned again by the next chunk
+        byteInput = self.encode(CompactEvent(counts=list(range(1, 1000))))
+        decoder = ColferDecoder(CompactEvent)
+        self.assertEqual([], decoder.feed(byteInput[:len(byteInput) // 2]))
+        listFrame = decoder.stack[-1]
+        remaining = listFrame[-1]
+        self.assertLess(remaining, 999)
+        self.assertEqual(1, len(decoder.feed(byteInput[len(byteInput) // 2:])))
+
+    def testResumesInsideMap(self):
+        # A large map fed one byte at a time is scanned once, entry by entry
+        inventories = [inventoryType(counts={str(number): -number for number in range(5000)},
+                                     sizes={number: 0.5 for number in range(256)}, total=1)
+                       for inventoryType in (Inventory, CompactInventory)]
+        for inventory in inventories:
+            inventoryType = type(inventory)
+            with self.subTest(inventoryType=inventoryType):
+                byteInput = bytes(inventory.canonicalBytes())
+                decoder = ColferDecoder(inventoryType)
+                for offset in range(len(byteInput) // 2):
+                    self.assertEqual([], decoder.feed(byteInput[offset:offset+1]))
+                self.assertLess(0, decoder.stack[-1][-1])
+                self.assertLess(decoder.stack[-1][-1], 5000)
+                self.assertLess(len(decoder.buffer) - decoder.offset, 20)
+                decoded = []
+                for offset in range(len(byteInput) // 2, len(byteInput)):
+                    decoded.extend(decoder.feed(byteInput[offset:offset+1]))
+                self.assertEqual([inventory.counts], [value.counts for value in decoded])
+
+    def testLimits(self):
+        decoder = ColferDecoder(LimitedEvent)
+        with self.assertRaises(ValueError):
+            decoder.feed(bytes([14]) + b'\x80\x01' + b'a' * 20)
+        decoder = ColferDecoder(LimitedEvent)
+        with self.assertRaises(ValueError):
+            decoder.feed(bytes([8]) + b'\x05')
+
+        nested = Node(name='deep')
+        for _ in range(5):
+            nested = Node(child=nested)
+        with self.assertRaises(ValueError):
+            ColferDecoder(Node).feed(self.encode(nested))
+
+    def testLimitsPerDecoder(self):
+        decoder = ColferDecoder(CompactEvent, limits={'COLFER_LIST_MAX': 2})
+        with self.assertRaises(ValueError):
+            decoder.feed(self.encode(CompactEvent(counts=[1, 2, 3])))
+        decoder = ColferDecoder(LimitedEvent, limits={'COLFER_MAX_SIZE': 1000})
+        self.assertEqual(['x' * 20], [value.label for value in decoder.feed(self.encode(CompactEvent(label='x' * 20)))])
+        with self.assertRaises(ValueError):
+            ColferDecoder(CompactEvent, limits={'COLFER_MAX_ITEMS': 2})
+
+    def testSkippedLengths(self):
+        # A length past the size limit fails at once, the decoder does not wait for its bytes
+        for byteInput in (bytes([5]) + b'\x80\x01', bytes([9]) + b'\x05', bytes([11]) + b'\xff\x01',
+                          bytes([10, 1]) + b'\x80\x01'):
+            with self.subTest(byteInput=byteInput):
+                with self.assertRaises(ValueError):
+                    ColferDecoder(LimitedEvent).feed(byteInput)
+
+    def testUnknownField(self):
+        with self.assertRaises(ValueError):
+            ColferDecoder(CompactEvent).feed(bytes([100, 1, 0x7f]))
+
+
+if __name__ == '__main__':
+    unittest.main()